@@ -0,0 +1 @@
+"""Benchmarks of streaming XML extraction, see benchmarks/run.py."""
@@ -0,0 +1,75 @@
+"""Compare two benchmark results (see benchmarks/run.py).
+
+    python -m benchmarks.compare base.json new.json --threshold 10
+
+Prints the change of MB/s (or other --metric) and peak RSS for each case that is in both results.
+Exits with code 1 if any case is slower than the base by more than the threshold (percent).
+"""
+
+import argparse
+import json
+import sys
+from typing import Any
+
+# Slowdown in percent that is a regression.
+THRESHOLD = 10.0
+
+# Measurement to compare by default (see benchmarks.run).
+METRIC = "mb_per_s"
+
+
+def load(path: str) -> dict[str, dict[str, Any]]:
+    """Load results {case name: result}."""
+    with open(path, encoding="utf-8") as file:
+        return {result["name"]: result for result in json.load(file)["results"]}
+
+
+def compare(
+    base: dict[str, dict[str, Any]],
+    new: dict[str, dict[str, Any]],
+    threshold: float = THRESHOLD,
+    metric: str = METRIC,
+) -> list[str]:
+    """Print comparison of the cases that are in both results, return regressed case names.
+
+    :param metric: speed measurement to compare - the bigger the better
+    """
+    regressions = []
+    for name, result in new.items():
+        if (base_result := base.get(name)) is None or metric not in result:
+            continue
+        speed = (result[metric] / base_result[metric] - 1) * 100
+        regressed = speed < -threshold
+        if regressed:
+            regressions.append(name)
+        rss = ""
+        if result.get("peak_rss_kb") is not None and base_result.get("peak_rss_kb") is not None:
+            rss = f" RSS {result['peak_rss_kb'] - base_result['peak_rss_kb']:+8} KB"
+        print(
+            f"{name:<105} {base_result[metric]:8.1f} -> {result[metric]:8.1f} {metric} "
+            f"{speed:+6.1f}%{rss}{'  REGRESSION' if regressed else ''}",
+        )
+    return regressions
+
+
+def main() -> None:
+    """Compare the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base", help="base results JSON")
+    parser.add_argument("new", help="new results JSON")
+    parser.add_argument(
+        "--threshold",
+        "-t",
+        type=float,
+        default=THRESHOLD,
+        help="slowdown in percent that is a regression",
+    )
+    parser.add_argument("--metric", "-m", default=METRIC, help="speed measurement to compare")
+    args = parser.parse_args()
+    if regressions := compare(load(args.base), load(args.new), args.threshold, args.metric):
+        print(f"{len(regressions)} case(s) are slower by more than {args.threshold}%.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
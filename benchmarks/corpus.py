@@ -0,0 +1,120 @@
+"""Deterministic Entrezgene-shaped XML documents for benchmarks.
+
+Documents look like efetch response for many genes: Entrezgene-Set of Entrezgene records
+with track info, gene reference, synonyms and a lot of comments.
+The target fields (TARGET_TAGS) are only in one record - the first or the last one,
+so the extractor stops at the beginning of the document or reads all of it.
+"""
+
+import random
+
+from http_stream_xml.stub_server import XML_HEAD, XML_TAIL
+
+TARGET_FIRST = "first"
+TARGET_LAST = "last"
+
+# Fields to extract, real Entrez names first. Only the target record has them.
+TARGET_TAGS = [
+    "Entrezgene_summary",
+    "Gene-ref_desc",
+    "Gene-ref_maploc",
+    "Prot-ref_name_E",
+    "Gene-ref_formal-name",
+    *(f"Entrezgene_field-{index}" for index in range(25)),
+]
+
+# Wrapper elements to put target fields deeper in the record.
+WRAPPER = "Gene-commentary_properties"
+
+WORDS = [
+    *("peroxisome", "proliferator", "activated", "receptor", "alpha", "nuclear"),
+    *("transcription", "factor", "ligand", "binding", "domain", "fatty", "acid"),
+    *("oxidation", "lipid", "metabolism", "gene", "expression", "protein", "coding"),
+    *("region", "variant", "isoform", "regulates", "tissue", "liver", "kidney", "heart"),
+]
+NON_ASCII = "äöüéèçñßøåαβγδλμπΩ–…"
+
+# Approximate size of filler record comments.
+MIN_COMMENTS = 5
+MAX_COMMENTS = 40
+
+
+def text(rng: random.Random, words: int, non_ascii: float) -> str:
+    """Random text, non_ascii is the share of words with non-ASCII characters."""
+    result = []
+    for _ in range(words):
+        word = rng.choice(WORDS)
+        if non_ascii and rng.random() < non_ascii:
+            word += rng.choice(NON_ASCII)
+        result.append(word)
+    return " ".join(result)
+
+
+def record(
+    rng: random.Random,
+    gene_id: int,
+    non_ascii: float,
+    target_depth: int | None = None,
+) -> str:
+    """Entrezgene record, with TARGET_TAGS nested target_depth levels deep if not None."""
+    locus = f"GENE{gene_id}"
+    parts = [
+        (
+            "<Entrezgene>\n  <Entrezgene_track-info><Gene-track>"
+            f"<Gene-track_geneid>{gene_id}</Gene-track_geneid>"
+            '<Gene-track_status value="live">0</Gene-track_status>'
+            "</Gene-track></Entrezgene_track-info>\n"
+            f"  <Entrezgene_gene><Gene-ref><Gene-ref_locus>{locus}</Gene-ref_locus><Gene-ref_syn>"
+        ),
+        *(
+            f"<Gene-ref_syn_E>{locus}-{index}</Gene-ref_syn_E>"
+            for index in range(rng.randint(1, 5))
+        ),
+        "</Gene-ref_syn></Gene-ref></Entrezgene_gene>\n",
+    ]
+    if target_depth is not None:
+        parts.append(f"<{WRAPPER}>" * target_depth)
+        parts.extend(f"<{tag}>{text(rng, 12, non_ascii)}</{tag}>" for tag in TARGET_TAGS)
+        parts.append(f"</{WRAPPER}>" * target_depth)
+    parts.append("\n  <Entrezgene_comments>\n")
+    parts.extend(
+        "    <Gene-commentary>"
+        '<Gene-commentary_type value="comment">254</Gene-commentary_type>'
+        f"<Gene-commentary_heading>{text(rng, 3, non_ascii)}</Gene-commentary_heading>"
+        f"<Gene-commentary_text>{text(rng, 20, non_ascii)}</Gene-commentary_text>"
+        "</Gene-commentary>\n"
+        for _ in range(rng.randint(MIN_COMMENTS, MAX_COMMENTS))
+    )
+    parts.append("  </Entrezgene_comments>\n</Entrezgene>\n")
+    return "".join(parts)
+
+
+def generate(
+    size: int,
+    *,
+    target_depth: int = 0,
+    target_at: str = TARGET_FIRST,
+    non_ascii: float = 0.0,
+    seed: int = 0,
+) -> bytes:
+    """XML document of at least size bytes (UTF-8), the same for the same parameters.
+
+    :param target_depth: how many wrapper elements are around the target fields
+    :param target_at: TARGET_FIRST or TARGET_LAST record has the target fields
+    :param non_ascii: share of words with non-ASCII characters
+    """
+    if target_at not in (TARGET_FIRST, TARGET_LAST):
+        raise ValueError(f"target_at should be {TARGET_FIRST!r} or {TARGET_LAST!r}.")
+    rng = random.Random(seed)  # noqa: S311
+    target = record(rng, 1, non_ascii, target_depth).encode()
+    records = [target] if target_at == TARGET_FIRST else []
+    length = len(XML_HEAD) + len(XML_TAIL) + len(target)
+    gene_id = 2
+    while length < size:
+        filler = record(rng, gene_id, non_ascii).encode()
+        records.append(filler)
+        length += len(filler)
+        gene_id += 1
+    if target_at == TARGET_LAST:
+        records.append(target)
+    return b"".join([XML_HEAD, *records, XML_TAIL])
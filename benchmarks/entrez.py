@@ -0,0 +1,193 @@
+"""Benchmark Genes and AsyncGenes end to end with local stub_server.StubServer.
+
+    python -m benchmarks.entrez --output entrez.json
+    python -m benchmarks.compare base.json entrez.json --metric genes_per_s
+
+Early termination cases get details of one gene with a big record from a server with
+limited bandwidth: streamed by Genes (stops as soon as the fields are found), with Range
+requests, and the full response downloaded and then parsed - what the savings are against.
+Concurrency cases get many genes with AsyncGenes and with Genes in threads from a server
+with latency, so the time is mostly waiting for the network.
+
+Results are JSON as of benchmarks.run, with measurements:
+    seconds - best time of all repeats
+    genes_per_s - genes got per second
+    bytes_sent - body bytes the server sent (in the last repeat)
+    saved_pct - early termination cases: record bytes not sent, percent
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import requests
+
+from benchmarks.run import meta
+from http_stream_xml.entrez import GeneFields, Genes
+from http_stream_xml.entrez_async import AsyncGenes
+from http_stream_xml.rate_limit import RateLimiter
+from http_stream_xml.stub_server import StubServer, gene_record
+from http_stream_xml.xml_stream import XmlStreamExtractor
+
+FIELDS = [GeneFields.summary, GeneFields.description]
+
+MODE_STREAM = "stream"  # Genes.get_gene_details_by_id
+MODE_RANGE = "range"  # Genes with range_requests
+MODE_FULL = "full"  # download the whole response, then parse it
+MODES = (MODE_STREAM, MODE_RANGE, MODE_FULL)
+
+# Gene-commentary padding elements in the record (~100 bytes each).
+RECORD_PADDINGS = [100, 1_000, 10_000]
+
+# Bytes per second the server sends in early termination cases.
+BANDWIDTH = 20 * 1024 * 1024
+
+CONCURRENCY = [1, 2, 4, 8, 16]
+CONCURRENCY_GENES = 32
+CONCURRENCY_PADDING = 1_000
+# Seconds before each part of the response in concurrency cases.
+LATENCY = 0.002
+
+REPEAT = 3
+
+
+def no_rate_limit() -> RateLimiter:
+    """Limiter that does not slow down requests to the stub."""
+    return RateLimiter(rate=1_000_000, burst=1_000_000)
+
+
+def best_time(repeat: int, run: Callable[[], Any]) -> float:
+    """Best time of repeat runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def early_termination(mode: str, padding: int, repeat: int) -> dict[str, Any]:
+    """Get one gene details, return the measurements."""
+    record = gene_record("1", "GENE1", padding=padding)
+    with StubServer({"1": record}, bandwidth=BANDWIDTH) as stub:
+        genes = Genes(
+            FIELDS,
+            rate_limiter=no_rate_limit(),
+            max_bytes_to_fetch=len(record),
+            range_requests=mode == MODE_RANGE,
+            host=stub.host,
+            port=stub.port,
+            ssl=False,
+        )
+
+        def run() -> None:
+            if mode == MODE_FULL:
+                response = requests.get(stub.url + genes.get_details_url("1"), timeout=60)
+                extractor = XmlStreamExtractor(genes.fields)
+                extractor.feed_bytes(response.content)
+                gene = extractor.tags
+            else:
+                gene = genes.get_gene_details_by_id("1")
+            assert set(gene) == set(genes.fields)
+            stub.wait_idle()
+
+        seconds = best_time(repeat, run)
+        sent_before = stub.bytes_sent
+        run()  # count bytes of one run
+        bytes_sent = stub.bytes_sent - sent_before
+    return {
+        "name": f"early/mode={mode}/record={len(record)}",
+        "mode": mode,
+        "record_bytes": len(record),
+        "seconds": seconds,
+        "genes_per_s": 1 / seconds,
+        "bytes_sent": bytes_sent,
+        "saved_pct": (1 - bytes_sent / len(record)) * 100,
+    }
+
+
+def get_async(stub: StubServer, names: list[str], workers: int) -> dict[str, dict[str, Any]]:
+    """Get genes with AsyncGenes."""
+    genes = AsyncGenes(
+        FIELDS,
+        rate_limiter=no_rate_limit(),
+        concurrency=workers,
+        host=stub.host,
+        port=stub.port,
+        ssl=False,
+    )
+    return asyncio.run(genes.get_genes(names))
+
+
+def get_in_threads(
+    stub: StubServer,
+    names: list[str],
+    workers: int,
+) -> dict[str, dict[str, Any]]:
+    """Get genes with Genes in threads."""
+    genes = Genes(FIELDS, rate_limiter=no_rate_limit(), host=stub.host, port=stub.port, ssl=False)
+    with ThreadPoolExecutor(workers) as executor:
+        return dict(zip(names, executor.map(genes.__getitem__, names), strict=True))
+
+
+def concurrency(client: str, workers: int, repeat: int) -> dict[str, Any]:
+    """Get many genes concurrently with AsyncGenes ("async") or Genes in threads ("threads")."""
+    names = [f"gene{index}" for index in range(CONCURRENCY_GENES)]
+    records = {
+        str(index): gene_record(str(index), name.upper(), padding=CONCURRENCY_PADDING)
+        for index, name in enumerate(names)
+    }
+    with StubServer(records, latency=LATENCY) as stub:
+
+        def run() -> None:
+            genes = get_async if client == "async" else get_in_threads
+            result = genes(stub, names, workers)
+            assert all(gene[GeneFields.locus] == name.upper() for name, gene in result.items())
+            stub.wait_idle()
+
+        seconds = best_time(repeat, run)
+        bytes_sent = stub.bytes_sent // repeat
+    return {
+        "name": f"concurrency/client={client}/workers={workers}",
+        "client": client,
+        "workers": workers,
+        "genes": len(names),
+        "seconds": seconds,
+        "genes_per_s": len(names) / seconds,
+        "bytes_sent": bytes_sent,
+    }
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", "-o", help="save results to the JSON file")
+    parser.add_argument("--repeat", "-r", type=int, default=REPEAT, help="runs of each case")
+    args = parser.parse_args()
+
+    results = []
+    for padding in RECORD_PADDINGS:
+        for mode in MODES:
+            result = early_termination(mode, padding, args.repeat)
+            results.append(result)
+            print(
+                f"{result['name']:<40} {result['seconds'] * 1000:8.1f} ms "
+                f"sent {result['bytes_sent']:>9} of {result['record_bytes']:>9} bytes "
+                f"saved {result['saved_pct']:5.1f}%",
+            )
+    for client in ("async", "threads"):
+        for workers in CONCURRENCY:
+            result = concurrency(client, workers, args.repeat)
+            results.append(result)
+            print(f"{result['name']:<40} {result['genes_per_s']:8.1f} genes/s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"meta": meta(), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Benchmark XmlStreamExtractor and SocketStream.fetch on synthetic Entrez documents.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.compare base.json bench.json
+
+Each case changes one parameter of BASE_CASE: document size, target fields depth,
+chunk size, number of selectors, non-ASCII density, target record position, XML engine,
+the source of the data (memory or SocketStream from local stub_server.StubServer)
+or skip-ahead pre-scanning.
+Every case runs in a new interpreter, so its peak RSS is not affected by other cases.
+
+Results are JSON {"meta": {...}, "results": [case parameters and measurements]}:
+    seconds - best time of all repeats
+    mb_per_s - MB (10**6 bytes) of parsed XML per second
+    events_per_s - start and end tags in the parsed XML per second
+    bytes_read - bytes read before the extraction was completed (from socket - with headers)
+    peak_rss_kb - max resident set size of the process (None on Windows)
+    rss_growth_kb - how much the max RSS grew while parsing (the document is already in memory)
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from typing import Any
+
+if sys.platform != "win32":
+    import resource
+
+from benchmarks.corpus import TARGET_FIRST, TARGET_LAST, TARGET_TAGS, generate
+from http_stream_xml.socket_stream import SocketStream
+from http_stream_xml.stub_server import EFETCH_PATH, XML_HEAD, XML_TAIL, StubServer
+from http_stream_xml.xml_stream import ENGINE_EXPAT, ENGINE_SAX, XmlStreamExtractor
+
+KB = 1024
+MB = 1024 * KB
+
+SOURCE_MEMORY = "memory"  # feed the document from memory
+SOURCE_LENGTH = "socket"  # SocketStream from stub_server, response with Content-Length
+SOURCE_CHUNKED = "socket-chunked"  # SocketStream from stub_server, chunked transfer encoding
+SOURCE_GZIP = "socket-gzip"  # SocketStream from stub_server, gzip Content-Encoding
+SOURCES = (SOURCE_MEMORY, SOURCE_LENGTH, SOURCE_CHUNKED, SOURCE_GZIP)
+
+BASE_CASE: dict[str, Any] = {
+    "source": SOURCE_MEMORY,
+    "engine": ENGINE_EXPAT,
+    "size": 512 * KB,
+    "depth": 0,
+    "chunk": 16 * KB,
+    "selectors": 5,
+    "non_ascii": 0.0,
+    "target": TARGET_LAST,
+    "skip_ahead": False,
+}
+
+# Values of each parameter, other parameters are from BASE_CASE.
+VARIATIONS: dict[str, list[Any]] = {
+    "size": [5 * KB, 50 * KB, 512 * KB, 5 * MB, 50 * MB],
+    "depth": [0, 8, 32],
+    "chunk": [1 * KB, 16 * KB, 256 * KB],
+    "selectors": [1, 5, len(TARGET_TAGS)],
+    "non_ascii": [0.0, 0.1, 0.5],
+    "target": [TARGET_FIRST, TARGET_LAST],
+    "engine": [ENGINE_EXPAT, ENGINE_SAX],
+    "source": list(SOURCES),
+    "skip_ahead": [False, True],
+}
+
+# Sizes for --quick run.
+QUICK_MAX_SIZE = 512 * KB
+
+REPEAT = 3
+
+
+def cases(quick: bool = False) -> list[dict[str, Any]]:
+    """Benchmark cases without duplicates, in VARIATIONS order."""
+    result: dict[str, dict[str, Any]] = {}
+    for parameter, values in VARIATIONS.items():
+        for value in values:
+            case = {**BASE_CASE, parameter: value}
+            if quick and case["size"] > QUICK_MAX_SIZE:
+                continue
+            result.setdefault(case_name(case), case)
+    return list(result.values())
+
+
+def case_name(case: dict[str, Any]) -> str:
+    """Unique name of the case to compare results of different runs."""
+    return "/".join(f"{parameter}={case[parameter]}" for parameter in BASE_CASE)
+
+
+def count_events(data: bytes | memoryview) -> int:
+    """Number of start and end tags (empty element counts as one)."""
+    data = bytes(data)
+    return data.count(b"<") - data.count(b"<!--") - data.count(b"<?") - data.count(b"<![CDATA[")
+
+
+def parse_memory(
+    document: bytes,
+    case: dict[str, Any],
+    extractor: XmlStreamExtractor,
+) -> tuple[int, int]:
+    """Feed the document by chunks till the extraction is completed.
+
+    :return: (bytes read, bytes of the document fed to the extractor) - the same here
+    """
+    view = memoryview(document)
+    chunk = case["chunk"]
+    pos = 0
+    while pos < len(view):
+        extractor.feed_bytes(view[pos : pos + chunk])
+        pos += chunk
+        if extractor.extraction_completed:
+            break
+    pos = min(pos, len(view))
+    return pos, pos
+
+
+def parse_socket(
+    stream: SocketStream,
+    case: dict[str, Any],
+    extractor: XmlStreamExtractor,
+) -> tuple[int, int]:
+    """Fetch the document from the local server till the extraction is completed.
+
+    :return: (bytes read from the socket, bytes of the document fed to the extractor)
+    """
+    try:
+        stream.connect()
+        for part in stream.fetch(case["chunk"]):
+            extractor.feed_bytes(part)
+            if extractor.extraction_completed:
+                break
+    finally:
+        stream.socket.close()
+    return stream.fetched_bytes, stream.decoded_bytes
+
+
+def document_server(document: bytes, case: dict[str, Any]) -> StubServer:
+    """Entrez stub that responds to efetch of gene "1" with the document, as in the case."""
+    record = document[len(XML_HEAD) : -len(XML_TAIL)]
+    return StubServer(
+        {"1": record},
+        chunked=case["source"] == SOURCE_CHUNKED,
+        chunk_size=case["chunk"],
+        gzip=case["source"] == SOURCE_GZIP,
+    ).start()
+
+
+def peak_rss_kb() -> int | None:
+    """Max resident set size of the process in KB, None if it is not available (Windows)."""
+    if sys.platform == "win32":
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KB elsewhere
+
+
+def run_case(case: dict[str, Any], repeat: int = REPEAT) -> dict[str, Any]:
+    """Run the case repeat times, return the case with its measurements."""
+    document = generate(
+        case["size"],
+        target_depth=case["depth"],
+        target_at=case["target"],
+        non_ascii=case["non_ascii"],
+    )
+    selectors = TARGET_TAGS[: case["selectors"]]
+    server = document_server(document, case) if case["source"] != SOURCE_MEMORY else None
+    rss_before = peak_rss_kb()
+    best = float("inf")
+    try:
+        for _ in range(repeat):
+            extractor = XmlStreamExtractor(
+                selectors,
+                engine=case["engine"],
+                skip_ahead=case["skip_ahead"],
+            )
+            if server is None:
+                start = time.perf_counter()
+                bytes_read, parsed = parse_memory(document, case, extractor)
+            else:
+                stream = SocketStream(
+                    server.host,
+                    f"{EFETCH_PATH}?id=1",
+                    ssl=False,
+                    port=server.port,
+                )
+                start = time.perf_counter()
+                bytes_read, parsed = parse_socket(stream, case, extractor)
+            best = min(best, time.perf_counter() - start)
+            completed = extractor.extraction_completed
+            extractor.close()
+    finally:
+        if server is not None:
+            server.close()
+    peak_rss = peak_rss_kb()
+    return {
+        "name": case_name(case),
+        **case,
+        "document_bytes": len(document),
+        "seconds": best,
+        "mb_per_s": parsed / best / 1e6,
+        "events_per_s": count_events(memoryview(document)[:parsed]) / best,
+        "bytes_read": bytes_read,
+        "completed": completed,
+        "peak_rss_kb": peak_rss,
+        "rss_growth_kb": None if peak_rss is None or rss_before is None else peak_rss - rss_before,
+    }
+
+
+def run_isolated(case: dict[str, Any], repeat: int = REPEAT) -> dict[str, Any]:
+    """Run the case in a new interpreter."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (case, repeat))
+
+
+def meta() -> dict[str, Any]:
+    """Where and what was benchmarked."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", "-o", help="save results to the JSON file")
+    parser.add_argument("--repeat", "-r", type=int, default=REPEAT, help="runs of each case")
+    parser.add_argument("--quick", "-q", action="store_true", help="skip the biggest documents")
+    args = parser.parse_args()
+
+    results = []
+    for case in cases(args.quick):
+        result = run_isolated(case, args.repeat)
+        results.append(result)
+        print(
+            f"{result['name']:<105} {result['mb_per_s']:8.1f} MB/s "
+            f"{result['events_per_s'] / 1e6:6.2f} Mevents/s "
+            f"read {result['bytes_read']:>10} RSS {result['peak_rss_kb']!s:>8} KB",
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"meta": meta(), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Cache backends for Genes.db.
+
+Any MutableMapping {gene name: gene details} can be used as Genes cache,
+LruCache is the default one.
+SqliteCache keeps genes on disk, so they survive restarts and can be shared by processes:
+
+    genes = Genes(fields, cache=SqliteCache('genes.sqlite', fields))
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, MutableMapping
+from os import PathLike
+from typing import Any
+
+# Default limits of Genes cache.
+CACHE_MAX_ENTRIES = 10_000
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+
+class LruCache(MutableMapping[str, dict[str, Any]]):
+    """In-memory cache with max number of entries (least recently used are evicted) and TTL.
+
+    All operations are O(1). Counts hits, misses, evictions and expirations.
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = CACHE_MAX_ENTRIES,
+        ttl: float | None = CACHE_TTL_SECONDS,
+    ) -> None:
+        """Init.
+
+        :param max_entries: max number of genes in the cache, None - no limit
+        :param ttl: seconds to keep a gene in the cache, None - forever
+        """
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("max_entries should be positive.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.data: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __getitem__(self, key: str) -> dict[str, Any]:
+        """Get gene and mark it as recently used."""
+        with self.lock:
+            if (item := self.data.get(key)) is None:
+                self.misses += 1
+                raise KeyError(key)
+            expires, value = item
+            if expires < time.monotonic():
+                del self.data[key]
+                self.expirations += 1
+                self.misses += 1
+                raise KeyError(key)
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key: str, value: dict[str, Any]) -> None:
+        """Put gene into the cache, evicting least recently used if the cache is full."""
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self.lock:
+            self.data[key] = (expires, value)
+            self.data.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self.data) > self.max_entries:
+                    self.data.popitem(last=False)
+                    self.evictions += 1
+
+    def __delitem__(self, key: str) -> None:
+        """Remove gene from the cache."""
+        with self.lock:
+            del self.data[key]
+
+    def __contains__(self, key: object) -> bool:
+        """Check if not expired gene is in the cache, does not count as hit or miss."""
+        item = self.data.get(key)  # type: ignore[call-overload]
+        return item is not None and item[0] >= time.monotonic()
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over gene names, from least recently used."""
+        with self.lock:
+            return iter(list(self.data))
+
+    def __len__(self) -> int:
+        """Number of genes in the cache, including expired but not yet removed."""
+        return len(self.data)
+
+    def clear(self) -> None:
+        """Remove all genes from the cache."""
+        with self.lock:
+            self.data.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Cache statistics."""
+        return {
+            "entries": len(self.data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SqliteCache(MutableMapping[str, dict[str, Any]]):
+    """Persistent cache in SQLite database file.
+
+    Database is in WAL mode, so many processes can read it concurrently while one writes.
+    Genes are keyed by gene name (or ID) and the set of fields, so Genes with different
+    fields can share one file. Each gene is stored with the time it was fetched.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike[str],
+        fields: Iterable[str],
+        ttl: float | None = None,
+    ) -> None:
+        """Open (create if necessary) the cache database.
+
+        :param path: database file
+        :param fields: gene fields requested by Genes that uses the cache
+        :param ttl: seconds to keep a gene in the cache, None - forever
+        """
+        self.path = path
+        self.fields = ",".join(sorted(set(fields)))
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path,
+            timeout=30,  # wait for other processes writes
+            isolation_level=None,  # autocommit
+            check_same_thread=False,  # access is serialized by self.lock
+        )
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS genes ("
+                "key TEXT NOT NULL, fields TEXT NOT NULL, details TEXT NOT NULL, "
+                "fetched_at REAL NOT NULL, PRIMARY KEY (key, fields))",
+            )
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def execute(self, sql: str, *params: Any) -> list[Any]:
+        """Execute SQL with the fields of this cache as the first parameter, return all rows."""
+        with self.lock:
+            return self.connection.execute(sql, (self.fields, *params)).fetchall()
+
+    def __getitem__(self, key: str) -> dict[str, Any]:
+        """Get gene from the database."""
+        rows = self.execute(
+            "SELECT details, fetched_at FROM genes WHERE fields = ? AND key = ?",
+            key,
+        )
+        if not rows:
+            self.misses += 1
+            raise KeyError(key)
+        details, fetched_at = rows[0]
+        if self.ttl is not None and fetched_at + self.ttl < time.time():
+            self.expirations += 1
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        return json.loads(details)
+
+    def __setitem__(self, key: str, value: dict[str, Any]) -> None:
+        """Save gene into the database."""
+        self.execute(
+            "INSERT OR REPLACE INTO genes (fields, key, details, fetched_at) VALUES (?, ?, ?, ?)",
+            key,
+            json.dumps(value),
+            time.time(),
+        )
+
+    def __delitem__(self, key: str) -> None:
+        """Remove gene from the database."""
+        with self.lock:
+            cursor = self.connection.execute(
+                "DELETE FROM genes WHERE fields = ? AND key = ?",
+                (self.fields, key),
+            )
+            if cursor.rowcount == 0:
+                raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over gene names."""
+        return iter([row[0] for row in self.execute("SELECT key FROM genes WHERE fields = ?")])
+
+    def __len__(self) -> int:
+        """Number of genes, including expired."""
+        return self.execute("SELECT COUNT(*) FROM genes WHERE fields = ?")[0][0]
+
+    def fetched_at(self, key: str) -> float | None:
+        """When the gene was fetched (time.time()), None if it is not in the cache."""
+        rows = self.execute("SELECT fetched_at FROM genes WHERE fields = ? AND key = ?", key)
+        return rows[0][0] if rows else None
+
+    def clear(self) -> None:
+        """Remove all genes with the fields of this cache."""
+        self.execute("DELETE FROM genes WHERE fields = ?")
+
+    def close(self) -> None:
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
+
+    def stats(self) -> dict[str, int]:
+        """Cache statistics."""
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+        }
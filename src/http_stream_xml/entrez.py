@@ -13,13 +13,15 @@ The easiest way to use - global genes object pre-created globally in this module
 If we use genes[] it searches for gene name case-insensitive (see canonical_gene_name).
 On other hand, all methods in the class search for gene name case-sensitive.
 
-Caches results inside the class instance.
+Caches results inside the class instance (see cache module for cache backends).
 """
 
 import logging
-from collections.abc import Collection
+import threading
+from collections.abc import Collection, Generator, Iterable, Iterator, MutableMapping
+from contextlib import closing
 from functools import lru_cache
-from time import time
+from time import perf_counter
 from typing import Any
 
 import requests
@@ -27,7 +29,26 @@ import urllib3
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-from http_stream_xml.xml_stream import XmlStreamExtractor
+from http_stream_xml.cache import LruCache
+from http_stream_xml.metrics import (
+    REASON_BYTE_CAP,
+    REASON_COMPLETED,
+    REASON_END,
+    REASON_ERROR,
+    REASON_TIMEOUT,
+    FetchRecord,
+    Sink,
+)
+from http_stream_xml.rate_limit import RateLimiter, shared_rate_limiter
+from http_stream_xml.socket_stream import (
+    ACCEPT_ENCODING,
+    HTTP_PARTIAL_CONTENT,
+    HTTP_RANGE_NOT_SATISFIABLE,
+    range_header,
+    range_windows,
+    skip_bytes,
+)
+from http_stream_xml.xml_stream import XmlRecordExtractor, XmlStreamExtractor
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -40,13 +61,29 @@ API_KEY: str | None = None
 # If we find all the tag early we would stop even early than that limit.
 MAX_BYTES_TO_FETCH = 10 * 1024
 
+# How many gene IDs to request in one efetch call (see Genes.get_many).
+BATCH_SIZE = 200
+
+# How many gene names to resolve in one esearch call (see Genes.get_gene_ids).
+NAMES_BATCH_SIZE = 100
+
+# esearch returns only first 20 IDs by default, we ask for the same number per each name.
+# Each ID costs a document summary (~1Kb) in esummary response, see Genes.get_gene_ids.
+ESEARCH_IDS_PER_NAME = 20
+
 # How long we wait for Entrez response. It does not matter how many bytes we got at the moment.
 FETCH_TIMEOUT_SECONDS = 30
 
 # Internal consts
 ENTREZ_HOST = "eutils.ncbi.nlm.nih.gov"
 ENTREZ_GENE_DETAILS = "/entrez/eutils/efetch.fcgi?db=gene&id={gene_id}&retmode=xml{key_param}"
+ENTREZ_GENE_IDS = (
+    "/entrez/eutils/esearch.fcgi?db=gene&term=({term})"
+    "+AND+homo+sapience[Organism]&retmax={retmax}&retmode=json{key_param}"
+)
+ENTREZ_GENE_SUMMARIES = "/entrez/eutils/esummary.fcgi?db=gene&id={gene_ids}&retmode=json{key_param}"
 ENTREZ_API_KEY_PARAM = "&api_key={api_key}"
+ENTREZ_GENE_RECORD = "Entrezgene"  # top-level element of each gene in efetch response
 ENTREZ_GENE_ID = (
     "/entrez/eutils/esearch.fcgi?db=gene&term={gene_name}[Gene+Name]"
     "+AND+homo+sapience[Organism]&retmode=json{key_param}"
@@ -87,6 +124,7 @@ class GeneFields:
     description = "Gene-ref_desc"
     synonyms = "Gene-ref_syn"
     locus = "Gene-ref_locus"
+    gene_id = "Gene-track_geneid"
 
 
 GENE_FIELDS = [
@@ -100,12 +138,20 @@ GENE_FIELDS = [
 class Genes:
     """Genes class."""
 
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         fields: list[str] | None = None,
         timeout: int = FETCH_TIMEOUT_SECONDS,
         max_bytes_to_fetch: int = MAX_BYTES_TO_FETCH,
         api_key: str | None = None,
+        *,
+        rate_limiter: RateLimiter | None = None,
+        cache: MutableMapping[str, dict[str, Any]] | None = None,
+        range_requests: bool = False,
+        host: str = ENTREZ_HOST,
+        port: int | None = None,
+        ssl: bool = True,
+        metrics: Sink | None = None,
     ) -> None:
         """Init.
 
@@ -118,8 +164,24 @@ class Genes:
             if None, will use module constant API_KEY.
             if the cons is also null will use Entrez without key
             (they said it will has some limitations in this case)
+        :param rate_limiter: limit rate of requests to Entrez.
+            By default, shared by all Genes with the same api_key and with the rate
+            NCBI allows for it (see rate_limit.shared_rate_limiter).
+        :param cache: where to keep genes already requested from NCBI.Entrez,
+            by default in-memory cache.LruCache (limited size, entries expire after TTL).
+        :param range_requests: fetch gene details with HTTP Range requests of growing size
+            (see socket_stream.range_windows), so the server does not send more than
+            max_bytes_to_fetch. Each range is a separate request under the rate limit.
+        :param host: Entrez host, for example local stub_server.StubServer in tests
+        :param port: Entrez port, None - default port of the scheme
+        :param ssl: use HTTPS
+        :param metrics: called with metrics.FetchRecord after each gene details fetch,
+            see metrics.Histogram and metrics.Sinks. None - nothing is measured.
         """
-        self.host: str = ENTREZ_HOST
+        self.host: str = host
+        self.port = port
+        self.ssl = ssl
+        self.metrics = metrics
         self.api_key: str | None = API_KEY if api_key is None else api_key
         if fields is None:
             self.fields: list[str] = GENE_FIELDS
@@ -127,20 +189,26 @@ class Genes:
             raise ValueError("Expected non-empty list of fields to extract in fields parameter.")
         elif GeneFields.locus not in fields:
             # we need locus to distinguish genes if we found more that one ID for the gene name
-            self.fields = fields + [GeneFields.locus]
+            self.fields = list(dict.fromkeys(fields)) + [GeneFields.locus]
         else:
-            self.fields = fields
+            self.fields = list(dict.fromkeys(fields))
         self.timeout = timeout
         self.max_bytes_to_fetch = max_bytes_to_fetch
-        self.clear_cache()  # in-memory cache of genes already requested from NCBI.Entrez
-        self.db: dict[str, dict[str, Any]] = {}
+        self.rate_limiter = rate_limiter
+        self.range_requests = range_requests
+        self.wire_bytes = 0  # gene details bytes received, compressed if the server compressed them
+        self.decoded_bytes = 0  # gene details bytes after decompression
+        self.stats_lock = threading.Lock()
+        self.extractors = threading.local()  # XmlStreamExtractor reused by each thread
+        # cache of genes already requested from NCBI.Entrez
+        self.db: MutableMapping[str, dict[str, Any]] = LruCache() if cache is None else cache
 
     def clear_cache(self) -> None:
         """Clear all previously cached genes data.
 
         so all information from this moment will be requested from NCBI server.
         """
-        self.db = {}
+        self.db.clear()
 
     def canonical_gene_name(self, gene_name: str) -> str:
         """Convert gene name to lower case.
@@ -152,32 +220,113 @@ class Genes:
     def __getitem__(self, gene_name: str) -> dict[str, Any]:
         """Get gene info from cache or from NCBI server if not found in cache."""
         gene_name = self.canonical_gene_name(gene_name)
-        if gene_name in self.db and len(self.db[gene_name]) >= len(
-            self.fields,
-        ):  # if not all fields was found we repeat info gathering
-            return self.db[gene_name]
+        if (gene := self.get_cached(gene_name)) is not None:
+            return gene
         gene = self.get_gene_details(gene_name)
         if gene:
             self.db[gene_name] = gene
         return gene
 
+    def get_cached(self, gene_name: str) -> dict[str, Any] | None:
+        """Get gene info from cache, None if it is not there or not all fields were found."""
+        gene = self.db.get(gene_name)
+        if gene is not None and len(gene) >= len(
+            self.fields,
+        ):  # if not all fields was found we repeat info gathering
+            return gene
+        return None
+
+    def stats(self) -> dict[str, int]:
+        """How many bytes of gene details were fetched."""
+        return {"wire_bytes": self.wire_bytes, "decoded_bytes": self.decoded_bytes}
+
+    def iter_body(
+        self,
+        response: requests.Response,
+        chunk_size: int,
+        record: FetchRecord | None = None,
+    ) -> Iterator[bytes]:
+        """Yield response body by chunks (decompressed by requests), count fetched bytes.
+
+        Stop iterating to stop downloading and decompression.
+
+        :param record: add response time, status and bytes received to the record
+        """
+        if record is not None:
+            record.add("ttfb", response.elapsed.total_seconds())
+            record.status = response.status_code
+        decoded_bytes = 0
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                decoded_bytes += len(chunk)
+                yield chunk
+        finally:
+            try:
+                # urllib3 counts bytes before decoding, but not for chunked responses
+                wire_bytes = int(response.raw.tell()) or decoded_bytes
+            except (AttributeError, TypeError, ValueError):
+                wire_bytes = decoded_bytes
+            with self.stats_lock:
+                self.wire_bytes += wire_bytes
+                self.decoded_bytes += decoded_bytes
+            if record is not None:
+                record.wire_bytes += wire_bytes
+            response.close()
+
+    def get_extractor(self) -> XmlStreamExtractor:
+        """Extractor of the fields for the current thread, reset for a new document."""
+        if (extractor := getattr(self.extractors, "extractor", None)) is None:
+            extractor = self.extractors.extractor = XmlStreamExtractor(self.fields)
+        else:
+            extractor.reset()
+        return extractor
+
+    def get_rate_limiter(self) -> RateLimiter:
+        """Limiter for requests to Entrez - explicitly set or shared for the api_key."""
+        return self.rate_limiter or shared_rate_limiter(self.api_key)
+
     def api_key_query_param(self) -> str:
         """Get query parameter for Entrez API key."""
         return ENTREZ_API_KEY_PARAM.format(api_key=self.api_key) if self.api_key is not None else ""
 
+    def endpoint(self, url: str) -> str:
+        """Get full URL of Entrez API url."""
+        scheme = "https" if self.ssl else "http"
+        port = f":{self.port}" if self.port is not None else ""
+        return f"{scheme}://{self.host}{port}{url}"
+
     def search_id_url(self, gene_name: str) -> str:
         """Get URL to search for gene ID by gene name."""
         return ENTREZ_GENE_ID.format(gene_name=gene_name, key_param=self.api_key_query_param())
 
+    def search_ids_url(self, gene_names: Iterable[str]) -> str:
+        """Get URL to search for IDs of all the genes in one request."""
+        gene_names = list(gene_names)
+        return ENTREZ_GENE_IDS.format(
+            term="+OR+".join(f"{gene_name}[Gene+Name]" for gene_name in gene_names),
+            retmax=len(gene_names) * ESEARCH_IDS_PER_NAME,
+            key_param=self.api_key_query_param(),
+        )
+
+    def summaries_url(self, gene_ids: Iterable[str]) -> str:
+        """Get URL to get document summaries of the genes."""
+        return ENTREZ_GENE_SUMMARIES.format(
+            gene_ids=",".join(gene_ids),
+            key_param=self.api_key_query_param(),
+        )
+
     def get_details_url(self, gene_id: str) -> str:
         """Get URL to get gene details by gene ID."""
         return ENTREZ_GENE_DETAILS.format(gene_id=gene_id, key_param=self.api_key_query_param())
 
-    def get_gene_id(self, gene_name: str) -> str | None:
-        """Get gene ID by gene name."""
-        url = self.search_id_url(gene_name)
+    def search_ids(self, url: str, subject: str) -> list[str] | None:
+        """Request esearch url and get list of gene IDs from the response.
+
+        :param subject: what we search for, for error messages
+        """
+        self.get_rate_limiter().acquire()
         response = requests_retry_session().get(
-            f"https://{self.host}{url}",
+            self.endpoint(url),
             verify=False,
             timeout=self.timeout,
         )
@@ -185,19 +334,54 @@ class Genes:
             raw_resp = response.json()
         except ValueError:
             log.error(
-                f'NCBI.Entrez not JSON response for gene "{gene_name}" '
-                f"ID request:\n{response.text}",
+                f"NCBI.Entrez not JSON response for {subject} ID request:\n{response.text}",
             )
             return None
+        return self.ids_from_search_result(raw_resp, subject)
+
+    def ids_from_search_result(self, raw_resp: Any, subject: str) -> list[str] | None:
+        """Get list of gene IDs from decoded esearch JSON response."""
         try:
             resp = raw_resp["esearchresult"]
         except KeyError:
             log.error(f"NCBI.Entrez response do not contains search result:\n{raw_resp}")
             return None
         if "idlist" not in resp or not resp["idlist"]:
-            log.error(f'NCBI.Entrez no gene "{gene_name}" ID in response:\n{resp}')
+            log.error(f"NCBI.Entrez no {subject} ID in response:\n{resp}")
+            return None
+        return resp["idlist"]
+
+    def get_gene_names(self, gene_ids: list[str]) -> dict[str, str]:
+        """Get official gene names (symbols) by gene IDs, with esummary.
+
+        Document summary is ~1Kb, so this is much cheaper than efetch of gene records.
+        Returns {gene ID: gene name}, without IDs Entrez had not returned names for.
+        """
+        names: dict[str, str] = {}
+        for start in range(0, len(gene_ids), BATCH_SIZE):
+            batch = gene_ids[start : start + BATCH_SIZE]
+            self.get_rate_limiter().acquire()
+            response = requests_retry_session().get(
+                self.endpoint(self.summaries_url(batch)),
+                verify=False,
+                timeout=self.timeout,
+            )
+            try:
+                result = response.json()["result"]
+            except (ValueError, KeyError, TypeError):
+                log.error(f"NCBI.Entrez bad esummary response for {len(batch)} genes")
+                continue
+            for gene_id in batch:
+                summary = result.get(gene_id)
+                if isinstance(summary, dict) and summary.get("name"):
+                    names[gene_id] = summary["name"]
+        return names
+
+    def get_gene_id(self, gene_name: str) -> str | None:
+        """Get gene ID by gene name."""
+        ids = self.search_ids(self.search_id_url(gene_name), f'gene "{gene_name}"')
+        if not ids:
             return None
-        ids: list[str] = resp["idlist"]
         if len(ids) > 1:
             log.debug(
                 f'NCBI.Entrez: we found more than one ID for gene "{gene_name}" in response: {ids}',
@@ -214,6 +398,63 @@ class Genes:
         log.debug(f'NCBI.Entrez: we found gene "{gene_name}" ID: {ids[0]}')
         return ids[0]
 
+    def get_gene_ids(
+        self,
+        gene_names: Iterable[str],
+        batch_size: int = NAMES_BATCH_SIZE,
+    ) -> dict[str, str]:
+        """Get IDs of many genes by their names.
+
+        One esearch request for each batch of names, and esummary (see get_gene_names) for
+        the found IDs to map them back to gene names - a summary is ~1Kb, and esearch returns
+        up to ESEARCH_IDS_PER_NAME IDs per name.
+        Only IDs without summary are mapped by locus from their records (batched efetch,
+        see get_many) - it cannot stop early, and a record could be up to 2Mb.
+        As a side effect genes fetched that way are cached, so genes[gene_name] will not
+        request them.
+
+        Unlike get_gene_id, gene names are case-insensitive.
+        Returns {canonical gene name: gene ID}, without genes Entrez had not found.
+        """
+        names = list(dict.fromkeys(self.canonical_gene_name(name) for name in gene_names))
+        result: dict[str, str] = {}
+        for start in range(0, len(names), batch_size):
+            batch = names[start : start + batch_size]
+            ids = self.search_ids(self.search_ids_url(batch), f"{len(batch)} genes")
+            if not ids:
+                continue
+            wanted = set(batch)
+            found = self.get_gene_names(ids)
+            for gene_id in ids:
+                if gene_id in found:
+                    gene_name = self.canonical_gene_name(found[gene_id])
+                    if gene_name in wanted and gene_name not in result:
+                        result[gene_name] = gene_id
+            unknown = [gene_id for gene_id in ids if gene_id not in found]
+            if unknown and wanted - result.keys():
+                self.map_ids_by_locus(unknown, wanted, result)
+            if missing := wanted - result.keys():
+                log.error(f"NCBI.Entrez no genes {', '.join(sorted(missing))} in response")
+        return result
+
+    def map_ids_by_locus(
+        self,
+        gene_ids: list[str],
+        wanted: set[str],
+        result: dict[str, str],
+    ) -> None:
+        """Add to result IDs of the wanted gene names, by locus from the genes records.
+
+        The genes are cached.
+        """
+        for gene_id, gene in self.get_many(gene_ids):
+            gene_name = self.canonical_gene_name(gene.get(GeneFields.locus, ""))
+            if gene_id is None or gene_name not in wanted or gene_name in result:
+                log.debug(f'Skip id={gene_id} - locus is "{gene.get(GeneFields.locus)}"')
+                continue
+            result[gene_name] = gene_id
+            self.db[gene_name] = gene  # cache response so we won't request it twice
+
     def get_gene_details(self, gene_name: str) -> dict[str, Any]:
         """Get gene details by gene name."""
         if gene_id := self.get_gene_id(gene_name):
@@ -225,36 +466,47 @@ class Genes:
 
         see get_gene_id to obtain it.
         """
+        extractor = self.get_extractor()
         url = self.get_details_url(gene_id)
-        request = requests_retry_session().get(
-            f"https://{self.host}{url}",
-            stream=True,
-            verify=False,
-            timeout=self.timeout,
-        )
-        extractor = XmlStreamExtractor(self.fields)
+        record = FetchRecord(url) if self.metrics is not None else None
 
-        start = time()
+        start = perf_counter()
         fetched_bytes = 0
-        for line in request.iter_lines(chunk_size=1024):
-            if line is not None:
-                fetched_bytes += len(line)
-                extractor.feed(line)
-                if extractor.extraction_completed:
-                    break
-                # too much noise so I removed that
-                # log.debug(f'NCBI.Entrez: fetched {fetched_bytes} bytes from gene details,
-                # found tags {extractor.tags.keys()}')
-            elapsed = time() - start  # in seconds and decimal parts of seconds
-            if elapsed > self.timeout:
-                log.error("NCBI.Entrez gene details fetch timeout")
-                break
-            if fetched_bytes > self.max_bytes_to_fetch:
-                log.debug(
-                    f"NCBI.Entrez fetched {fetched_bytes}. "
-                    f"Not all fields was found but no sense to fetch more.",
-                )
-                break
+        reason = REASON_ERROR
+        try:
+            with closing(self.fetch_details(url, record)) as chunks:
+                for chunk in chunks:
+                    if chunk:
+                        fetched_bytes += len(chunk)
+                        if record is None:
+                            extractor.feed_bytes(chunk)
+                        else:
+                            parse_start = perf_counter()
+                            extractor.feed_bytes(chunk)
+                            record.parse += perf_counter() - parse_start
+                        if extractor.extraction_completed:
+                            reason = REASON_COMPLETED
+                            break
+                    elapsed = perf_counter() - start  # in seconds and decimal parts of seconds
+                    if elapsed > self.timeout:
+                        log.error("NCBI.Entrez gene details fetch timeout")
+                        reason = REASON_TIMEOUT
+                        break
+                    if fetched_bytes > self.max_bytes_to_fetch:
+                        log.debug(
+                            f"NCBI.Entrez fetched {fetched_bytes}. "
+                            f"Not all fields was found but no sense to fetch more.",
+                        )
+                        reason = REASON_BYTE_CAP
+                        break
+                else:
+                    reason = REASON_END
+        finally:
+            if record is not None and self.metrics is not None:
+                record.total = perf_counter() - start
+                record.body_bytes = fetched_bytes
+                record.reason = reason
+                self.metrics(record)
 
         log.debug(
             f"NCBI.Entrez reesult for gene {gene_id}: "
@@ -262,6 +514,97 @@ class Genes:
         )
         return extractor.tags
 
+    def fetch_details(
+        self,
+        url: str,
+        record: FetchRecord | None = None,
+    ) -> Generator[bytes, None, None]:
+        """Request gene details url, yield the response body by chunks.
+
+        Asks for gzip/deflate compressed response, yields it decompressed.
+        In range_requests mode (uncompressed, as ranges are for the uncompressed response)
+        each next range is requested only if the caller still
+        iterates after the previous one. If the server ignores Range, the rest of its
+        full response is yielded.
+
+        :param record: add response time, status and bytes received to the record
+        """
+        if not self.range_requests:
+            self.get_rate_limiter().acquire()
+            request = requests_retry_session().get(
+                self.endpoint(url),
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+                stream=True,
+                verify=False,
+                timeout=self.timeout,
+            )
+            yield from self.iter_body(request, chunk_size=1024, record=record)
+            return
+        fetched = 0
+        for byte_range in range_windows(self.max_bytes_to_fetch):
+            self.get_rate_limiter().acquire()
+            response = requests_retry_session().get(
+                self.endpoint(url),
+                headers={"Range": range_header(byte_range), "Accept-Encoding": "identity"},
+                stream=True,
+                verify=False,
+                timeout=self.timeout,
+            )
+            if response.status_code == HTTP_RANGE_NOT_SATISFIABLE:
+                response.close()
+                return  # previous range was the end
+            chunks = self.iter_body(response, chunk_size=1024, record=record)
+            if response.status_code != HTTP_PARTIAL_CONTENT:
+                yield from skip_bytes(chunks, fetched)
+                return
+            received = 0
+            for chunk in chunks:
+                received += len(chunk)
+                yield chunk
+            fetched += received
+            first, last = byte_range
+            if last is None or received < last - first + 1:
+                return
+
+    def get_many(
+        self,
+        gene_ids: Iterable[str],
+        batch_size: int = BATCH_SIZE,
+    ) -> Iterator[tuple[str | None, dict[str, Any]]]:
+        """Download details of many genes with one efetch request per batch of IDs.
+
+        Yields (gene ID, gene details) as soon as each gene record is downloaded.
+        Genes not found by Entrez are just skipped, in the order of Entrez response.
+
+        Unlike get_gene_details_by_id it cannot stop in the middle of the response,
+        but after all fields of a gene were found the rest of its record is not matched.
+        The response is parsed once, see xml_stream.XmlRecordExtractor.
+        """
+        ids = list(gene_ids)
+        for start in range(0, len(ids), batch_size):
+            yield from self.get_batch(ids[start : start + batch_size])
+
+    def get_batch(self, gene_ids: list[str]) -> Iterator[tuple[str | None, dict[str, Any]]]:
+        """Download one batch of genes, see get_many."""
+        url = self.get_details_url(",".join(gene_ids))
+        self.get_rate_limiter().acquire()
+        request = requests_retry_session().get(
+            self.endpoint(url),
+            stream=True,
+            verify=False,
+            timeout=self.timeout,
+        )
+        fields = [*self.fields, GeneFields.gene_id]
+        extractor = XmlRecordExtractor(ENTREZ_GENE_RECORD, fields)
+        for chunk in self.iter_body(request, chunk_size=64 * 1024):
+            for gene in extractor.feed_bytes(chunk):
+                gene_id = gene.pop(GeneFields.gene_id, None)
+                log.debug(
+                    f"NCBI.Entrez result for gene {gene_id}: "
+                    f"extracted tags {', '.join(list(gene.keys()))}",
+                )
+                yield gene_id, gene
+
 
 genes = Genes()
 
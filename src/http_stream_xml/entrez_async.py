@@ -0,0 +1,253 @@
+"""Asyncio version of entrez.Genes.
+
+Same semantics as Genes, but methods are coroutines and many genes are requested concurrently:
+
+    genes = AsyncGenes(concurrency=10)
+    gene = await genes['ppara']
+    all_genes = await genes.get_genes(['ppara', 'tp53'])
+
+Uses only stdlib asyncio streams. Responses are streamed into XmlStreamExtractor and the
+connection is closed as soon as all the tags are extracted.
+"""
+
+import asyncio
+import json
+import logging
+import ssl
+from collections.abc import Iterable, MutableMapping
+from time import perf_counter
+from typing import Any
+
+from http_stream_xml.entrez import (
+    ENTREZ_HOST,
+    FETCH_TIMEOUT_SECONDS,
+    MAX_BYTES_TO_FETCH,
+    GeneFields,
+    Genes,
+)
+from http_stream_xml.metrics import (
+    REASON_BYTE_CAP,
+    REASON_COMPLETED,
+    REASON_END,
+    REASON_ERROR,
+    REASON_TIMEOUT,
+    FetchRecord,
+    Sink,
+)
+from http_stream_xml.rate_limit import RateLimiter
+from http_stream_xml.xml_stream import XmlStreamExtractor
+
+# How many requests to Entrez can run at the same time.
+CONCURRENCY = 10
+
+# HTTP/1.0 so the server sends the body as is (not chunked) and closes connection after it.
+REQUEST = "GET {url} HTTP/1.0\r\nHost: {host}\r\nUser-Agent: {agent}\r\nConnection: close\r\n\r\n"
+USER_AGENT = "http-stream-xml"
+STATUS_OK = b"200"
+READ_SIZE = 16 * 1024
+
+log = logging.getLogger("")
+
+
+class AsyncGenes(Genes):
+    """Asyncio Genes client with bounded concurrency."""
+
+    _ssl_context: ssl.SSLContext | None  # see ssl_context, the ssl parameter hides the module
+
+    def __init__(  # noqa: PLR0913
+        self,
+        fields: list[str] | None = None,
+        timeout: int = FETCH_TIMEOUT_SECONDS,
+        max_bytes_to_fetch: int = MAX_BYTES_TO_FETCH,
+        api_key: str | None = None,
+        *,
+        rate_limiter: RateLimiter | None = None,
+        cache: MutableMapping[str, dict[str, Any]] | None = None,
+        concurrency: int = CONCURRENCY,
+        host: str = ENTREZ_HOST,
+        port: int | None = None,
+        ssl: bool = True,
+        metrics: Sink | None = None,
+    ) -> None:
+        """Init.
+
+        :param concurrency: max number of simultaneous requests to Entrez
+        Other parameters are the same as in Genes.
+        """
+        super().__init__(
+            fields=fields,
+            timeout=timeout,
+            max_bytes_to_fetch=max_bytes_to_fetch,
+            api_key=api_key,
+            rate_limiter=rate_limiter,
+            cache=cache,
+            host=host,
+            port=port,
+            ssl=ssl,
+            metrics=metrics,
+        )
+        if concurrency < 1:
+            raise ValueError("concurrency should be positive.")
+        self.concurrency = concurrency
+        self._semaphore: asyncio.Semaphore | None = None
+        self._semaphore_loop: asyncio.AbstractEventLoop | None = None
+        self._ssl_context = None
+
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        """SSL context shared by all requests, loading certificates is not cheap."""
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Concurrency limit for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def __getitem__(self, gene_name: str) -> dict[str, Any]:  # type: ignore[override]
+        """Get gene info from cache or from NCBI server if not found in cache."""
+        gene_name = self.canonical_gene_name(gene_name)
+        if (gene := self.get_cached(gene_name)) is not None:
+            return gene
+        gene = await self.get_gene_details(gene_name)
+        if gene:
+            self.db[gene_name] = gene
+        return gene
+
+    async def get_genes(self, gene_names: Iterable[str]) -> dict[str, dict[str, Any]]:
+        """Get info of many genes concurrently, {gene name: gene info}."""
+        names = list(gene_names)
+        details = await asyncio.gather(*(self[gene_name] for gene_name in names))
+        return dict(zip(names, details, strict=True))
+
+    async def request(
+        self,
+        url: str,
+        record: FetchRecord | None = None,
+    ) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Send GET request and read response headers.
+
+        Raises ConnectionError if response status is not 200 OK.
+
+        :param record: add connect (with DNS and TLS) and ttfb times and status to it
+        """
+        await self.get_rate_limiter().acquire_async()
+        context = self.ssl_context if self.ssl else None
+        port = self.port if self.port is not None else (443 if self.ssl else 80)
+        start = perf_counter()
+        reader, writer = await asyncio.open_connection(self.host, port, ssl=context)
+        connected = perf_counter()
+        try:
+            writer.write(REQUEST.format(url=url, host=self.host, agent=USER_AGENT).encode())
+            status_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass  # skip headers - with HTTP/1.0 we read body till connection close
+            if record is not None:
+                record.add("connect", connected - start)
+                record.add("ttfb", perf_counter() - connected)
+                status = status_line.split(maxsplit=2)[1:2]
+                record.status = int(status[0]) if status and status[0].isdigit() else None
+            if status_line.split(maxsplit=2)[1:2] != [STATUS_OK]:
+                raise ConnectionError(f"NCBI.Entrez response {status_line.decode().strip()!r}")
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def get_gene_id(self, gene_name: str) -> str | None:  # type: ignore[override]
+        """Get gene ID by gene name."""
+        subject = f'gene "{gene_name}"'
+        try:
+            async with self.semaphore, asyncio.timeout(self.timeout):
+                reader, writer = await self.request(self.search_id_url(gene_name))
+                try:
+                    body = await reader.read()
+                finally:
+                    writer.close()
+        except (OSError, TimeoutError) as e:
+            log.error(f"NCBI.Entrez {subject} ID request failed: {e!r}")
+            return None
+        try:
+            raw_resp = json.loads(body)
+        except ValueError:
+            log.error(f"NCBI.Entrez not JSON response for {subject} ID request:\n{body!r}")
+            return None
+        ids = self.ids_from_search_result(raw_resp, subject)
+        if not ids:
+            return None
+        if len(ids) > 1:
+            log.debug(
+                f'NCBI.Entrez: we found more than one ID for gene "{gene_name}" in response: {ids}',
+            )
+            candidates = await asyncio.gather(*(self.get_gene_details_by_id(id_) for id_ in ids))
+            for gene_id, gene in zip(ids, candidates, strict=True):
+                if self.canonical_gene_name(gene.get(GeneFields.locus, "")) == gene_name:
+                    self.db[gene_name] = gene  # cache response so we won't request it twice
+                    ids[0] = gene_id
+                    break
+                log.debug(f'Wrong id={gene_id} - locus is "{gene.get(GeneFields.locus)}"')
+        log.debug(f'NCBI.Entrez: we found gene "{gene_name}" ID: {ids[0]}')
+        return ids[0]
+
+    async def get_gene_details(self, gene_name: str) -> dict[str, Any]:  # type: ignore[override]
+        """Get gene details by gene name."""
+        if gene_id := await self.get_gene_id(gene_name):
+            return await self.get_gene_details_by_id(gene_id=gene_id)
+        return {}
+
+    async def get_gene_details_by_id(self, gene_id: str) -> dict[str, Any]:  # type: ignore[override]
+        """Download gene's details from NCBI entrez API, using gene's ID.
+
+        Stops reading and closes the connection as soon as all fields are extracted.
+        """
+        extractor = XmlStreamExtractor(self.fields)
+        url = self.get_details_url(gene_id)
+        record = FetchRecord(url) if self.metrics is not None else None
+        start = perf_counter()
+        fetched_bytes = 0
+        reason = REASON_END
+        try:
+            async with self.semaphore, asyncio.timeout(self.timeout):
+                reader, writer = await self.request(url, record)
+                try:
+                    while chunk := await reader.read(READ_SIZE):
+                        fetched_bytes += len(chunk)
+                        if record is None:
+                            extractor.feed_bytes(chunk)
+                        else:
+                            parse_start = perf_counter()
+                            extractor.feed_bytes(chunk)
+                            record.parse += perf_counter() - parse_start
+                        if extractor.extraction_completed:
+                            reason = REASON_COMPLETED
+                            break
+                        if fetched_bytes > self.max_bytes_to_fetch:
+                            log.debug(
+                                f"NCBI.Entrez fetched {fetched_bytes}. "
+                                f"Not all fields was found but no sense to fetch more.",
+                            )
+                            reason = REASON_BYTE_CAP
+                            break
+                finally:
+                    writer.close()
+        except TimeoutError:
+            log.error("NCBI.Entrez gene details fetch timeout")
+            reason = REASON_TIMEOUT
+        except OSError as e:
+            log.error(f"NCBI.Entrez gene {gene_id} details request failed: {e!r}")
+            reason = REASON_ERROR
+        if record is not None and self.metrics is not None:
+            record.total = perf_counter() - start
+            record.wire_bytes = record.body_bytes = fetched_bytes  # HTTP/1.0 body as is
+            record.reason = reason
+            self.metrics(record)
+        log.debug(
+            f"NCBI.Entrez result for gene {gene_id}: "
+            f"extracted tags {', '.join(list(extractor.tags.keys()))}",
+        )
+        return extractor.tags
@@ -22,10 +22,10 @@ def get_gene_info(gene_id: str | int) -> XmlStreamExtractor:
     )
 
     fetched_bytes = 0
-    for line in request.iter_lines(chunk_size=1024):
-        if line:
-            fetched_bytes += len(line)
-            extractor.feed(line)
+    for chunk in request.iter_content(chunk_size=1024):
+        if chunk:
+            fetched_bytes += len(chunk)
+            extractor.feed_bytes(chunk)
             if extractor.extraction_completed:
                 break
         print(f"fetched {fetched_bytes} bytes, found tags {extractor.tags.keys()}")
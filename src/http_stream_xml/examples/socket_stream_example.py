@@ -14,7 +14,7 @@ stream.connect()
 extractor = XmlStreamExtractor(["Gene-ref_desc", "Entrezgene_summary", "Gene-ref_syn"])
 
 for chunk in stream.fetch():
-    extractor.feed(chunk)
+    extractor.feed_bytes(chunk)
     print(f"fetched {stream.fetched_bytes} bytes, found tags {extractor.tags.keys()}")
     if extractor.extraction_completed:
         break
@@ -0,0 +1,188 @@
+"""Per-fetch timings and sizes, sent to pluggable sinks.
+
+Sink is any callable that takes FetchRecord. Pass it to Genes (or AsyncGenes):
+
+    histogram = Histogram()
+    genes = Genes(metrics=Sinks(histogram, lambda record: log.info(record.as_dict())))
+    ...
+    print(histogram.prometheus())  # Prometheus text exposition format
+
+Without metrics (the default) records are not created and nothing is timed.
+"""
+
+import bisect
+import itertools
+import threading
+from collections.abc import Callable, Sequence
+from typing import Any
+
+# Why the fetch stopped.
+REASON_COMPLETED = "completed"  # all tags are extracted
+REASON_TIMEOUT = "timeout"
+REASON_BYTE_CAP = "byte_cap"  # fetched max_bytes_to_fetch but not all tags are found
+REASON_END = "end"  # the response ended before all tags are found
+REASON_ERROR = "error"  # request failed
+REASONS = (REASON_COMPLETED, REASON_TIMEOUT, REASON_BYTE_CAP, REASON_END, REASON_ERROR)
+
+# Phases of the fetch, FetchRecord attributes with seconds.
+PHASES = ("dns", "connect", "tls", "ttfb", "parse", "total")
+
+# Upper bounds of Histogram buckets, seconds.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_PREFIX = "http_stream_xml"
+
+
+class FetchRecord:
+    """Timings and sizes of one fetch.
+
+    Phases not measured are None. SocketStream measures all of them for new connections.
+    AsyncGenes measures connect with DNS and TLS in it. With requests (Genes) only ttfb,
+    the time till response headers, with connecting if there was no idle connection.
+    """
+
+    __slots__ = (
+        "body_bytes",
+        "connect",
+        "dns",
+        "parse",
+        "reason",
+        "status",
+        "tls",
+        "total",
+        "ttfb",
+        "url",
+        "wire_bytes",
+    )
+
+    def __init__(self, url: str) -> None:
+        """Init."""
+        self.url = url
+        self.dns: float | None = None  # host name resolution
+        self.connect: float | None = None  # TCP connect
+        self.tls: float | None = None  # TLS handshake
+        self.ttfb: float | None = None  # from request sent till response head received
+        self.parse = 0.0  # in XML parser
+        self.total = 0.0  # the whole fetch
+        self.wire_bytes = 0  # received, compressed if the response is compressed
+        self.body_bytes = 0  # decoded body fed to the parser till the fetch stopped
+        self.status: int | None = None  # HTTP status
+        self.reason = REASON_END
+
+    def add(self, phase: str, seconds: float) -> None:
+        """Add seconds to the phase - there could be many requests (Range) or connections."""
+        setattr(self, phase, (getattr(self, phase) or 0.0) + seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Record as dict, for logging."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+Sink = Callable[[FetchRecord], None]
+
+
+class Sinks:
+    """Send each record to all the sinks."""
+
+    def __init__(self, *sinks: Sink) -> None:
+        """Init."""
+        self.sinks = sinks
+
+    def __call__(self, record: FetchRecord) -> None:
+        """Send the record to the sinks."""
+        for sink in self.sinks:
+            sink(record)
+
+
+class Histogram:
+    """In-memory histograms of fetch phases durations, with bytes and reasons counters."""
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS) -> None:
+        """Init.
+
+        :param buckets: upper bounds of the buckets in seconds, ascending
+        """
+        if list(buckets) != sorted(buckets) or not buckets:
+            raise ValueError("buckets should be non-empty and ascending.")
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counts = {phase: [0] * (len(self.buckets) + 1) for phase in PHASES}  # last is +Inf
+        self.sums = dict.fromkeys(PHASES, 0.0)
+        self.reasons = dict.fromkeys(REASONS, 0)
+        self.wire_bytes = 0
+        self.body_bytes = 0
+
+    def __call__(self, record: FetchRecord) -> None:
+        """Add the record."""
+        with self.lock:
+            for phase in PHASES:
+                if (seconds := getattr(record, phase)) is None:
+                    continue
+                self.counts[phase][self.bucket(seconds)] += 1
+                self.sums[phase] += seconds
+            self.reasons[record.reason] = self.reasons.get(record.reason, 0) + 1
+            self.wire_bytes += record.wire_bytes
+            self.body_bytes += record.body_bytes
+
+    def bucket(self, seconds: float) -> int:
+        """Index of the bucket for the duration."""
+        return bisect.bisect_left(self.buckets, seconds)
+
+    def quantile(self, phase: str, q: float) -> float | None:
+        """Upper bound of the bucket with the q-quantile of the phase durations.
+
+        None if there is no durations, inf if it is above all the buckets.
+        """
+        cumulative = list(itertools.accumulate(self.counts[phase]))
+        if not cumulative[-1]:
+            return None
+        index = bisect.bisect_left(cumulative, q * cumulative[-1])
+        return self.buckets[index] if index < len(self.buckets) else float("inf")
+
+    def stats(self) -> dict[str, Any]:
+        """Number of fetches by reason, bytes, and count and total seconds of each phase."""
+        with self.lock:
+            return {
+                "reasons": dict(self.reasons),
+                "wire_bytes": self.wire_bytes,
+                "body_bytes": self.body_bytes,
+                "phases": {
+                    phase: {"count": sum(self.counts[phase]), "sum": self.sums[phase]}
+                    for phase in PHASES
+                },
+            }
+
+    def prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """Metrics in Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_fetch_seconds Duration of fetch phases.",
+            f"# TYPE {prefix}_fetch_seconds histogram",
+        ]
+        with self.lock:
+            for phase in PHASES:
+                cumulative = 0
+                for bound, count in zip(
+                    [*map(str, self.buckets), "+Inf"],
+                    self.counts[phase],
+                    strict=True,
+                ):
+                    cumulative += count
+                    labels = f'phase="{phase}",le="{bound}"'
+                    lines.append(f"{prefix}_fetch_seconds_bucket{{{labels}}} {cumulative}")
+                lines.append(f'{prefix}_fetch_seconds_sum{{phase="{phase}"}} {self.sums[phase]}')
+                lines.append(f'{prefix}_fetch_seconds_count{{phase="{phase}"}} {cumulative}')
+            lines += [
+                f"# HELP {prefix}_fetches_total Fetches by the reason they stopped.",
+                f"# TYPE {prefix}_fetches_total counter",
+                *(
+                    f'{prefix}_fetches_total{{reason="{reason}"}} {count}'
+                    for reason, count in self.reasons.items()
+                ),
+                f"# HELP {prefix}_fetch_wire_bytes_total Bytes received.",
+                f"# TYPE {prefix}_fetch_wire_bytes_total counter",
+                f"{prefix}_fetch_wire_bytes_total {self.wire_bytes}",
+                f"# HELP {prefix}_fetch_body_bytes_total Decoded bytes parsed.",
+                f"# TYPE {prefix}_fetch_body_bytes_total counter",
+                f"{prefix}_fetch_body_bytes_total {self.body_bytes}",
+            ]
+        return "\n".join(lines) + "\n"
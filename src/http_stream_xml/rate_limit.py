@@ -0,0 +1,93 @@
+"""Token bucket rate limiter for Entrez requests.
+
+NCBI allows 3 requests per second without API key and 10 requests per second with it,
+above that it responds with HTTP 429.
+
+One limiter is shared by all Genes objects with the same API key (see shared_rate_limiter),
+so parallel threads and asyncio tasks together stay at the allowed rate.
+"""
+
+import asyncio
+import threading
+import time
+
+REQUESTS_PER_SECOND = 3
+REQUESTS_PER_SECOND_WITH_KEY = 10
+
+
+class RateLimiter:
+    """Thread-safe and asyncio-safe token bucket.
+
+    Each call takes a token. If there is no token, the call is delayed till the token
+    would be added to the bucket. Tokens are reserved under a lock and the waiting is done
+    outside of it, so the lock is never held while sleeping and the event loop is not blocked.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """Init.
+
+        :param rate: tokens per second
+        :param burst: bucket capacity - how many calls can go without delay after idle time.
+            Default 1 spaces calls evenly so no one-second window exceeds the rate.
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate and burst should be positive.")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.calls = 0
+        self.delayed_calls = 0
+        self.total_wait = 0.0  # seconds
+        self.max_wait = 0.0  # seconds
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # negative tokens are reserved by calls that are waiting now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.calls += 1
+            if wait > 0:
+                self.delayed_calls += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def acquire(self) -> float:
+        """Wait for a token (blocking), return seconds waited."""
+        if (wait := self.reserve()) > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Wait for a token (asyncio), return seconds waited."""
+        if (wait := self.reserve()) > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self) -> dict[str, float]:
+        """How many calls were made and how long they waited."""
+        return {
+            "calls": self.calls,
+            "delayed_calls": self.delayed_calls,
+            "total_wait": self.total_wait,
+            "max_wait": self.max_wait,
+        }
+
+
+_shared_limiters: dict[str | None, RateLimiter] = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def shared_rate_limiter(api_key: str | None) -> RateLimiter:
+    """Get limiter shared by all requests with the API key, with the rate NCBI allows for it."""
+    with _shared_limiters_lock:
+        if (limiter := _shared_limiters.get(api_key)) is None:
+            rate = REQUESTS_PER_SECOND if api_key is None else REQUESTS_PER_SECOND_WITH_KEY
+            limiter = _shared_limiters[api_key] = RateLimiter(rate)
+        return limiter
@@ -0,0 +1,229 @@
+"""Skip-ahead pre-scanner for XmlStreamExtractor.
+
+Finds start tags of the collected elements by regex search in the raw bytes and passes
+to the XML parser only these elements (with their content), inside a synthetic root element.
+Everything between them is not tokenized at all, so when the targets are deep inside
+a big document the parser does a small part of the work.
+
+Works only for selectors that are element names (`name` or `//name`, with predicates or
+`/@attribute`) - the name of any matching element is enough to find it.
+"""
+
+import re
+from collections.abc import Iterable
+
+from http_stream_xml.tag_path import ANY_NAME, DESCENDANT, Selector
+
+# Synthetic root element around the passed elements.
+ROOT = "http-stream-xml-skip-ahead"
+
+UTF8_BOM = b"\xef\xbb\xbf"
+XML_DECLARATION = b"<?xml"
+
+# Starts of documents in not ASCII compatible encodings (UTF-16 with and without BOM).
+NOT_ASCII_COMPATIBLE = (b"\xff\xfe", b"\xfe\xff", b"\x00<", b"<\x00")
+
+# Encoding pseudo-attribute of the XML declaration.
+ENCODING_DECLARATION = re.compile(rb"""\s+encoding\s*=\s*(?:"[^"]*"|'[^']*')""")
+
+# Comment, processing instruction or DOCTYPE (till its end or internal subset start)
+# with whitespace before it.
+PROLOG_ITEM = re.compile(
+    rb"""\s*(?:<!--.*?-->|<\?.*?\?>|<!DOCTYPE(?:[^\[>"']|"[^"]*"|'[^']*')*[\[>])""",
+    re.DOTALL,
+)
+PROLOG_STARTS = (b"<!--", b"<?", b"<!DOCTYPE")
+
+# Markup that could contain text looking like tags, and its end.
+SKIPPED = {b"<!--": b"-->", b"<![CDATA[": b"]]>", b"<?": b"?>"}
+SKIPPED_PATTERN = rb"<!--|<!\[CDATA\[|<\?"
+
+# Rest of the start tag after the element name (attribute values could contain ">").
+START_TAG_REST = re.compile(rb"""(?:[^>"']|"[^"]*"|'[^']*')*>""")
+
+
+def target_names(selectors: Iterable[str]) -> list[str] | None:
+    """Names of the elements to pass, None if some selector is not just element name."""
+    names = []
+    for selector in selectors:
+        steps = Selector(selector).steps
+        if len(steps) != 1 or steps[0][0] != DESCENDANT or steps[0][1] == ANY_NAME:
+            return None
+        names.append(steps[0][1])
+    return list(dict.fromkeys(names))
+
+
+def declaration_end(prolog: bytes) -> int:
+    """End of the XML declaration (with BOM) in the read prolog, 0 if there is none."""
+    start = len(UTF8_BOM) if prolog.startswith(UTF8_BOM) else 0
+    if not prolog.startswith(XML_DECLARATION, start):
+        return 0
+    return prolog.index(b"?>") + 2
+
+
+class SkipAhead:
+    """Pass to the parser only elements with given names, in a synthetic root element.
+
+    Comments, CDATA sections and processing instructions are skipped as a whole, so names
+    inside them are not taken for tags. The XML declaration is passed as is (without encoding
+    for text documents), so the encoding should be ASCII compatible (UTF-8, ISO-8859-1, ...).
+    Falls back to passing the whole document if it has an internal DTD subset (it could define
+    entities used in the elements) or is in not ASCII compatible encoding.
+    Well-formedness of the skipped parts is not checked.
+    """
+
+    def __init__(self, names: Iterable[str]) -> None:
+        """Init.
+
+        :param names: names of the elements to pass
+        """
+        encoded = [name.encode() for name in names]
+        if not encoded:
+            raise ValueError("No element names to pass.")
+        self.target = re.compile(
+            SKIPPED_PATTERN + rb"|<(" + b"|".join(map(re.escape, encoded)) + rb")(?=[\s/>])",
+        )
+        # enough to find markup split between chunks
+        self.keep = max(len(b"<![CDATA["), *(len(name) + 3 for name in encoded))
+        self.inside: dict[bytes, re.Pattern[bytes]] = {}  # by name, see tags_inside
+        self.reset()
+
+    def reset(self) -> None:
+        """Start new document."""
+        self.buffer = b""  # not yet scanned (or not yet passed) tail of the data
+        self.prolog = True  # the document prolog is not read yet
+        # the document is str encoded to UTF-8, not the encoding from its declaration
+        self.text = False
+        self.full = False  # pass all the document
+        self.until: bytes | None = None  # end of the skipped markup we are in
+        self.name = b""  # of the passed element we are in, b"" - outside of them
+        self.depth = 0  # of the nested elements with the same name
+
+    def tags_inside(self, name: bytes) -> re.Pattern[bytes]:
+        """Markup to look for inside the element: skipped, start tag or end tag of the name."""
+        if (pattern := self.inside.get(name)) is None:
+            tag = re.escape(name)
+            pattern = self.inside[name] = re.compile(
+                SKIPPED_PATTERN + rb"|<(" + tag + rb")(?=[\s/>])|</" + tag + rb"\s*>",
+            )
+        return pattern
+
+    def feed(self, data: bytes | memoryview) -> list[bytes]:
+        """Scan next part of the document.
+
+        :return: parts to feed to the parser
+        """
+        if self.full:
+            return [bytes(data)]
+        buffer = self.buffer + data
+        parts: list[bytes] = []
+        pos = 0  # where to start scanning
+        if self.prolog:
+            if (prolog_end := self.read_prolog(buffer)) is None:
+                self.buffer = buffer
+                return parts
+            end = declaration_end(buffer)
+            declaration = buffer[:end]
+            if self.text:  # the declared encoding is not the encoding of the bytes
+                declaration = ENCODING_DECLARATION.sub(b"", declaration)
+            if self.full:
+                self.buffer = b""
+                return [declaration + buffer[end:]]
+            parts.append(declaration + f"<{ROOT}>".encode())
+            pos = prolog_end
+        pos = self.scan(buffer, pos, parts)
+        self.buffer = buffer[pos:]
+        return parts
+
+    def scan(self, buffer: bytes, pos: int, parts: list[bytes]) -> int:
+        """Scan the buffer from the pos, add parts to pass.
+
+        :return: end of the scanned part, the rest should be scanned with the next data
+        """
+        passed = pos  # start of the not yet passed part of the current element
+        while True:
+            if self.until is not None:
+                pos = self.skip(buffer, pos, self.until)
+                if self.until is not None:
+                    break
+                continue
+            pattern = self.tags_inside(self.name) if self.name else self.target
+            if (match := pattern.search(buffer, pos)) is None:
+                pos = max(pos, len(buffer) - self.keep)
+                break
+            if (skipped_end := SKIPPED.get(match.group())) is not None:
+                pos = match.end()
+                self.until = skipped_end
+            elif (name := match.group(1)) is None:  # end tag of the passed element name
+                pos = match.end()
+                self.close_element(buffer, passed, pos, parts)
+            elif (rest := START_TAG_REST.match(buffer, match.end())) is None:
+                pos = match.start()  # wait for the end of the start tag
+                break
+            else:
+                if not self.name:
+                    passed = match.start()
+                pos = rest.end()
+                self.open_element(name, buffer, passed, pos, parts)
+        if self.name:
+            parts.append(buffer[passed:pos])
+        return pos
+
+    def skip(self, buffer: bytes, pos: int, until: bytes) -> int:
+        """Skip the markup till its end (until), return position after it.
+
+        If the end is not in the buffer, until stays set and the position is where
+        to continue with the next data.
+        """
+        if (end := buffer.find(until, pos)) < 0:
+            return max(pos, len(buffer) - len(until) + 1)
+        self.until = None
+        return end + len(until)
+
+    def open_element(  # noqa: PLR0913
+        self,
+        name: bytes,
+        buffer: bytes,
+        passed: int,
+        end: int,
+        parts: list[bytes],
+    ) -> None:
+        """Start tag of the element with the name, ends at the end position in the buffer.
+
+        :param passed: start of the not yet passed part of the current element
+        """
+        if buffer.endswith(b"/>", 0, end):  # empty element tag
+            if not self.name:
+                parts.append(buffer[passed:end])
+            return
+        self.name = name
+        self.depth += 1
+
+    def close_element(self, buffer: bytes, passed: int, end: int, parts: list[bytes]) -> None:
+        """End tag of the passed element name, ends at the end position in the buffer."""
+        self.depth -= 1
+        if not self.depth:
+            parts.append(buffer[passed:end])
+            self.name = b""
+
+    def read_prolog(self, buffer: bytes) -> int | None:
+        """End of the prolog (start of the root element), None if it is not in the buffer yet.
+
+        Sets full if the whole document should be passed.
+        """
+        if len(buffer) < len(NOT_ASCII_COMPATIBLE[0]):
+            return None
+        if buffer.startswith(NOT_ASCII_COMPATIBLE):
+            self.full = True
+            return 0
+        pos = len(UTF8_BOM) if buffer.startswith(UTF8_BOM) else 0
+        while item := PROLOG_ITEM.match(buffer, pos):
+            if item.group().endswith(b"["):  # internal DTD subset
+                self.full = True
+                return 0
+            pos = item.end()
+        rest = buffer[pos:].lstrip()
+        if not rest or any(start.startswith(rest[: len(start)]) for start in PROLOG_STARTS):
+            return None  # only whitespace or incomplete prolog item
+        self.prolog = False
+        return pos
@@ -1,31 +1,281 @@
+import re
 import socket
 import ssl
-from collections.abc import Iterator
+import threading
+import zlib
+from collections.abc import Iterable, Iterator, Sequence
+from time import perf_counter
 
-HEADER = (
-    "GET {url} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {agent}\r\n"
-    "Content-Type: application/x-www-form-urlencoded; charset=UTF-8\r\nContent-Length: 0"
-)
-END_OF_REQUEST = (
-    b"\r\n\r\n\r\n\r\n"  # two times CR/LF + empty body + 2 times CR/LF to complete the request
-)
-END_OF_LINE = "\r\n"
-BEGIN_OF_BODY = "\r\n\r\n"
+from http_stream_xml.metrics import FetchRecord
+
+HEADER = "GET {url} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {agent}\r\nConnection: {connection}"
+END_OF_REQUEST = b"\r\n\r\n"  # CR/LF after the last header + empty line, GET has no body
+ACCEPT_ENCODING = "gzip, deflate"
+BEGIN_OF_BODY = b"\r\n\r\n"
+BUFSIZE = 64 * 1024
+NEW_LINE = re.compile(b"\r?\n")
+
+# ChunkedDecoder states
+CHUNK_SIZE = 0  # expect chunk size line
+CHUNK_DATA = 1  # inside chunk data
+CHUNK_DATA_END = 2  # expect line end after chunk data
+CHUNK_TRAILER = 3  # after last (zero size) chunk, expect trailers and empty line
+
+# Max idle connections kept by ConnectionPool for one (host, port, ssl).
+MAX_IDLE_CONNECTIONS = 4
+# Max bytes ConnectionPool reads from the rest of an aborted response to reuse its connection.
+DRAIN_LIMIT = 64 * 1024
+
+PoolKey = tuple[str, int, bool]  # (host, port, ssl)
+
+# Sizes of the response beginning fetched by consecutive Range requests (see range_windows).
+RANGE_SIZES = (4 * 1024, 16 * 1024, 64 * 1024)
+HTTP_PARTIAL_CONTENT = 206
+HTTP_RANGE_NOT_SATISFIABLE = 416
+
+# zlib.decompressobj wbits for supported Content-Encoding.
+CONTENT_ENCODING_WBITS = {
+    "gzip": 16 + zlib.MAX_WBITS,
+    "x-gzip": 16 + zlib.MAX_WBITS,
+    "deflate": zlib.MAX_WBITS,
+}
+
+Range = tuple[int, int | None]  # (first byte, last byte or None - till the end)
+
+
+def range_windows(
+    max_bytes: int | None = None,
+    sizes: Sequence[int] = RANGE_SIZES,
+) -> Iterator[Range]:
+    """Byte ranges of progressive Range requests.
+
+    Each range continues the previous one, so together they fetch first sizes[0], then sizes[1]
+    bytes and so on. After the last size the range is till the end of the response,
+    or till max_bytes.
+    """
+    start = 0
+    for size in sizes:
+        end = size if max_bytes is None else min(size, max_bytes)
+        if end <= start:
+            return
+        yield start, end - 1
+        start = end
+    if max_bytes is None:
+        yield start, None
+    elif max_bytes > start:
+        yield start, max_bytes - 1
+
+
+def range_header(byte_range: Range) -> str:
+    """Value of Range header."""
+    first, last = byte_range
+    return f"bytes={first}-{'' if last is None else last}"
+
+
+def skip_bytes[Part: (bytes, memoryview)](parts: Iterable[Part], count: int) -> Iterator[Part]:
+    """Skip first count bytes of the parts, for the server that ignored Range."""
+    for part in parts:
+        if count >= len(part):
+            count -= len(part)
+            continue
+        yield part[count:]
+        count = 0
+
+
+class ConnectionPool:
+    """Persistent HTTP/1.1 connections, keyed by (host, port, ssl).
+
+    SocketStream with the pool takes an idle connection (or opens a new one) in connect()
+    and returns it to the pool as soon as the response is read to the end.
+    If the reading was stopped early, SocketStream.close() reads the rest of the response
+    when it is not longer than drain_limit, otherwise the connection is closed.
+    Thread-safe, so one pool can be shared by all streams.
+    """
+
+    def __init__(
+        self,
+        max_idle: int = MAX_IDLE_CONNECTIONS,
+        drain_limit: int = DRAIN_LIMIT,
+    ) -> None:
+        """Init.
+
+        :param max_idle: max idle connections to keep for one (host, port, ssl)
+        :param drain_limit: max bytes to read from the rest of aborted response
+        """
+        if max_idle < 1:
+            raise ValueError("max_idle should be positive.")
+        self.max_idle = max_idle
+        self.drain_limit = drain_limit
+        self.idle: dict[PoolKey, list[socket.socket]] = {}
+        self.lock = threading.Lock()
+        self._ssl_context: ssl.SSLContext | None = None
+
+        self.connections = 0  # new connections opened
+        self.handshakes = 0  # TLS handshakes
+        self.reused = 0  # connections taken from the pool
+        self.released = 0  # connections returned to the pool
+        self.drained = 0  # aborted responses read to the end to return the connection
+        self.discarded = 0  # connections closed instead of returning to the pool
+
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        """SSL context shared by all connections, loading certificates is not cheap."""
+        if self._ssl_context is None:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            self._ssl_context = context
+        return self._ssl_context
+
+    def acquire(
+        self,
+        key: PoolKey,
+        record: FetchRecord | None = None,
+    ) -> tuple[socket.socket, bool]:
+        """Get idle connection or open new one, return (socket, True if it was idle).
+
+        :param record: add the new connection dns, connect and tls times to it
+        """
+        with self.lock:
+            if idle := self.idle.get(key):
+                self.reused += 1
+                return idle.pop(), True  # the most recently used is the least likely to be stale
+        return self.open(key, record), False
+
+    def open(self, key: PoolKey, record: FetchRecord | None = None) -> socket.socket:
+        """Open new connection.
+
+        :param record: add dns, connect and tls times to it
+        """
+        host, port, use_ssl = key
+        if record is None:
+            sock = socket.create_connection((host, port))
+        else:
+            start = perf_counter()
+            address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4]
+            resolved = perf_counter()
+            sock = socket.create_connection((str(address[0]), port))
+            record.add("dns", resolved - start)
+            record.add("connect", perf_counter() - resolved)
+        with self.lock:
+            self.connections += 1
+        if not use_ssl:
+            return sock
+        try:
+            start = perf_counter()
+            sock = self.ssl_context.wrap_socket(sock, server_hostname=host)
+            if record is not None:
+                record.add("tls", perf_counter() - start)
+        except BaseException:
+            sock.close()
+            raise
+        with self.lock:
+            self.handshakes += 1
+        return sock
+
+    def release(self, key: PoolKey, sock: socket.socket, drained: bool = False) -> None:
+        """Return connection with the response read to the end."""
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(sock)
+                self.released += 1
+                self.drained += drained
+                return
+        self.discard(sock)
+
+    def discard(self, sock: socket.socket) -> None:
+        """Close connection that cannot be reused."""
+        with self.lock:
+            self.discarded += 1
+        sock.close()
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        with self.lock:
+            idle = [sock for socks in self.idle.values() for sock in socks]
+            self.idle.clear()
+        for sock in idle:
+            sock.close()
+
+    def stats(self) -> dict[str, int]:
+        """Pool statistics."""
+        return {
+            "connections": self.connections,
+            "handshakes": self.handshakes,
+            "reused": self.reused,
+            "released": self.released,
+            "drained": self.drained,
+            "discarded": self.discarded,
+            "idle": sum(len(socks) for socks in self.idle.values()),
+        }
 
 
 class SocketStream:
-    """Simple socket stream reader."""
+    """Simple socket stream reader.
 
-    def __init__(self, host: str, url: str, ssl: bool = True, port: int = 443) -> None:
-        """Init."""
+    fetch() receives data into one preallocated buffer (socket.recv_into) and yields
+    memoryview slices of it, so there are no allocations per read.
+
+    With ConnectionPool the connection is taken from the pool in connect() and returned to it
+    after the response is read, so close() the stream even if fetch() was stopped early.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        host: str,
+        url: str,
+        ssl: bool = True,
+        port: int = 443,
+        bufsize: int = BUFSIZE,
+        *,
+        pool: ConnectionPool | None = None,
+        compression: bool = True,
+    ) -> None:
+        """Init.
+
+        :param bufsize: size of the receive buffer - max bytes per socket read
+        :param pool: keep-alive connections pool, without it the connection is closed
+            after the response
+        :param compression: ask for gzip/deflate compressed response and decompress it
+            on the fly. Not used for Range requests, they are for the uncompressed response.
+        """
         self.host = host
         self.url = url
         self.agent = "For the lulz.."
         self.ssl = ssl
         self.port = port
+        self.buffer = bytearray(bufsize)
+        self.pool = pool
+        self.range: Range | None = None  # request only the part of the response
+        self.compression = compression
 
-        self.socket = self.get_socket()
-        self.fetched_bytes = 0
+        if pool is None:
+            self.socket = self.get_socket()
+        self.reused = False  # connection was taken from the pool
+        self.in_use = False  # pooled connection is not released or discarded yet
+        self.keep_alive = False  # the response allows to reuse the connection
+        self.decoder: ChunkedDecoder | None = None  # for chunked response
+        self.body_remaining = -1  # bytes left to read, -1 - unknown
+        self.fetched_bytes = 0  # received from the socket, including headers
+        self.decoded_bytes = 0  # body bytes after decompression, yielded by fetch()
+        self.fetched_before = 0  # fetched_bytes before the current response
+        self.status: int | None = None  # response status, after fetch() started
+        self.headers: dict[str, str] = {}  # response headers (lower case names)
+        # set it before connect() to measure connection phases, ttfb and sizes, see metrics module
+        self.record: FetchRecord | None = None
+        self.recorded = (0, 0)  # fetched_bytes and decoded_bytes already added to the record
+        self.sent_at = 0.0  # perf_counter() when the request was sent
+
+    def reset(self) -> None:
+        """Forget previous response."""
+        self.reused = False
+        self.keep_alive = False
+        self.decoder = None
+        self.body_remaining = -1
+        self.fetched_before = self.fetched_bytes
+        self.recorded = self.fetched_bytes, self.decoded_bytes
+        self.status = None
+        self.headers = {}
 
     def get_socket(self) -> socket.socket:
         """Get socket object."""
@@ -34,46 +284,352 @@ class SocketStream:
         context.check_hostname = False
         return context.wrap_socket(sock) if self.ssl else sock
 
+    @property
+    def key(self) -> PoolKey:
+        """Connection pool key."""
+        return self.host, self.port, self.ssl
+
     @property
     def header(self) -> bytes:
         """Get HTTP header."""
-        return HEADER.format(host=self.host, url=self.url, agent=self.agent).encode()
+        header = HEADER.format(
+            host=self.host,
+            url=self.url,
+            agent=self.agent,
+            connection="close" if self.pool is None else "keep-alive",
+        )
+        if self.range is not None:
+            header += f"\r\nRange: {range_header(self.range)}"
+        elif self.compression:
+            header += f"\r\nAccept-Encoding: {ACCEPT_ENCODING}"
+        return header.encode()
 
     def connect(self) -> None:
-        """Connect to host and send header."""
-        self.socket.connect((self.host, self.port))
-        self.socket.send(self.header + END_OF_REQUEST)
+        """Connect to host (or take connection from the pool) and send header."""
+        self.reset()
+        if self.pool is None:
+            if self.record is None:
+                self.socket.connect((self.host, self.port))
+            else:
+                self.timed_connect(self.record)
+            self.socket.send(self.header + END_OF_REQUEST)
+            self.sent_at = perf_counter()
+            return
+        self.socket, self.reused = self.pool.acquire(self.key, self.record)
+        self.in_use = True
+        try:
+            self.socket.sendall(self.header + END_OF_REQUEST)
+            self.sent_at = perf_counter()
+        except OSError:
+            if not self.reused:
+                self.close()
+                raise
+            self.reopen(self.pool)
+
+    def timed_connect(self, record: FetchRecord) -> None:
+        """Connect, adding dns, connect and tls times to the record."""
+        start = perf_counter()
+        address = socket.getaddrinfo(self.host, self.port, self.socket.family, socket.SOCK_STREAM)
+        resolved = perf_counter()
+        record.add("dns", resolved - start)
+        if not isinstance(self.socket, ssl.SSLSocket):
+            self.socket.connect(address[0][4])
+            record.add("connect", perf_counter() - resolved)
+            return
+        # to time the handshake separately
+        self.socket.do_handshake_on_connect = False  # type: ignore[attr-defined]
+        self.socket.connect(address[0][4])
+        connected = perf_counter()
+        record.add("connect", connected - resolved)
+        self.socket.do_handshake()
+        record.add("tls", perf_counter() - connected)
+
+    def reopen(self, pool: ConnectionPool) -> None:
+        """Replace pooled connection, closed by the server while it was idle, with a new one."""
+        pool.discard(self.socket)
+        self.socket, self.reused = pool.open(self.key, self.record), False
+        self.socket.sendall(self.header + END_OF_REQUEST)
+        self.sent_at = perf_counter()
 
     def close(self) -> None:
-        """Close socket."""
-        self.socket.close()
+        """Close socket.
 
-    def read(self, bufsize: int = 1024) -> str:
-        """Read from socket."""
+        With the pool return the connection to it if the response was read to the end
+        or the rest of it is not longer than pool.drain_limit.
+        """
+        self.record_bytes()
+        if self.pool is None:
+            self.socket.close()
+            return
+        if not self.in_use:
+            return
+        self.in_use = False
+        complete = self.decoder.done if self.decoder is not None else self.body_remaining == 0
+        if self.keep_alive and not complete:
+            try:
+                complete = self.drain(self.pool.drain_limit)
+            except (BufferError, OSError, ValueError):
+                complete = False
+            if complete:
+                self.pool.release(self.key, self.socket, drained=True)
+                return
+        if self.keep_alive and complete:
+            self.pool.release(self.key, self.socket)
+        else:
+            self.pool.discard(self.socket)
+
+    def drain(self, limit: int) -> bool:
+        """Read the rest of the response if it is not longer than limit, True if read."""
+        if self.decoder is not None:
+            while not self.decoder.done:
+                if limit <= 0:
+                    return False
+                data = self.read_into()
+                limit -= len(data)
+                self.decoder.feed(data)
+            return True
+        if not 0 <= self.body_remaining <= limit:
+            return False
+        while self.body_remaining > 0:
+            self.body_remaining -= len(self.read_into())
+        return self.body_remaining == 0
+
+    def read(self, bufsize: int = 1024) -> bytes:
+        """Read from socket.
+
+        Returns raw bytes - decoding is up to the XML parser (see XmlStreamExtractor.feed_bytes),
+        so multibyte characters split between reads are not broken.
+        """
         buf = self.socket.recv(bufsize)
         if not buf:
             raise BufferError("Buffer is empty")
         self.fetched_bytes += len(buf)
-        return buf.decode()
+        return buf
+
+    def read_into(self) -> memoryview:
+        """Read from socket into the stream buffer.
+
+        Returns the buffer part with the data, it is valid only till the next read.
+        """
+        size = self.socket.recv_into(self.buffer)
+        if not size:
+            raise BufferError("Buffer is empty")
+        self.fetched_bytes += size
+        return memoryview(self.buffer)[:size]
+
+    def read_head(self) -> bytearray:
+        """Read response status line and headers, return the beginning of the body."""
+        head = bytearray()
+        while (body_start := head.find(BEGIN_OF_BODY)) < 0:
+            head += self.read_into()
+        lines = head[:body_start].decode("latin-1").split("\r\n")
+        status = lines[0].split(maxsplit=2)
+        self.status = int(status[1]) if len(status) > 1 and status[1].isdigit() else None
+        self.headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            self.headers[name.strip().lower()] = value.strip()
+        self.keep_alive = (
+            status[0] == "HTTP/1.1"
+            and "close" not in self.headers.get("connection", "").lower()
+            and ("content-length" in self.headers or self.chunked)
+        )
+        return head[body_start + len(BEGIN_OF_BODY) :]
+
+    def fetch(self, bufsize: int | None = None) -> Iterator[memoryview]:
+        """Fetch response body from socket.
+
+        Yields parts of the body as memoryview, to feed to XmlStreamExtractor.feed_bytes.
+        Each part is valid only till the next one is requested - it is in the reused buffer.
+        Removes chunked transfer encoding and gzip/deflate compression if the server uses it.
+        Stops at the end of the body (chunked or Content-Length) or when the server
+        closes the connection.
+
+        :param bufsize: change the receive buffer size
+        """
+        if bufsize is not None and bufsize != len(self.buffer):
+            self.buffer = bytearray(bufsize)
+        yield from self.read_response(self.start_response())
+
+    def fetch_ranges(
+        self,
+        max_bytes: int | None = None,
+        sizes: Sequence[int] = RANGE_SIZES,
+    ) -> Iterator[memoryview]:
+        """Fetch response body with Range requests of growing size (see range_windows).
+
+        The next range is requested only after the previous one was consumed, so if you stop
+        as soon as you have all you need, the server does not send more than the current range.
+        Connects by itself - do not call connect() before. With ConnectionPool all the
+        requests go in one connection.
+        If the server ignores Range, yields the rest of its full response, as fetch().
+        """
+        fetched = 0  # body bytes already yielded
+        for byte_range in range_windows(max_bytes, sizes):
+            if fetched:
+                self.close()
+                if self.pool is None:
+                    self.socket = self.get_socket()
+            self.range = byte_range
+            self.connect()
+            body_start = self.start_response()
+            if self.status == HTTP_RANGE_NOT_SATISFIABLE:  # previous range was the end
+                self.close()
+                return
+            if self.status != HTTP_PARTIAL_CONTENT:
+                yield from skip_bytes(self.read_response(body_start), fetched)
+                return
+            received = 0
+            for part in self.read_response(body_start):
+                received += len(part)
+                yield part
+            fetched += received
+            first, last = byte_range
+            if last is None or received < last - first + 1:  # got less - it's the end
+                return
+
+    def start_response(self) -> bytearray:
+        """Read response head, return the beginning of the body.
 
-    def is_chunk_head_line(self, line: str) -> bool:
-        """Check if line is chunk head line."""
-        chunk_id_max_length = 5
-        return 0 < len(line) < chunk_id_max_length and line[0] in "0123456789abcdef"
+        Retries once with a new connection if idle pooled connection was closed by the server.
+        """
+        try:
+            body_start = self.read_head()
+        except (BufferError, OSError):
+            if self.pool is None or not self.reused or self.fetched_bytes > self.fetched_before:
+                raise
+            self.reopen(self.pool)
+            body_start = self.read_head()
+        if self.record is not None:
+            self.record.add("ttfb", perf_counter() - self.sent_at)
+            self.record.status = self.status
+        return body_start
 
-    def fetch(self, bufsize: int = 1024) -> Iterator[str]:
-        """Fetch data from socket."""
-        chunk = ""
+    def read_response(self, body_start: bytearray) -> Iterator[memoryview]:
+        """Read response body, starting with the data received with the head.
+
+        Decompresses the body if it has gzip or deflate Content-Encoding.
+        """
+        parts = self.read_chunked(body_start) if self.chunked else self.read_body(body_start)
+        content_encoding = self.headers.get("content-encoding", "").lower()
+        if (wbits := CONTENT_ENCODING_WBITS.get(content_encoding)) is not None:
+            parts = self.decompress(parts, wbits)
+        for part in parts:
+            self.decoded_bytes += len(part)
+            yield part
+        self.record_bytes()
+        if self.pool is not None:
+            self.close()  # release the connection to the pool
+
+    def record_bytes(self) -> None:
+        """Add bytes received and decoded since the last call to the record."""
+        if self.record is None:
+            return
+        fetched, decoded = self.recorded
+        self.record.wire_bytes += self.fetched_bytes - fetched
+        self.record.body_bytes += self.decoded_bytes - decoded
+        self.recorded = self.fetched_bytes, self.decoded_bytes
+
+    @property
+    def chunked(self) -> bool:
+        """Response has chunked transfer encoding."""
+        return "chunked" in self.headers.get("transfer-encoding", "").lower()
+
+    def decompress(self, parts: Iterator[memoryview], wbits: int) -> Iterator[memoryview]:
+        """Decompress body parts, at most the buffer size at once.
+
+        Decompresses only what was asked for, so if the caller stops iterating
+        the rest of the body is not decompressed.
+        """
+        decompressor = zlib.decompressobj(wbits)
+        for part in parts:
+            data: bytes | memoryview = part
+            while data:
+                if output := decompressor.decompress(data, len(self.buffer)):
+                    yield memoryview(output)
+                data = decompressor.unconsumed_tail
+        if output := decompressor.flush():
+            yield memoryview(output)
+
+    def read_chunked(self, data: bytearray | memoryview) -> Iterator[memoryview]:
+        """Read body with chunked transfer encoding, starting with received data."""
+        self.decoder = ChunkedDecoder()
         while True:
-            chunk += self.read(bufsize)
-            body_start = chunk.find(BEGIN_OF_BODY)
-            if body_start >= 0:
-                chunk = chunk[body_start + len(BEGIN_OF_BODY) :]  # Correct the slice position
-                break
+            yield from self.decoder.feed(data)
+            if self.decoder.done:
+                return
+            data = self.read_into()
+
+    def read_body(self, data: bytearray | memoryview) -> Iterator[memoryview]:
+        """Read body till Content-Length or connection close, starting with received data."""
+        self.body_remaining = int(self.headers.get("content-length", -1))
         while True:
-            result: list[str] = [
-                line for line in chunk.split(END_OF_LINE)[:-1] if not self.is_chunk_head_line(line)
-            ]
-            yield END_OF_LINE.join(result)
-            chunk = chunk.split("\r\n")[-1]  # start collecting with uncomplete line
-            chunk += self.read(bufsize)
+            if self.body_remaining >= 0:
+                data = data[: self.body_remaining]
+                self.body_remaining -= len(data)
+            if data:
+                yield memoryview(data)
+            if self.body_remaining == 0:
+                return
+            try:
+                data = self.read_into()
+            except BufferError:
+                if self.body_remaining > 0:
+                    raise
+                return  # body without length ends when server closes connection
+
+
+class ChunkedDecoder:
+    """Incremental decoder of HTTP/1.1 chunked transfer encoding.
+
+    Feed it bytes as they come from the socket, it returns parts of the body as memoryview
+    slices of the fed data - without copying and without splitting the data into lines.
+    Chunk extensions and trailers are skipped.
+    """
+
+    def __init__(self) -> None:
+        """Init."""
+        self.state = CHUNK_SIZE
+        self.remaining = 0  # bytes left in the current chunk
+        self.line = bytearray()  # incomplete chunk size or trailer line from previous feed
+        self.done = False
+
+    def feed(self, data: bytes | bytearray | memoryview) -> list[memoryview]:
+        """Decode next part of the response body."""
+        view = memoryview(data)
+        size = len(view)
+        pos = 0
+        parts: list[memoryview] = []
+        while pos < size and not self.done:
+            if self.state == CHUNK_DATA:
+                end = min(pos + self.remaining, size)
+                parts.append(view[pos:end])
+                self.remaining -= end - pos
+                pos = end
+                if self.remaining == 0:
+                    self.state = CHUNK_DATA_END
+                continue
+            if (line_end := NEW_LINE.search(view, pos)) is None:
+                self.line += view[pos:]
+                break
+            line = bytes(self.line + view[pos : line_end.start()]) if self.line else None
+            self.line.clear()
+            self.on_line(line if line is not None else view[pos : line_end.start()])
+            pos = line_end.end()
+        return parts
+
+    def on_line(self, line: bytes | memoryview) -> None:
+        """Process chunk size, chunk data end or trailer line."""
+        if self.state == CHUNK_SIZE:
+            size = bytes(line).split(b";", 1)[0].strip()  # skip chunk extensions
+            try:
+                self.remaining = int(size, 16)
+            except ValueError:
+                raise ValueError(f"Invalid chunk size line {bytes(line)!r}") from None
+            self.state = CHUNK_DATA if self.remaining else CHUNK_TRAILER
+        elif self.state == CHUNK_DATA_END:
+            if bytes(line).strip():
+                raise ValueError(f"No line end after chunk data: {bytes(line)!r}")
+            self.state = CHUNK_SIZE
+        elif not bytes(line).strip():  # empty line ends trailers and the body
+            self.done = True
@@ -0,0 +1,392 @@
+"""Local stand-in for Entrez E-utilities, to test and benchmark without network access.
+
+Serves esearch and esummary JSON and efetch XML for the genes it is given, in a background thread:
+
+    with StubServer({"5465": gene_record("5465", "PPARA", padding=1000)}) as stub:
+        genes = Genes(host=stub.host, port=stub.port, ssl=False)
+        genes["ppara"]
+
+The response can be sent with chunked transfer encoding, gzip compressed (if the client
+accepts it), by small parts with latency and limited bandwidth. Range requests are supported.
+Failures (429, 5xx) can be injected for the next requests (see StubServer.fail).
+The server counts bytes it managed to send, so it shows how early the client stopped reading.
+"""
+
+import gzip as gzip_module
+import json
+import logging
+import re
+import ssl
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs
+
+log = logging.getLogger("")
+
+ESEARCH_PATH = "/entrez/eutils/esearch.fcgi"
+EFETCH_PATH = "/entrez/eutils/efetch.fcgi"
+ESUMMARY_PATH = "/entrez/eutils/esummary.fcgi"
+
+XML_HEAD = b'<?xml version="1.0" encoding="UTF-8"?>\n<Entrezgene-Set>\n'
+XML_TAIL = b"</Entrezgene-Set>\n"
+
+# Gene names in esearch term: `(ppara[Gene Name] OR tp53[Gene Name]) AND ...`
+GENE_NAME_TERM = re.compile(r"([^\s()\[\]]+)\[Gene Name\]")
+GENE_LOCUS = re.compile(rb"<Gene-ref_locus>([^<]*)</Gene-ref_locus>")
+BYTE_RANGE = re.compile(r"bytes=(\d+)-(\d*)$")
+
+# Size of parts the response body is written by (and of chunks in chunked mode).
+CHUNK_SIZE = 4 * 1024
+
+# How often the server checks if it should stop - close() waits up to that long.
+SHUTDOWN_POLL_SECONDS = 0.05
+
+# Seconds the client is asked to wait after 429 Too Many Requests.
+RETRY_AFTER_SECONDS = 1
+
+
+def gene_record(
+    gene_id: str,
+    locus: str,
+    *,
+    summary: str | None = None,
+    description: str | None = None,
+    padding: int = 0,
+) -> str:
+    """Entrezgene record with the fields, followed by padding comments to make it bigger.
+
+    :param padding: number of Gene-commentary elements after the fields (~100 bytes each)
+    """
+    summary = f"Summary of {locus}" if summary is None else summary
+    description = f"Description of {locus}" if description is None else description
+    comments = "".join(
+        f"<Gene-commentary><Gene-commentary_text>Comment {index} on {locus}"
+        "</Gene-commentary_text></Gene-commentary>"
+        for index in range(padding)
+    )
+    return (
+        "<Entrezgene>"
+        "<Entrezgene_track-info><Gene-track>"
+        f"<Gene-track_geneid>{gene_id}</Gene-track_geneid>"
+        "</Gene-track></Entrezgene_track-info>"
+        "<Entrezgene_gene><Gene-ref>"
+        f"<Gene-ref_locus>{locus}</Gene-ref_locus>"
+        f"<Gene-ref_desc>{description}</Gene-ref_desc>"
+        f"<Gene-ref_syn><Gene-ref_syn_E>{locus}-1</Gene-ref_syn_E></Gene-ref_syn>"
+        "</Gene-ref></Entrezgene_gene>"
+        f"<Entrezgene_summary>{summary}</Entrezgene_summary>"
+        f"<Entrezgene_comments>{comments}</Entrezgene_comments>"
+        "</Entrezgene>\n"
+    )
+
+
+class StubServer:
+    """Entrez stand-in HTTP(S) server.
+
+    Options are attributes, they can be changed between requests.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        genes: Mapping[str, str | bytes] | None = None,
+        ids: Mapping[str, list[str]] | None = None,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        chunked: bool = False,
+        chunk_size: int = CHUNK_SIZE,
+        latency: float = 0.0,
+        bandwidth: float | None = None,
+        gzip: bool = False,
+        retry_after: int = RETRY_AFTER_SECONDS,
+        ssl_context: ssl.SSLContext | None = None,
+    ) -> None:
+        """Init, call start() or use as context manager to run the server.
+
+        :param genes: {gene ID: Entrezgene record XML} for efetch, see gene_record
+        :param ids: {gene name: [gene IDs]} for esearch, by default from Gene-ref_locus
+            of the records (case-insensitive)
+        :param port: 0 - any free port, see self.port
+        :param chunked: send the body with chunked transfer encoding (to HTTP/1.1 clients)
+        :param chunk_size: body is written by parts of that size
+        :param latency: seconds to wait before each part
+        :param bandwidth: max bytes per second for each response, None - no limit
+        :param gzip: compress the body if the client accepts gzip (not for Range requests)
+        :param retry_after: Retry-After header of injected 429 Too Many Requests
+        :param ssl_context: server context with the certificate to serve HTTPS
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size should be positive.")
+        self.genes = {
+            gene_id: record.encode() if isinstance(record, str) else record
+            for gene_id, record in (genes or {}).items()
+        }
+        if ids is None:
+            found: dict[str, list[str]] = {}
+            for gene_id, record in self.genes.items():
+                if locus := GENE_LOCUS.search(record):
+                    found.setdefault(locus.group(1).decode().lower(), []).append(gene_id)
+            ids = found
+        self.ids = {name.lower(): gene_ids for name, gene_ids in ids.items()}
+        self.chunked = chunked
+        self.chunk_size = chunk_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.gzip = gzip
+        self.retry_after = retry_after
+        self.failures: deque[int] = deque()  # statuses for the next requests
+        self.compressed = (b"", gzip_module.compress(b"", mtime=0))  # last compressed body
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)  # notified when no requests are handled
+
+        self.requests: list[str] = []  # paths of all requests
+        self.bytes_sent = 0  # body bytes the client received (as far as the server knows)
+        self.responses = 0
+        self.failures_sent = 0
+        self.active = 0  # requests being handled now
+        self.max_active = 0
+
+        self.http = StubHTTPServer((host, port), StubHandler)
+        self.http.stub = self
+        if ssl_context is not None:
+            self.http.socket = ssl_context.wrap_socket(self.http.socket, server_side=True)
+        self.host: str = str(self.http.server_address[0])
+        self.port: int = self.http.server_address[1]
+        self.scheme = "http" if ssl_context is None else "https"
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """Server URL."""
+        return f"{self.scheme}://{self.host}:{self.port}"
+
+    def start(self) -> "StubServer":
+        """Start serving in a background thread."""
+        self.thread = threading.Thread(
+            target=self.http.serve_forever,
+            kwargs={"poll_interval": SHUTDOWN_POLL_SECONDS},
+            daemon=True,
+        )
+        self.thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the server."""
+        if self.thread is not None:
+            self.http.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.http.server_close()
+
+    def __enter__(self) -> "StubServer":
+        """Start the server."""
+        return self.start()
+
+    def __exit__(self, *args: object) -> None:
+        """Stop the server."""
+        self.close()
+
+    def fail(self, *statuses: int) -> None:
+        """Respond to the next requests with the statuses (one per request) instead of data."""
+        with self.lock:
+            self.failures.extend(statuses)
+
+    def next_failure(self) -> int | None:
+        """Status to inject into the current response, None - respond normally."""
+        with self.lock:
+            return self.failures.popleft() if self.failures else None
+
+    def esearch(self, query: dict[str, list[str]]) -> bytes:
+        """esearch JSON response with IDs of all the gene names in the term."""
+        term = query.get("term", [""])[0]
+        id_list = [
+            gene_id
+            for name in GENE_NAME_TERM.findall(term)
+            for gene_id in self.ids.get(name.lower(), [])
+        ]
+        return json.dumps(
+            {"esearchresult": {"count": str(len(id_list)), "idlist": id_list}},
+        ).encode()
+
+    def efetch(self, query: dict[str, list[str]]) -> bytes:
+        """efetch XML response with records of the known gene IDs."""
+        gene_ids = query.get("id", [""])[0].split(",")
+        return b"".join(
+            [XML_HEAD, *(self.genes[id_] for id_ in gene_ids if id_ in self.genes), XML_TAIL],
+        )
+
+    def esummary(self, query: dict[str, list[str]]) -> bytes:
+        """esummary JSON response with names (Gene-ref_locus) of the known gene IDs."""
+        result: dict[str, Any] = {"uids": []}
+        for gene_id in query.get("id", [""])[0].split(","):
+            if gene_id in self.genes and (locus := GENE_LOCUS.search(self.genes[gene_id])):
+                result["uids"].append(gene_id)
+                result[gene_id] = {"uid": gene_id, "name": locus.group(1).decode()}
+        return json.dumps({"result": result}).encode()
+
+    def compress(self, body: bytes) -> bytes:
+        """Gzip the body, the last one is cached so it is not compressed for each request."""
+        with self.lock:
+            plain, compressed = self.compressed
+        if body != plain:
+            compressed = gzip_module.compress(body, mtime=0)
+            with self.lock:
+                self.compressed = (body, compressed)
+        return compressed
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Wait till all requests are handled, so the statistics are final.
+
+        The client can close the connection before the server noticed it, so the server
+        could be still sending the response after the client got all it needed.
+        Returns False on timeout.
+        """
+        with self.idle:
+            return self.idle.wait_for(lambda: not self.active, timeout)
+
+    def pace(self, size: int) -> None:
+        """Wait before sending size bytes, to emulate latency and bandwidth."""
+        delay = self.latency + (size / self.bandwidth if self.bandwidth else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def stats(self) -> dict[str, int]:
+        """Requests and traffic statistics."""
+        return {
+            "requests": len(self.requests),
+            "responses": self.responses,
+            "failures": self.failures_sent,
+            "bytes_sent": self.bytes_sent,
+            "max_active": self.max_active,
+        }
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """HTTP server with a thread per connection."""
+
+    daemon_threads = True
+    request_queue_size = 128  # many clients connect at once in concurrency tests
+    stub: StubServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler of StubServer."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, if the client does not ask to close
+
+    server: StubHTTPServer
+
+    @property
+    def stub(self) -> StubServer:
+        """Server options and statistics."""
+        return self.server.stub
+
+    def do_GET(self) -> None:
+        """Respond to esearch, esummary or efetch request."""
+        stub = self.stub
+        with stub.lock:
+            stub.requests.append(self.path)
+            stub.active += 1
+            stub.max_active = max(stub.max_active, stub.active)
+        try:
+            self.respond()
+        finally:
+            with stub.lock:
+                stub.active -= 1
+                if not stub.active:
+                    stub.idle.notify_all()
+
+    def respond(self) -> None:
+        """Send the response for the request."""
+        if (status := self.stub.next_failure()) is not None:
+            with self.stub.lock:
+                self.stub.failures_sent += 1
+            headers = (
+                {"Retry-After": str(self.stub.retry_after)}
+                if status == HTTPStatus.TOO_MANY_REQUESTS
+                else {}
+            )
+            self.send_body(status, b"", "text/plain", headers)
+            return
+        path, _, query_string = self.path.partition("?")
+        query = parse_qs(query_string)
+        if path == ESEARCH_PATH:
+            self.send_data(self.stub.esearch(query), "application/json")
+        elif path == EFETCH_PATH:
+            self.send_data(self.stub.efetch(query), "text/xml")
+        elif path == ESUMMARY_PATH:
+            self.send_data(self.stub.esummary(query), "application/json")
+        else:
+            self.send_body(HTTPStatus.NOT_FOUND, b"", "text/plain")
+
+    def send_data(self, body: bytes, content_type: str) -> None:
+        """Send the body, or the requested range of it, compressed if possible."""
+        if (byte_range := self.headers.get("Range")) is not None and (
+            match := BYTE_RANGE.match(byte_range.strip())
+        ):
+            first = int(match.group(1))
+            last = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+            if first >= len(body):
+                self.send_body(
+                    HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                    b"",
+                    content_type,
+                    {"Content-Range": f"bytes */{len(body)}"},
+                )
+                return
+            self.send_body(
+                HTTPStatus.PARTIAL_CONTENT,
+                body[first : last + 1],
+                content_type,
+                {"Content-Range": f"bytes {first}-{last}/{len(body)}"},
+            )
+            return
+        headers = {}
+        if self.stub.gzip and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = self.stub.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self.send_body(HTTPStatus.OK, body, content_type, headers)
+
+    def send_body(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str,
+        headers: Mapping[str, str] | None = None,
+    ) -> None:
+        """Send response with the body by parts, stop if the client closed the connection."""
+        stub = self.stub
+        chunked = stub.chunked and self.request_version != "HTTP/1.0"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        try:
+            self.end_headers()
+            for pos in range(0, len(body), stub.chunk_size):
+                part = body[pos : pos + stub.chunk_size]
+                stub.pace(len(part))
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part) if chunked else part)
+                with stub.lock:
+                    stub.bytes_sent += len(part)
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except OSError:  # the client stopped reading
+            self.close_connection = True
+            return
+        with stub.lock:
+            stub.responses += 1
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Log requests with debug level instead of printing to stderr."""
+        log.debug(f"StubServer: {format % args}")
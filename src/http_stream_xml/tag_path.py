@@ -0,0 +1,261 @@
+"""Tag path selectors (XPath-lite) compiled into a state machine.
+
+Selector syntax:
+
+    Gene-ref_locus                  - element with the name at any depth
+    //Gene-ref_locus                - the same
+    Gene-ref/Gene-ref_locus         - Gene-ref_locus with parent Gene-ref, at any depth
+    /Entrezgene-Set/Entrezgene      - path from the document root element
+    Entrezgene//Gene-ref_syn_E      - Gene-ref_syn_E at any depth inside Entrezgene
+    Gene-ref/*                      - any child of Gene-ref
+    Object-id_id[@type="GeneID"]    - only elements with the attribute value
+    Dbtag[@db]                      - only elements with the attribute
+    Gene-track_status/@value        - value of the attribute instead of the element text
+
+All selectors are compiled into one automaton. Its states are created lazily, on first
+visit, and then transitions are just dict lookups - so the cost of start tag does not
+depend on how many selectors are registered. All names not used in selectors share one
+transition from a state, computed once and not stored by name - so the automaton size
+does not depend on the document vocabulary.
+Elements that could match a step with predicates get conditional transitions - the
+predicates are checked only for them, and the attributes of other elements are not looked at.
+"""
+
+import re
+from collections.abc import Iterable
+from typing import Protocol
+
+CHILD = 0
+DESCENDANT = 1
+
+ANY_NAME = "*"
+
+# [@name] or [@name="value"] (or with single quotes) after element name in a step
+PREDICATE = re.compile(r"""\[\s*@([^\s=\]]+)\s*(?:=\s*(?:"([^"]*)"|'([^']*)')\s*)?\]""")
+
+Step = tuple[int, str]  # (axis, element name)
+Predicate = tuple[str, str | None]  # (attribute, value or None - any value)
+Position = tuple[int, int]  # (selector index, number of steps already matched)
+
+
+class Attributes(Protocol):
+    """Element attributes - dict from expat or AttributesImpl from xml.sax."""
+
+    def get(self, name: str, /) -> str | None:
+        """Attribute value."""
+
+
+class Selector:
+    """Parsed selector."""
+
+    __slots__ = ("attribute", "predicates", "steps")
+
+    def __init__(self, selector: str) -> None:
+        """Parse selector.
+
+        steps - (axis, name) of each step, predicates - attribute predicates of each step,
+        attribute - attribute to capture instead of the element text (or None).
+        """
+        if selector.startswith("/") and not selector.startswith("//"):
+            path, axis = selector[1:], CHILD
+        else:
+            path, axis = selector.removeprefix("//"), DESCENDANT
+        segments = split_path(path)
+        self.attribute: str | None = None
+        if segments[-1].startswith("@") and len(segments) > 1:
+            self.attribute = segments.pop()[1:]
+            if not self.attribute or not segments[-1]:
+                raise ValueError(f"Invalid tag selector {selector!r}.")
+        steps: list[Step] = []
+        predicates: list[tuple[Predicate, ...]] = []
+        for segment in segments:
+            if not segment:
+                if not steps or axis == DESCENDANT:
+                    raise ValueError(f"Invalid tag selector {selector!r}.")
+                axis = DESCENDANT
+                continue
+            name, step_predicates = parse_step(segment, selector)
+            steps.append((axis, name))
+            predicates.append(step_predicates)
+            axis = CHILD
+        if not steps or axis == DESCENDANT:
+            raise ValueError(f"Invalid tag selector {selector!r}.")
+        self.steps = tuple(steps)
+        self.predicates = tuple(predicates)
+
+
+def split_path(path: str) -> list[str]:
+    """Split path by `/` outside of predicates."""
+    segments = []
+    start = depth = 0
+    quote = ""
+    for pos, char in enumerate(path):
+        if quote:
+            if char == quote:
+                quote = ""
+        elif depth and char in "\"'":
+            quote = char
+        elif char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == "/" and not depth:
+            segments.append(path[start:pos])
+            start = pos + 1
+    segments.append(path[start:])
+    return segments
+
+
+def parse_step(segment: str, selector: str) -> tuple[str, tuple[Predicate, ...]]:
+    """Split step into element name and attribute predicates."""
+    name, bracket, _ = segment.partition("[")
+    if not name or "@" in name or "]" in name:
+        raise ValueError(f"Invalid tag selector {selector!r}.")
+    predicates: list[Predicate] = []
+    pos = len(name)
+    while bracket and pos < len(segment):
+        if (predicate := PREDICATE.match(segment, pos)) is None:
+            raise ValueError(f"Invalid predicate in tag selector {selector!r}.")
+        attribute, double_quoted, single_quoted = predicate.groups()
+        predicates.append(
+            (attribute, double_quoted if double_quoted is not None else single_quoted),
+        )
+        pos = predicate.end()
+    return name, tuple(predicates)
+
+
+def parse_selector(selector: str) -> tuple[Step, ...]:
+    """Split selector into (axis, name) steps."""
+    return Selector(selector).steps
+
+
+class PathState:
+    """State of the automaton - where we are in the document with regard to all selectors."""
+
+    __slots__ = ("conditions", "matches", "other", "positions", "transitions")
+
+    def __init__(self, positions: frozenset[Position], matches: tuple[str, ...]) -> None:
+        """Init."""
+        self.positions = positions
+        self.matches = matches  # selectors matched by the element that entered this state
+        self.transitions: dict[str, PathState] = {}
+        self.conditions: dict[str, Condition] = {}  # transitions that depend on attributes
+        # transition for names not used in selectors, the same for all of them
+        self.other: PathState | Condition | None = None
+
+
+class Condition:
+    """Transition that depends on the element attributes."""
+
+    __slots__ = ("checks", "positions", "states")
+
+    def __init__(
+        self,
+        positions: frozenset[Position],
+        checks: tuple[tuple[Position, tuple[Predicate, ...]], ...],
+    ) -> None:
+        """Init.
+
+        :param positions: positions regardless of the attributes
+        :param checks: positions only if the predicates are true
+        """
+        self.positions = positions
+        self.checks = checks
+        self.states: dict[tuple[bool, ...], PathState] = {}  # by predicates results
+
+
+class PathMatcher:
+    """Compiled tag selectors.
+
+    Track current element with a stack of states:
+
+        state = matcher.step(stack[-1], name, attrs)  # on start tag
+        stack.append(state)
+        ...
+        stack.pop()  # on end tag
+
+    state.matches are the selectors matched by the element.
+    attributes are {selector: attribute to capture} for selectors like `a/@name`.
+    """
+
+    def __init__(self, selectors: Iterable[str]) -> None:
+        """Compile selectors."""
+        self.selectors = tuple(dict.fromkeys(selectors))  # without duplicates
+        parsed = [Selector(selector) for selector in self.selectors]
+        self.steps = [selector.steps for selector in parsed]
+        self.predicates = [selector.predicates for selector in parsed]
+        self.attributes = {
+            text: selector.attribute
+            for text, selector in zip(self.selectors, parsed, strict=True)
+            if selector.attribute is not None
+        }
+        self.names = frozenset(name for steps in self.steps for _, name in steps)
+        self.interned: dict[str, str] = {}  # element names for the parser to intern
+        self.states: dict[frozenset[Position], PathState] = {}
+        self.root = self.state(frozenset((index, 0) for index in range(len(self.steps))))
+
+    def state(self, positions: frozenset[Position]) -> PathState:
+        """Get interned state for the set of positions."""
+        if (state := self.states.get(positions)) is None:
+            matches = tuple(
+                self.selectors[index]
+                for index, matched in sorted(positions)
+                if matched == len(self.steps[index])
+            )
+            state = self.states[positions] = PathState(positions, matches)
+        return state
+
+    def step(self, state: PathState, name: str, attrs: Attributes | None = None) -> PathState:
+        """Get state for child element `name` of the element in `state`."""
+        if (next_state := state.transitions.get(name)) is not None:
+            return next_state
+        if name not in self.names:
+            # not cached by name, so documents with unbounded vocabulary do not grow the states
+            if (transition := state.other) is None:
+                transition = state.other = self.advance(state, name)
+        elif (transition := state.conditions.get(name)) is None:
+            transition = self.advance(state, name)
+            if isinstance(transition, PathState):
+                state.transitions[name] = transition
+            else:
+                state.conditions[name] = transition
+        if isinstance(transition, PathState):
+            return transition
+        condition = transition
+        results = tuple(
+            attrs is not None and all(check(attrs, predicate) for predicate in predicates)
+            for _, predicates in condition.checks
+        )
+        if (next_state := condition.states.get(results)) is None:
+            passed = {
+                position for (position, _), ok in zip(condition.checks, results, strict=True) if ok
+            }
+            next_state = condition.states[results] = self.state(condition.positions | passed)
+        return next_state
+
+    def advance(self, state: PathState, name: str) -> PathState | Condition:
+        """Calculate transition - used only on first visit."""
+        positions: set[Position] = set()
+        checks: list[tuple[Position, tuple[Predicate, ...]]] = []
+        for index, matched in state.positions:
+            steps = self.steps[index]
+            if matched == len(steps):
+                continue
+            axis, step_name = steps[matched]
+            if axis == DESCENDANT:
+                positions.add((index, matched))  # could match deeper
+            if step_name in (name, ANY_NAME):
+                if predicates := self.predicates[index][matched]:
+                    checks.append(((index, matched + 1), predicates))
+                else:
+                    positions.add((index, matched + 1))
+        if checks:
+            return Condition(frozenset(positions), tuple(checks))
+        return self.state(frozenset(positions))
+
+
+def check(attrs: Attributes, predicate: Predicate) -> bool:
+    """Check attribute predicate."""
+    attribute, expected = predicate
+    value = attrs.get(attribute)
+    return value is not None and (expected is None or value == expected)
@@ -7,10 +7,40 @@ Do not need to parse all a XML document if you only need tags from beginning of
 # but not subscriptable on the runtime class) does not raise at import time.
 from __future__ import annotations
 
+import re
+import threading
 import xml.sax
-from collections.abc import Sequence
+from collections.abc import Callable, Iterator, Mapping, Sequence
 from typing import Any
-from xml.sax.xmlreader import AttributesImpl, XMLReader
+from xml.parsers import expat
+from xml.sax import SAXParseException
+from xml.sax.xmlreader import AttributesImpl, Locator, XMLReader
+
+from http_stream_xml.skip_ahead import SkipAhead, target_names
+from http_stream_xml.tag_path import PathMatcher, PathState
+
+ENGINE_EXPAT = "expat"  # pyexpat callbacks bound directly to StreamHandler
+ENGINE_SAX = "sax"  # xml.sax.make_parser() with StreamHandler as ContentHandler
+ENGINES = (ENGINE_EXPAT, ENGINE_SAX)
+
+CAPTURE_TEXT = "text"  # text of the matched element, with the text of all its descendants
+CAPTURE_TREE = "tree"  # matched element subtree as nested dicts (see Node.compact)
+CAPTURES = (CAPTURE_TEXT, CAPTURE_TREE)
+
+# Max nodes (elements) of one captured subtree, the rest of the subtree is skipped.
+MAX_TREE_NODES = 10_000
+
+# Synthetic root element around the stream in XmlRecordExtractor fragments mode.
+FRAGMENTS_ROOT = "http-stream-xml-records"
+
+# Max idle xml.sax readers kept for reuse in each thread (see get_sax_parser).
+SAX_PARSERS_POOL_SIZE = 4
+
+# Element names interned for the expat parser are dropped on reset if there are more.
+MAX_INTERNED_NAMES = 10_000
+
+type Occurrence = list[Any] | TreeBuilder  # text parts or subtree of the tag occurrence
+type Match = tuple[str, Any]  # (tag, value of its occurrence)
 
 
 class ExtractionCompleted(Exception):  # noqa: N818
@@ -22,65 +52,783 @@ class XmlStreamExtractor:
 
     When all tags are found, extraction_completed is True.
     Found tags would be available in dict tags.
+    Each occurrence is also returned by feed as soon as it is complete (and passed to on_match),
+    so the caller can process the tags without waiting for the rest of the document.
     """
 
-    def __init__(self, tags_to_collect: Sequence[str]) -> None:
-        """Initialize XML parser with given tags to collect."""
-        self.stream_handler = StreamHandler(tags_to_collect)
-        self.parser: XMLReader = xml.sax.make_parser()  # noqa: S317
-        self.parser.setContentHandler(self.stream_handler)
+    def __init__(  # noqa: PLR0913
+        self,
+        tags_to_collect: Sequence[str],
+        engine: str = ENGINE_EXPAT,
+        repeated: bool = False,
+        max_occurrences: int | Mapping[str, int] | None = None,
+        *,
+        capture: str = CAPTURE_TEXT,
+        max_depth: int | None = None,
+        max_nodes: int | None = MAX_TREE_NODES,
+        on_match: Callable[[str, Any], None] | None = None,
+        skip_ahead: bool = False,
+    ) -> None:
+        """Initialize XML parser with given tags to collect.
+
+        :param tags_to_collect: tags to extract
+        :param engine: ENGINE_EXPAT (default, fastest) or ENGINE_SAX (xml.sax ContentHandler).
+            Results and parse errors (SAXParseException) are the same for both.
+        :param repeated: collect all occurrences of each tag, so tags values are lists.
+            By default only the first occurrence of each tag is collected.
+        :param max_occurrences: in repeated mode stop collecting a tag after that many
+            occurrences - one number for all tags or {tag: number}.
+            Extraction is completed only when all tags reached their limit,
+            so without the limits the whole document is parsed.
+        :param capture: CAPTURE_TEXT (default) - tags values are texts,
+            CAPTURE_TREE - tags values are subtrees of the found elements as nested dicts
+            (see Node.compact). Elements without attributes and children are just text.
+        :param max_depth: in CAPTURE_TREE mode capture only that many levels below
+            the found element, None - no limit
+        :param max_nodes: in CAPTURE_TREE mode max number of elements in one subtree,
+            None - no limit
+        :param on_match: called with (tag, value) for each completed tag occurrence,
+            after the chunk with its end is parsed, in the document order
+        :param skip_ahead: parse only the elements that could match, found by fast search
+            in the bytes (see skip_ahead module). Only if all tags are element names
+            (`name`, `//name`, with predicates or `/@attribute`), else the whole document
+            is parsed. Parse errors outside of the found elements are not detected.
+        """
+        self.repeated = repeated
+        self.on_match = on_match
+        limits = occurrences_limits(tags_to_collect, repeated, max_occurrences)
+        self.stream_handler = make_stream_handler(
+            tags_to_collect,
+            limits,
+            capture,
+            max_depth,
+            max_nodes,
+        )
+        self.parser = make_parser(self.stream_handler, engine)
+        self.skip_ahead: SkipAhead | None = None
+        if skip_ahead and (names := target_names(self.stream_handler.tags_to_collect)):
+            self.skip_ahead = SkipAhead(names)
         self.extraction_completed = False
 
-    def feed(self, chunk: str) -> None:
+    def feed(self, chunk: str | bytes) -> list[Match]:
         """Feed next part of XML into the parser.
 
         :param chunk: XML document part
-        :return: None
+        :return: tags occurrences completed in the chunk, [(tag, value)]
         """
+        if self.skip_ahead is not None:
+            if isinstance(chunk, str):
+                self.skip_ahead.text = True  # declared encoding is not the encoding of the bytes
+                chunk = chunk.encode()
+            return self.feed_bytes(chunk)
         try:
             self.parser.feed(chunk)  # type: ignore
         except ExtractionCompleted:
             self.extraction_completed = True
+        return self.matches()
+
+    def feed_bytes(self, data: bytes | memoryview) -> list[Match]:
+        """Feed next part of raw (not decoded) XML into the parser.
+
+        The buffer goes to expat as is, so there is no bytes->str->bytes round trip.
+        Multibyte characters split between chunks are assembled by expat itself.
+
+        :param data: XML document part as bytes or memoryview
+        :return: tags occurrences completed in the data, [(tag, value)]
+        """
+        try:
+            if self.skip_ahead is None:
+                self.parser.feed(data)  # type: ignore
+            else:
+                for part in self.skip_ahead.feed(data):
+                    self.parser.feed(part)  # type: ignore
+        except ExtractionCompleted:
+            self.extraction_completed = True
+        return self.matches()
+
+    def reset(self) -> None:
+        """Prepare for the next document.
+
+        Forgets found tags and the parser state (even after the extraction was completed
+        in the middle of the document), but keeps compiled selectors, so reusing one extractor
+        for many documents is cheaper than creating new ones.
+        """
+        self.stream_handler.reset()
+        self.parser.reset()  # type: ignore[union-attr]
+        if self.skip_ahead is not None:
+            self.skip_ahead.reset()
+        self.extraction_completed = False
+
+    def close(self) -> None:
+        """Return xml.sax parser to the current thread pool, do not use the extractor after."""
+        if not isinstance(self.parser, ExpatParser):
+            release_sax_parser(self.parser)
+
+    def matches(self) -> list[Match]:
+        """Take occurrences completed since the previous call, pass them to on_match."""
+        completed = self.stream_handler.completed
+        if not completed:
+            return []
+        value = self.stream_handler.value
+        matches = [(tag, value(occurrence)) for tag, occurrence in completed]
+        completed.clear()
+        if self.on_match is not None:
+            for tag, tag_value in matches:
+                self.on_match(tag, tag_value)
+        return matches
 
     @property
-    def tags(self) -> dict[str, str]:
-        """Return found tags."""
-        parser_tags = self.stream_handler.tags
-        return {tag: "".join(values) for tag, values in parser_tags.items()}
+    def tags(self) -> dict[str, Any]:
+        """Return found tags.
+
+        {tag: text} or in repeated mode {tag: [text of each occurrence]}.
+        In CAPTURE_TREE mode subtrees instead of texts.
+        """
+        return found_tags(self.stream_handler, self.repeated)
+
+
+class XmlRecordExtractor:
+    """Extract given tags from each record - element with given name, like `Entrezgene`.
+
+    The stream is parsed once, by one parser, so there is no splitting and re-parsing
+    of records. Tags state is reset at each record start, and after all tags of the record
+    are found the rest of it is only parsed, not matched. Selectors are relative to the record,
+    as if it was a separate document: `/Entrezgene/Entrezgene_summary` or just
+    `Entrezgene_summary`. Elements outside records are ignored, nested records are parts
+    of the outer record.
+    Found tags of each record are returned by feed as soon as the record ends (and passed
+    to on_record), so memory does not grow with the number of records.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        record_tag: str,
+        tags_to_collect: Sequence[str],
+        engine: str = ENGINE_EXPAT,
+        repeated: bool = False,
+        max_occurrences: int | Mapping[str, int] | None = None,
+        *,
+        capture: str = CAPTURE_TEXT,
+        max_depth: int | None = None,
+        max_nodes: int | None = MAX_TREE_NODES,
+        on_record: Callable[[dict[str, Any]], None] | None = None,
+        fragments: bool = False,
+    ) -> None:
+        """Initialize XML parser with record element name and tags to collect.
+
+        :param record_tag: name of the record element
+        :param on_record: called with found tags of each record, after the chunk
+            with the record end is parsed
+        :param fragments: the stream is records (and other elements) one after another
+            without the root element and XML declaration, like concatenated dump of records
+        Other parameters are the same as in XmlStreamExtractor.
+        """
+        self.repeated = repeated
+        self.on_record = on_record
+        self.fragments = fragments
+        limits = occurrences_limits(tags_to_collect, repeated, max_occurrences)
+        self.record_handler = RecordHandler(
+            record_tag,
+            make_stream_handler(tags_to_collect, limits, capture, max_depth, max_nodes),
+        )
+        self.record_handler.on_record_end = self.record_end
+        self.parser = make_parser(self.record_handler, engine)
+        self.records: list[dict[str, Any]] = []  # not yet returned by feed
+        self.records_count = 0  # records ended since the start (or reset)
+        self.start()
+
+    def start(self) -> None:
+        """Open the synthetic root element in fragments mode."""
+        if self.fragments:
+            self.parser.feed(f"<{FRAGMENTS_ROOT}>".encode())  # type: ignore
+
+    def feed(self, chunk: str | bytes) -> list[dict[str, Any]]:
+        """Feed next part of XML into the parser.
+
+        :param chunk: XML stream part
+        :return: found tags of the records ended in the chunk
+        """
+        self.parser.feed(chunk)  # type: ignore
+        return self.ended_records()
+
+    def feed_bytes(self, data: bytes | memoryview) -> list[dict[str, Any]]:
+        """Feed next part of raw (not decoded) XML into the parser, see XmlStreamExtractor.
+
+        :param data: XML stream part as bytes or memoryview
+        :return: found tags of the records ended in the data
+        """
+        self.parser.feed(data)  # type: ignore
+        return self.ended_records()
+
+    def reset(self) -> None:
+        """Prepare for the next stream, keep compiled selectors."""
+        self.record_handler.reset()
+        self.parser.reset()  # type: ignore[union-attr]
+        self.records = []
+        self.records_count = 0
+        self.start()
+
+    def close(self) -> None:
+        """Return xml.sax parser to the current thread pool, do not use the extractor after."""
+        if not isinstance(self.parser, ExpatParser):
+            release_sax_parser(self.parser)
+
+    def record_end(self) -> None:
+        """Keep found tags of the ended record."""
+        self.records.append(found_tags(self.record_handler.handler, self.repeated))
+        self.records_count += 1
+
+    def ended_records(self) -> list[dict[str, Any]]:
+        """Take records ended since the previous call, pass them to on_record."""
+        records = self.records
+        if not records:
+            return []
+        self.records = []
+        if self.on_record is not None:
+            for record in records:
+                self.on_record(record)
+        return records
+
+
+def found_tags(handler: StreamHandler, repeated: bool) -> dict[str, Any]:
+    """Found tags of the handler, see XmlStreamExtractor.tags."""
+    value = handler.value
+    if repeated:
+        return {
+            tag: [value(occurrence) for occurrence in occurrences]
+            for tag, occurrences in handler.tags.items()
+        }
+    return {tag: value(occurrences[0]) for tag, occurrences in handler.tags.items()}
+
+
+def make_stream_handler(
+    tags_to_collect: Sequence[str],
+    limits: Mapping[str, int | None],
+    capture: str,
+    max_depth: int | None,
+    max_nodes: int | None,
+) -> StreamHandler:
+    """Handler for the capture mode."""
+    if capture == CAPTURE_TEXT:
+        return StreamHandler(tags_to_collect, limits)
+    if capture == CAPTURE_TREE:
+        return TreeStreamHandler(tags_to_collect, limits, max_depth, max_nodes)
+    raise ValueError(f"Unknown capture mode {capture!r}, expected one of {CAPTURES}.")
+
+
+def make_parser(handler: StreamHandler | RecordHandler, engine: str) -> XMLReader | ExpatParser:
+    """Parser of the engine with the handler."""
+    if engine == ENGINE_EXPAT:
+        return ExpatParser(handler)
+    if engine == ENGINE_SAX:
+        parser = get_sax_parser()
+        parser.setContentHandler(handler)
+        return parser
+    raise ValueError(f"Unknown XML engine {engine!r}, expected one of {ENGINES}.")
+
+
+_sax_parsers = threading.local()
+
+
+def sax_parsers_pool() -> list[XMLReader]:
+    """Idle xml.sax readers of the current thread."""
+    if (pool := getattr(_sax_parsers, "pool", None)) is None:
+        pool = _sax_parsers.pool = []
+    return pool
+
+
+def get_sax_parser() -> XMLReader:
+    """Get xml.sax reader from the current thread pool, or create new if it is empty.
+
+    xml.sax.make_parser() looks for the SAX driver on each call, the pool skips that.
+    """
+    pool = sax_parsers_pool()
+    return pool.pop() if pool else xml.sax.make_parser()  # noqa: S317
+
+
+def release_sax_parser(parser: XMLReader) -> None:
+    """Return xml.sax reader to the current thread pool."""
+    parser.reset()  # type: ignore[attr-defined]
+    parser.setContentHandler(xml.sax.handler.ContentHandler())  # do not keep the handler alive
+    if len(pool := sax_parsers_pool()) < SAX_PARSERS_POOL_SIZE:
+        pool.append(parser)
+
+
+def occurrences_limits(
+    tags_to_collect: Sequence[str],
+    repeated: bool,
+    max_occurrences: int | Mapping[str, int] | None,
+) -> dict[str, int | None]:
+    """Max number of occurrences to collect for each tag, None for no limit."""
+    if not repeated:
+        if max_occurrences is not None:
+            raise ValueError("max_occurrences can be used only in repeated mode.")
+        return dict.fromkeys(tags_to_collect, 1)
+    if max_occurrences is None or isinstance(max_occurrences, int):
+        limits: dict[str, int | None] = dict.fromkeys(tags_to_collect, max_occurrences)
+    else:
+        if unknown := set(max_occurrences) - set(tags_to_collect):
+            raise ValueError(f"max_occurrences for tags not in tags_to_collect: {unknown}")
+        limits = {tag: max_occurrences.get(tag) for tag in tags_to_collect}
+    if any(limit is not None and limit < 1 for limit in limits.values()):
+        raise ValueError("max_occurrences should be positive.")
+    return limits
 
 
 class StreamHandler(xml.sax.handler.ContentHandler):  # noqa: N802
     """XML parser handler to collect given tags.
 
+    Tags are selectors (see tag_path) - plain tag names or paths like
+    `Entrezgene_gene/Gene-ref/Gene-ref_locus`, with attribute predicates like
+    `Object-id_id[@type="GeneID"]`. Selectors like `Gene-track_status/@value` collect
+    the attribute value instead of the element text.
     When all tags are found, raises ExtractionCompleted.
     """
 
-    def __init__(self, tags_to_collect: Sequence[str]) -> None:
-        """Initialize XML parser handler with given tags to collect."""
-        self.tags_to_collect = tags_to_collect
+    def __init__(
+        self,
+        tags_to_collect: Sequence[str],
+        limits: Mapping[str, int | None] | None = None,
+    ) -> None:
+        """Initialize XML parser handler with given tags to collect.
+
+        :param limits: max occurrences to collect for each tag, None - no limit.
+            By default only the first occurrence.
+        """
+        self.tags_to_collect = tuple(dict.fromkeys(tags_to_collect))  # without duplicates
+        self.matcher = PathMatcher(self.tags_to_collect)
+        self.attributes = self.matcher.attributes  # {selector: attribute to collect}
+        self.limits = dict.fromkeys(self.tags_to_collect, 1) if limits is None else limits
 
-        self.tags: dict[str, Any] = {}
-        self.tag_started: str | None = None
+        self.tags: dict[str, list[Occurrence]] = {}  # {tag: [text parts of each occurrence]}
+        self.missing = len(self.limits)  # number of tags that not reached occurrences limit
+        self.path: list[PathState] = [self.matcher.root]  # states of the open elements
+        self.opened: list[int] = []  # number of occurrences opened by open matched elements
+        self.collecting: list[Occurrence] = []  # text parts of the open occurrences
+        self.collecting_tags: list[str] = []  # tags of the open occurrences
+        self.completed: list[tuple[str, Occurrence]] = []  # not yet taken by the extractor
+        # Called with True/False when we enter/leave a collected tag, so the engine
+        # can switch character data events on only when we need them.
+        self.on_capture: Callable[[bool], None] | None = None
         super().__init__()
 
-    def startElement(self, name: str, attrs: AttributesImpl[str]) -> None:  # noqa: ARG002
-        """Start tag handler."""
-        if name in self.tags_to_collect:
-            self.tag_started = name
-            self.tags[name] = []
+    def startElement(
+        self,
+        name: str,
+        attrs: AttributesImpl[str] | dict[str, str],
+    ) -> None:
+        """Start tag handler.
+
+        attrs are looked at only by conditional transitions and attribute selectors.
+        """
+        parent = self.path[-1]
+        if (state := parent.transitions.get(name)) is None:
+            state = self.matcher.step(parent, name, attrs)
+        self.path.append(state)
+        if state.matches:
+            opened = self.open_occurrences(name, state.matches, attrs)
+            self.opened.append(opened)
+            if not opened and self.extraction_completed():  # the last was attribute
+                raise ExtractionCompleted()
+
+    def open_occurrences(
+        self,
+        name: str,
+        selectors: Sequence[str],
+        attrs: AttributesImpl[str] | dict[str, str],
+    ) -> int:
+        """Start new occurrences of the selectors matched by element, return how many opened.
+
+        Attribute selectors occurrences are complete at once, so they are not opened.
+        """
+        opened = 0
+        for selector in selectors:
+            occurrences = self.tags.get(selector, [])
+            limit = self.limits[selector]
+            if limit is not None and len(occurrences) >= limit:
+                continue
+            attribute = self.attributes.get(selector)
+            parts: Occurrence
+            if attribute is None:
+                parts = self.new_occurrence(name, attrs)
+            elif (value := attrs.get(attribute)) is None:
+                continue
+            else:
+                parts = [value]
+            if not occurrences:
+                self.tags[selector] = occurrences
+            occurrences.append(parts)
+            if len(occurrences) == limit:
+                self.missing -= 1
+            if attribute is None:
+                if not self.collecting and self.on_capture is not None:
+                    self.on_capture(True)
+                self.collecting.append(parts)
+                self.collecting_tags.append(selector)
+                opened += 1
+            else:
+                self.completed.append((selector, parts))
+        return opened
+
+    def new_occurrence(
+        self,
+        name: str,  # noqa: ARG002
+        attrs: AttributesImpl[str] | dict[str, str],  # noqa: ARG002
+    ) -> Occurrence:
+        """Start collecting occurrence of the element."""
+        return []
+
+    def value(self, occurrence: Occurrence) -> Any:
+        """Collected value of the occurrence."""
+        return "".join(occurrence)  # type: ignore[arg-type]
+
+    def reset(self) -> None:
+        """Forget found tags, keep compiled selectors."""
+        if self.collecting and self.on_capture is not None:
+            self.on_capture(False)
+        self.tags = {}
+        self.missing = len(self.limits)
+        self.path = [self.matcher.root]
+        self.opened = []
+        self.collecting = []
+        self.collecting_tags = []
+        self.completed = []
 
     def extraction_completed(self) -> bool:
-        """Check if all tags are found."""
-        return len(self.tags) == len(self.tags_to_collect)
+        """Check if all tags are found (and none of them is still open)."""
+        return not self.missing and not self.collecting
 
-    def endElement(self, name: str) -> None:
+    def endElement(self, name: str) -> None:  # noqa: ARG002
         """End tag handler."""
-        if name in self.tags_to_collect:
-            self.tag_started = None
+        if self.path.pop().matches and (opened := self.opened.pop()):
+            self.completed.extend(
+                zip(self.collecting_tags[-opened:], self.collecting[-opened:], strict=True),
+            )
+            del self.collecting[-opened:]
+            del self.collecting_tags[-opened:]
+            if not self.collecting and self.on_capture is not None:
+                self.on_capture(False)
             if self.extraction_completed():
                 raise ExtractionCompleted()
 
     def characters(self, content: Any) -> None:
         """Tag content handler."""
-        if self.tag_started:
-            self.tags[self.tag_started].append(content)
+        for parts in self.collecting:
+            parts.append(content)
+
+
+class RecordHandler(xml.sax.handler.ContentHandler):  # noqa: N802
+    """XML parser handler that passes events inside records to StreamHandler.
+
+    At each record start the StreamHandler is reset, so the record is like a separate
+    document for it. After it found all tags, the rest of the record is skipped.
+    """
+
+    def __init__(self, record_tag: str, handler: StreamHandler) -> None:
+        """Init.
+
+        :param record_tag: name of the record element
+        :param handler: collects tags of the current record
+        """
+        self.record_tag = record_tag
+        self.handler = handler
+        self.matcher = handler.matcher
+        self.depth = 0  # of the current element inside the record, 0 - outside of records
+        self.skipping = False  # all tags of the current record are found
+        self.on_record_end: Callable[[], None] | None = None
+        super().__init__()
+
+    @property
+    def on_capture(self) -> Callable[[bool], None] | None:
+        """See StreamHandler.on_capture."""
+        return self.handler.on_capture
+
+    @on_capture.setter
+    def on_capture(self, callback: Callable[[bool], None] | None) -> None:
+        self.handler.on_capture = callback
+
+    def reset(self) -> None:
+        """Start new stream."""
+        self.handler.reset()
+        self.depth = 0
+        self.skipping = False
+
+    def startElement(
+        self,
+        name: str,
+        attrs: AttributesImpl[str] | dict[str, str],
+    ) -> None:
+        """Start tag handler."""
+        if not self.depth:
+            if name != self.record_tag:
+                return
+            self.handler.reset()
+            self.skipping = False
+        self.depth += 1
+        if not self.skipping:
+            try:
+                self.handler.startElement(name, attrs)
+            except ExtractionCompleted:
+                self.skipping = True
+
+    def endElement(self, name: str) -> None:
+        """End tag handler."""
+        if not self.depth:
+            return
+        self.depth -= 1
+        if not self.skipping:
+            try:
+                self.handler.endElement(name)
+            except ExtractionCompleted:
+                self.skipping = True
+        if not self.depth:
+            self.handler.completed.clear()  # matches are not reported, only records
+            if self.on_record_end is not None:
+                self.on_record_end()
+
+    def characters(self, content: Any) -> None:
+        """Tag content handler, called only while the StreamHandler collects."""
+        self.handler.characters(content)
+
+
+class TreeStreamHandler(StreamHandler):
+    """StreamHandler that captures found elements with their subtrees (CAPTURE_TREE)."""
+
+    def __init__(
+        self,
+        tags_to_collect: Sequence[str],
+        limits: Mapping[str, int | None] | None = None,
+        max_depth: int | None = None,
+        max_nodes: int | None = MAX_TREE_NODES,
+    ) -> None:
+        """Init.
+
+        :param max_depth: levels to capture below the found element, None - no limit
+        :param max_nodes: max elements in one subtree, None - no limit
+        """
+        if (max_depth is not None and max_depth < 0) or (max_nodes is not None and max_nodes < 1):
+            raise ValueError("max_depth should be non-negative and max_nodes positive.")
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        super().__init__(tags_to_collect, limits)
+
+    def startElement(self, name: str, attrs: AttributesImpl[str] | dict[str, str]) -> None:
+        """Start tag handler - add the element to the subtrees we are inside of."""
+        for tree in self.collecting:
+            tree.start(name, attrs)  # type: ignore[union-attr]
+        super().startElement(name, attrs)
+
+    def endElement(self, name: str) -> None:
+        """End tag handler."""
+        for tree in self.collecting:
+            tree.end()  # type: ignore[union-attr]
+        super().endElement(name)
+
+    def new_occurrence(self, name: str, attrs: AttributesImpl[str] | dict[str, str]) -> Occurrence:
+        """Start subtree of the element."""
+        return TreeBuilder(Node(name, attrs), self.max_depth, self.max_nodes)
+
+    def value(self, occurrence: Occurrence) -> Any:
+        """Subtree as nested dicts, or attribute value."""
+        if isinstance(occurrence, TreeBuilder):
+            return occurrence.root.compact()
+        return "".join(occurrence)
+
+
+class Node:
+    """Captured element."""
+
+    __slots__ = ("attrs", "children", "name", "text", "truncated")
+
+    def __init__(self, name: str, attrs: AttributesImpl[str] | dict[str, str]) -> None:
+        """Init."""
+        self.name = name
+        self.attrs = dict(attrs.items())
+        self.children: list[Node] = []
+        self.text: list[str] = []  # text parts, including text between children
+        self.truncated = False  # some children were skipped because of the limits
+
+    def compact(self) -> str | dict[str, Any]:
+        """Element as text if it has no attributes and children, else as dict.
+
+        The dict has attributes as `@name`, children as {name: value} (list of values for
+        repeated names), non-blank text as `#text`, and `#truncated` if children were skipped.
+        """
+        text = "".join(self.text)
+        if not self.attrs and not self.children and not self.truncated:
+            return text
+        result: dict[str, Any] = {f"@{name}": value for name, value in self.attrs.items()}
+        for child in self.children:
+            value = child.compact()
+            if (siblings := result.get(child.name)) is None:
+                result[child.name] = value
+            elif isinstance(siblings, list):  # values are str or dict, so it's our list
+                siblings.append(value)
+            else:
+                result[child.name] = [siblings, value]
+        if text.strip():
+            result["#text"] = text
+        if self.truncated:
+            result["#truncated"] = True
+        return result
+
+
+class TreeBuilder:
+    """Builds subtree of the found element from parser events, within the size limits."""
+
+    __slots__ = ("max_depth", "max_nodes", "nodes", "root", "skipped", "stack")
+
+    def __init__(self, root: Node, max_depth: int | None, max_nodes: int | None) -> None:
+        """Init."""
+        self.root = root
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.stack = [root]  # open elements
+        self.nodes = 1
+        self.skipped = 0  # depth inside skipped element
+
+    def start(self, name: str, attrs: AttributesImpl[str] | dict[str, str]) -> None:
+        """Child element start."""
+        if self.skipped:
+            self.skipped += 1
+            return
+        if (self.max_depth is not None and len(self.stack) > self.max_depth) or (
+            self.max_nodes is not None and self.nodes >= self.max_nodes
+        ):
+            self.stack[-1].truncated = True
+            self.skipped = 1
+            return
+        node = Node(name, attrs)
+        self.stack[-1].children.append(node)
+        self.stack.append(node)
+        self.nodes += 1
+
+    def end(self) -> None:
+        """Child element end."""
+        if self.skipped:
+            self.skipped -= 1
+        elif len(self.stack) > 1:
+            self.stack.pop()
+
+    def append(self, content: str) -> None:
+        """Text inside the subtree."""
+        if not self.skipped:
+            self.stack[-1].text.append(content)
+
+
+class ExpatLocator(Locator):
+    """Report pyexpat error position to SAXParseException."""
+
+    def __init__(self, parser: expat.XMLParserType) -> None:
+        """Init."""
+        self.parser = parser
+
+    def getColumnNumber(self) -> int:
+        """Column of the parse error."""
+        return self.parser.ErrorColumnNumber
+
+    def getLineNumber(self) -> int:
+        """Line of the parse error."""
+        return self.parser.ErrorLineNumber
+
+
+class ExpatParser:
+    """pyexpat parser with StreamHandler methods bound directly as expat callbacks.
+
+    No ContentHandler dispatch and no AttributesImpl per element as in xml.sax.
+    Character data callback is installed only while we are inside a collected tag.
+    """
+
+    def __init__(self, handler: StreamHandler | RecordHandler) -> None:
+        """Create expat parser and bind handler."""
+        self.handler = handler
+        handler.on_capture = self.capture_text
+        self.reset()
+
+    def reset(self) -> None:
+        """Start new document - expat parser cannot be reused, so create new one."""
+        # element names are interned across documents, so they are the same objects
+        # as the keys of the automaton transitions
+        interned = self.handler.matcher.interned
+        if len(interned) > MAX_INTERNED_NAMES:
+            interned.clear()  # do not keep all names ever seen
+        self.parser = expat.ParserCreate(intern=interned)
+        self.parser.buffer_text = True  # one characters() call per text node
+        self.parser.StartElementHandler = self.handler.startElement
+        self.parser.EndElementHandler = self.handler.endElement
+
+    def capture_text(self, enabled: bool) -> None:
+        """Switch character data events on or off."""
+        self.parser.CharacterDataHandler = self.handler.characters if enabled else None
+
+    def feed(self, data: str | bytes | memoryview) -> None:
+        """Parse next part of XML document.
+
+        Expat errors are raised as SAXParseException, same as with xml.sax.
+        """
+        try:
+            self.parser.Parse(data, False)
+        except expat.ExpatError as e:
+            raise SAXParseException(
+                expat.ErrorString(e.code),
+                e,
+                ExpatLocator(self.parser),
+            ) from e
+
+
+class RecordSplitter:
+    """Split XML byte stream into records - elements with given name, like `Entrezgene`.
+
+    For the raw bytes of each record, exactly as in the stream - to store or forward
+    the records without parsing and serializing them again.
+    To extract tags from the records use XmlRecordExtractor, it parses the stream once.
+
+    Only searches for the record start/end tags in the bytes, without parsing.
+    So records should not be nested and their tags should not be inside comments or CDATA.
+    """
+
+    def __init__(self, record_tag: str) -> None:
+        """Init."""
+        tag = re.escape(record_tag.encode())
+        self.start = re.compile(b"<" + tag + rb"[\s/>]")
+        self.end = re.compile(b"</" + tag + rb"\s*>")
+        self.keep = len(tag) + 3  # enough to find start tag split between chunks
+        self.buffer = b""
+        self.in_record = False
+
+    def feed(self, data: bytes) -> Iterator[tuple[bytes, bool]]:
+        """Split next part of the stream.
+
+        Yields (part of record, True if the record ends with the part).
+        Bytes outside the records are dropped.
+        """
+        buffer = self.buffer + data
+        while True:
+            if not self.in_record:
+                if (start := self.start.search(buffer)) is None:
+                    self.buffer = buffer[-self.keep :]
+                    return
+                buffer = buffer[start.start() :]
+                self.in_record = True
+            if (end := self.end.search(buffer)) is None:
+                keep_from = self.incomplete_tag_start(buffer)
+                if keep_from > 0:
+                    yield buffer[:keep_from], False
+                    buffer = buffer[keep_from:]
+                self.buffer = buffer
+                return
+            yield buffer[: end.end()], True
+            buffer = buffer[end.end() :]
+            self.in_record = False
+
+    def incomplete_tag_start(self, buffer: bytes) -> int:
+        """Where the end tag split between chunks could start in the buffer.
+
+        The end tag could have whitespace before `>`, so the last `</` without `>` after it
+        is kept with everything after it.
+        """
+        keep_from = max(len(buffer) - self.keep, 0)
+        tag_start = buffer.rfind(b"</", 0, keep_from + 1)
+        if 0 <= tag_start < keep_from and buffer.find(b">", tag_start) < 0:
+            return tag_start
+        return keep_from
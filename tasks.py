@@ -75,6 +75,12 @@ def test_full(c):
     c.run("./scripts/test.sh")
 
 
+@task
+def bench(c, output="bench.json", quick=False):
+    """Run the benchmarks, compare with another run: python -m benchmarks.compare base.json new.json"""
+    c.run(f"python -m benchmarks.run --output {output}{' --quick' if quick else ''}")
+
+
 @task
 def uv(c: Context):
     """Install or upgrade uv."""
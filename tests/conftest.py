@@ -0,0 +1,51 @@
+import pytest
+
+import http_stream_xml.entrez
+from http_stream_xml.entrez import GeneFields, Genes
+from http_stream_xml.rate_limit import RateLimiter
+from http_stream_xml.stub_server import StubServer, gene_record
+
+STUB_GENES = {
+    "5465": gene_record("5465", "PPARA", summary="Summary – ünïcode", padding=2000),
+    "7157": gene_record("7157", "TP53", padding=2000),
+    "1": gene_record("1", "TP53-AS1"),
+}
+
+
+@pytest.fixture
+def clear_sessions():
+    """Do not reuse connections to servers from other tests."""
+    http_stream_xml.entrez.requests_retry_session.cache_clear()
+    yield
+    http_stream_xml.entrez.requests_retry_session.cache_clear()
+
+
+@pytest.fixture
+def stub(clear_sessions):
+    """Local Entrez stub with STUB_GENES, records are in stub.genes."""
+    with StubServer(STUB_GENES, chunk_size=1024) as server:
+        yield server
+
+
+@pytest.fixture
+def make_genes(request, clear_sessions):
+    """Factory of Genes that get genes from the stub without rate limiting.
+
+    client=AsyncGenes for the async client, server= for other StubServer than the stub.
+    """
+
+    def make(
+        fields=(GeneFields.summary, GeneFields.description), *, client=Genes, server=None, **kwargs
+    ):
+        if server is None:
+            server = request.getfixturevalue("stub")
+        return client(
+            list(fields),
+            rate_limiter=RateLimiter(rate=1_000_000, burst=1000),
+            host=server.host,
+            port=server.port,
+            ssl=False,
+            **kwargs,
+        )
+
+    return make
@@ -0,0 +1,96 @@
+import json
+import sys
+
+import pytest
+
+from benchmarks.compare import compare
+from benchmarks.corpus import TARGET_FIRST, TARGET_LAST, TARGET_TAGS, generate
+from benchmarks.entrez import MODE_FULL, MODE_RANGE, MODE_STREAM, concurrency, early_termination
+from benchmarks.run import BASE_CASE, SOURCES, case_name, cases, run_case
+from http_stream_xml.xml_stream import XmlStreamExtractor
+
+
+def test_corpus_is_deterministic():
+    document = generate(20_000, target_depth=3, non_ascii=0.3)
+    assert document == generate(20_000, target_depth=3, non_ascii=0.3)
+    assert document != generate(20_000, target_depth=3, non_ascii=0.3, seed=1)
+    assert len(document) >= 20_000
+    assert max(document) > 127  # non-ASCII characters
+    assert max(generate(20_000)) < 128
+
+
+@pytest.mark.parametrize("target_at", [TARGET_FIRST, TARGET_LAST])
+def test_corpus_target(target_at):
+    document = generate(50_000, target_depth=2, target_at=target_at)
+    assert document.count(b"<Entrezgene_summary>") == 1
+    position = document.index(b"<Entrezgene_summary>")
+    assert (position < len(document) / 2) == (target_at == TARGET_FIRST)
+    assert b"<Gene-commentary_properties><Gene-commentary_properties><Entrezgene_summary>" in (
+        document
+    )
+    extractor = XmlStreamExtractor(TARGET_TAGS)
+    extractor.feed_bytes(document)
+    assert set(extractor.tags) == set(TARGET_TAGS)
+
+
+def test_corpus_invalid_target():
+    with pytest.raises(ValueError, match="target_at"):
+        generate(1000, target_at="middle")
+
+
+def test_cases_unique():
+    names = [case_name(case) for case in cases()]
+    assert len(names) == len(set(names))
+    assert case_name(BASE_CASE) in names
+    assert all(case["size"] <= 512 * 1024 for case in cases(quick=True))
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_run_case(source):
+    result = run_case({**BASE_CASE, "size": 50_000, "source": source}, repeat=1)
+    assert result["completed"]
+    assert result["mb_per_s"] > 0
+    assert result["events_per_s"] > 0
+    if sys.platform != "win32":
+        assert result["peak_rss_kb"] > 0
+    else:
+        assert result["peak_rss_kb"] is None
+    json.dumps(result)
+
+
+def test_run_case_stops_early():
+    result = run_case({**BASE_CASE, "size": 200_000, "target": TARGET_FIRST}, repeat=1)
+    assert result["completed"]
+    assert result["bytes_read"] < result["document_bytes"] / 2
+
+
+def test_compare(capsys):
+    base = {
+        "a": {"mb_per_s": 100.0, "peak_rss_kb": 1000},
+        "b": {"mb_per_s": 100.0, "peak_rss_kb": 1},
+    }
+    new = {"a": {"mb_per_s": 95.0, "peak_rss_kb": 1000}, "b": {"mb_per_s": 80.0, "peak_rss_kb": 1}}
+    assert compare(base, new, threshold=10) == ["b"]
+    assert "REGRESSION" in capsys.readouterr().out
+    assert compare(base, new, metric="genes_per_s") == []  # cases without the metric
+
+
+def test_compare_without_rss(capsys):
+    base = {"a": {"mb_per_s": 100.0, "peak_rss_kb": None}}
+    new = {"a": {"mb_per_s": 100.0, "peak_rss_kb": 1000}}
+    assert compare(base, new) == []
+    assert "RSS" not in capsys.readouterr().out
+
+
+def test_early_termination():
+    streamed = early_termination(MODE_STREAM, padding=1000, repeat=1)
+    assert streamed["saved_pct"] > 50
+    assert early_termination(MODE_RANGE, padding=1000, repeat=1)["bytes_sent"] == 4096
+    assert early_termination(MODE_FULL, padding=1000, repeat=1)["saved_pct"] <= 0
+
+
+@pytest.mark.parametrize("client", ["async", "threads"])
+def test_concurrency(client):
+    result = concurrency(client, workers=4, repeat=1)
+    assert result["genes_per_s"] > 0
+    assert result["bytes_sent"] > 0
@@ -0,0 +1,112 @@
+from unittest.mock import patch
+
+import pytest
+
+from http_stream_xml.cache import LruCache, SqliteCache
+from http_stream_xml.entrez import GeneFields, Genes
+
+
+def test_lru_eviction():
+    cache = LruCache(max_entries=2, ttl=None)
+    cache["a"] = {"x": 1}
+    cache["b"] = {"x": 2}
+    assert cache["a"] == {"x": 1}  # "a" is now the most recently used
+    cache["c"] = {"x": 3}
+    assert "b" not in cache
+    assert list(cache) == ["a", "c"]
+    assert cache.stats() == {
+        "entries": 2,
+        "hits": 1,
+        "misses": 0,
+        "evictions": 1,
+        "expirations": 0,
+    }
+
+
+def test_ttl_expiration():
+    cache = LruCache(ttl=10)
+    with patch("http_stream_xml.cache.time.monotonic", return_value=100.0):
+        cache["a"] = {"x": 1}
+    with patch("http_stream_xml.cache.time.monotonic", return_value=109.0):
+        assert cache.get("a") == {"x": 1}
+    with patch("http_stream_xml.cache.time.monotonic", return_value=111.0):
+        assert "a" not in cache
+        assert cache.get("a") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses, cache.expirations) == (1, 1, 1)
+
+
+def test_miss_and_clear():
+    cache = LruCache()
+    assert cache.get("a") is None
+    cache["a"] = {}
+    del cache["a"]
+    cache["b"] = {}
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.misses == 1
+
+
+def test_invalid_max_entries():
+    with pytest.raises(ValueError, match="should be positive"):
+        LruCache(max_entries=0)
+
+
+def test_sqlite_cache_shared_between_connections(tmp_path):
+    path = tmp_path / "genes.sqlite"
+    writer = SqliteCache(path, ["Gene-ref_locus", "Entrezgene_summary"])
+    reader = SqliteCache(path, ["Entrezgene_summary", "Gene-ref_locus"])  # same set of fields
+    other_fields = SqliteCache(path, ["Gene-ref_locus"])
+
+    writer["ppara"] = {"Gene-ref_locus": "PPARA", "Entrezgene_summary": "Peroxisome ünit"}
+
+    assert reader["ppara"] == {"Gene-ref_locus": "PPARA", "Entrezgene_summary": "Peroxisome ünit"}
+    assert reader.fetched_at("ppara") is not None
+    assert "ppara" not in other_fields
+    assert list(reader) == ["ppara"]
+    assert len(other_fields) == 0
+    assert reader.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    for cache in (writer, reader, other_fields):
+        cache.close()
+
+
+def test_sqlite_cache_survives_reopen(tmp_path):
+    path = tmp_path / "genes.sqlite"
+    cache = SqliteCache(path, ["Gene-ref_locus"])
+    cache["tp53"] = {"Gene-ref_locus": "TP53"}
+    cache.close()
+
+    cache = SqliteCache(path, ["Gene-ref_locus"])
+    assert cache.get("tp53") == {"Gene-ref_locus": "TP53"}
+    assert cache.get("unknown") is None
+    del cache["tp53"]
+    with pytest.raises(KeyError):
+        del cache["tp53"]
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 1, "expirations": 0}
+    cache.close()
+
+
+def test_sqlite_cache_ttl_and_clear(tmp_path):
+    cache = SqliteCache(tmp_path / "genes.sqlite", ["Gene-ref_locus"], ttl=10)
+    with patch("http_stream_xml.cache.time.time", return_value=1000.0):
+        cache["a"] = {"Gene-ref_locus": "A"}
+        cache["b"] = {"Gene-ref_locus": "B"}
+    with patch("http_stream_xml.cache.time.time", return_value=1011.0):
+        assert cache.get("a") is None
+    assert cache.expirations == 1
+    cache.clear()
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_genes_with_sqlite_cache(tmp_path):
+    fields = [GeneFields.summary, GeneFields.locus]
+    cache = SqliteCache(tmp_path / "genes.sqlite", fields)
+    genes = Genes(fields=fields, cache=cache)
+    with patch.object(genes, "get_gene_details") as mock_details:
+        mock_details.return_value = {GeneFields.summary: "s", GeneFields.locus: "ppara"}
+        genes["PPARA"]
+    restarted = Genes(fields=fields, cache=SqliteCache(tmp_path / "genes.sqlite", fields))
+    with patch.object(restarted, "get_gene_details") as mock_details:
+        assert restarted["ppara"][GeneFields.summary] == "s"
+        mock_details.assert_not_called()
@@ -1,10 +1,24 @@
+import threading
 from unittest import mock
 from unittest.mock import Mock, patch
 
 import pytest
 
 import http_stream_xml.entrez
+from http_stream_xml.cache import LruCache
 from http_stream_xml.entrez import GeneFields, Genes
+from http_stream_xml.rate_limit import RateLimiter
+from http_stream_xml.stub_server import gene_record
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit():
+    """Do not slow down the tests with the NCBI requests rate limit."""
+    with patch(
+        "http_stream_xml.entrez.shared_rate_limiter",
+        return_value=RateLimiter(rate=1_000_000, burst=1000),
+    ):
+        yield
 
 
 @pytest.fixture
@@ -15,7 +29,9 @@ def mock_genes():
 @pytest.fixture
 def mock_session():
     """Patch requests.Session to return a mock object."""
-    with patch("http_stream_xml.entrez.requests.Session", return_value=Mock(autospec=True)) as mock:
+    with patch(
+        "http_stream_xml.entrez.requests.Session", return_value=Mock(autospec=True)
+    ) as mock:
         http_stream_xml.entrez.requests_retry_session.cache_clear()
         yield mock
         http_stream_xml.entrez.requests_retry_session.cache_clear()
@@ -36,6 +52,13 @@ def test_gene_add_locus():
     assert GeneFields.locus in genes.fields
 
 
+def test_duplicate_fields_cached():
+    genes = Genes(fields=[GeneFields.summary, GeneFields.locus, GeneFields.summary])
+    assert genes.fields == [GeneFields.summary, GeneFields.locus]
+    genes.db["test"] = {GeneFields.summary: "Summary", GeneFields.locus: "TEST"}
+    assert genes.get_cached("test") == genes.db["test"]
+
+
 @mock.patch.object(Genes, "get_gene_details", return_value={})
 def test_getitem_from_cache(mock_get_gene_details, mock_genes):
     mock_genes.db = {
@@ -105,13 +128,26 @@ def test_get_gene_details(mock_session, mock_genes):
 
 def test_get_gene_details_by_id(mock_session, mock_genes):
     mock_response = Mock()
-    mock_response.iter_lines.return_value = [b"<Entrezgene_summary>Test Gene</Entrezgene_summary>"]
+    mock_response.iter_content.return_value = [
+        b"<Entrezgene_summary>Test Gene</Entrezgene_summary>"
+    ]
     mock_session.return_value.get.return_value = mock_response
 
     gene = mock_genes.get_gene_details_by_id("123456")
     assert gene == {GeneFields.summary: "Test Gene"}
 
 
+def test_get_gene_details_by_id_multibyte_split(mock_session, mock_genes):
+    payload = "<Entrezgene_summary>Rôle of β-catenin</Entrezgene_summary>".encode()
+    split_at = payload.index("ô".encode()) + 1  # in the middle of the two-byte character
+    mock_response = Mock()
+    mock_response.iter_content.return_value = [payload[:split_at], payload[split_at:]]
+    mock_session.return_value.get.return_value = mock_response
+
+    gene = mock_genes.get_gene_details_by_id("123456")
+    assert gene == {GeneFields.summary: "Rôle of β-catenin"}
+
+
 def test_api_key_query_param(mock_genes):
     mock_genes.api_key = "test_key"
     result = mock_genes.api_key_query_param()
@@ -192,3 +228,216 @@ def test_genes_timeout_handling(mock_session):
 
     result = genes.get_gene_id("test_gene")
     assert mock_session.return_value.get.call_args[1]["timeout"] == 1
+
+
+def test_get_many(mock_session):
+    genes = Genes(fields=[GeneFields.summary, GeneFields.description])
+    payload = (
+        '<?xml version="1.0"?>\n<Entrezgene-Set>\n'
+        + gene_record("5465", "PPARA", summary="Peroxisome ünit")
+        + "\n"
+        + gene_record("7157", "TP53", summary="Tumor protein")
+        + "\n</Entrezgene-Set>\n"
+    ).encode()
+    mock_response = Mock()
+    mock_response.iter_content.return_value = [
+        payload[pos : pos + 13] for pos in range(0, len(payload), 13)
+    ]
+    mock_session.return_value.get.return_value = mock_response
+
+    result = list(genes.get_many(["5465", "7157"]))
+
+    assert result == [
+        (
+            "5465",
+            {
+                GeneFields.summary: "Peroxisome ünit",
+                GeneFields.description: "Description of PPARA",
+                GeneFields.locus: "PPARA",
+            },
+        ),
+        (
+            "7157",
+            {
+                GeneFields.summary: "Tumor protein",
+                GeneFields.description: "Description of TP53",
+                GeneFields.locus: "TP53",
+            },
+        ),
+    ]
+    url = mock_session.return_value.get.call_args[0][0]
+    assert "id=5465,7157&" in url
+
+
+def test_get_many_batches(mock_session, mock_genes):
+    mock_response = Mock()
+    mock_response.iter_content.return_value = []
+    mock_session.return_value.get.return_value = mock_response
+
+    assert list(mock_genes.get_many(["1", "2", "3", "4", "5"], batch_size=2)) == []
+    urls = [call[0][0] for call in mock_session.return_value.get.call_args_list]
+    assert [url.split("id=")[1].split("&")[0] for url in urls] == ["1,2", "3,4", "5"]
+
+
+def test_search_ids_url(mock_genes):
+    url = mock_genes.search_ids_url(["ppara", "tp53"])
+    assert url == (
+        "/entrez/eutils/esearch.fcgi?db=gene"
+        "&term=(ppara[Gene+Name]+OR+tp53[Gene+Name])+AND+homo+sapience[Organism]"
+        "&retmax=40&retmode=json"
+    )
+
+
+def test_get_gene_ids(mock_session):
+    genes = Genes(fields=[GeneFields.summary, GeneFields.description])
+    search_response = Mock()
+    search_response.json.return_value = {"esearchresult": {"idlist": ["5465", "1", "7157"]}}
+    summary_response = Mock()
+    summary_response.json.return_value = {
+        "result": {
+            "uids": ["5465", "1", "7157"],
+            "5465": {"uid": "5465", "name": "PPARA"},
+            "1": {"uid": "1", "name": "PPARA-AS1"},
+            "7157": {"uid": "7157", "name": "TP53"},
+        }
+    }
+    mock_session.return_value.get.side_effect = [search_response, summary_response]
+
+    assert genes.get_gene_ids(["PPARA", "tp53", "unknown"]) == {"ppara": "5465", "tp53": "7157"}
+    assert mock_session.return_value.get.call_count == 2
+    assert "esummary.fcgi?db=gene&id=5465,1,7157&" in mock_session.return_value.get.call_args[0][0]
+    assert "tp53" not in genes.db  # no records were fetched
+
+
+def test_get_gene_ids_without_summary(mock_session):
+    genes = Genes(fields=[GeneFields.summary, GeneFields.description])
+    search_response = Mock()
+    search_response.json.return_value = {"esearchresult": {"idlist": ["5465", "1", "7157"]}}
+    summary_response = Mock()
+    summary_response.json.return_value = {
+        "result": {"uids": ["5465", "1"], "5465": {"uid": "5465", "name": "PPARA"}}
+    }
+    fetch_response = Mock()
+    fetch_response.iter_content.return_value = [
+        (
+            "<Entrezgene-Set>"
+            + gene_record("1", "PPARA-AS1", summary="Ambiguous")
+            + gene_record("7157", "TP53", summary="Tumor protein")
+            + "</Entrezgene-Set>"
+        ).encode()
+    ]
+    mock_session.return_value.get.side_effect = [search_response, summary_response, fetch_response]
+
+    assert genes.get_gene_ids(["PPARA", "tp53"]) == {"ppara": "5465", "tp53": "7157"}
+    assert mock_session.return_value.get.call_count == 3
+    assert "efetch.fcgi?db=gene&id=1,7157&" in mock_session.return_value.get.call_args[0][0]
+    assert genes.db["tp53"][GeneFields.summary] == "Tumor protein"
+    with patch.object(genes, "get_gene_details") as mock_details:
+        assert genes["TP53"][GeneFields.description] == "Description of TP53"
+        mock_details.assert_not_called()
+
+
+def test_get_gene_ids_not_found(mock_session, mock_genes):
+    search_response = Mock()
+    search_response.json.return_value = {"esearchresult": {"idlist": []}}
+    mock_session.return_value.get.return_value = search_response
+
+    assert mock_genes.get_gene_ids(["unknown"]) == {}
+    assert mock_session.return_value.get.call_count == 1
+
+
+def test_rate_limiter_used_for_requests(mock_session):
+    limiter = RateLimiter(rate=1_000_000, burst=1000)
+    genes = Genes(rate_limiter=limiter)
+    mock_response = Mock()
+    mock_response.json.return_value = {"esearchresult": {"idlist": ["123456"]}}
+    mock_response.iter_content.return_value = [b"<Entrezgene_summary>x</Entrezgene_summary>"]
+    mock_session.return_value.get.return_value = mock_response
+
+    genes.get_gene_id("test")
+    genes.get_gene_details_by_id("123456")
+    assert limiter.calls == 2
+
+
+def test_genes_cache_backend():
+    cache = LruCache(max_entries=1)
+    genes = Genes(fields=[GeneFields.summary, GeneFields.locus], cache=cache)
+    assert genes.db is cache
+    with patch.object(genes, "get_gene_details") as mock_details:
+        mock_details.side_effect = lambda name: {GeneFields.summary: name, GeneFields.locus: name}
+        genes["a"]
+        genes["a"]
+        genes["b"]
+        genes["a"]  # evicted by "b"
+        assert mock_details.call_count == 3
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["evictions"] == 2
+    genes.clear_cache()
+    assert len(cache) == 0
+
+
+def range_response(payload, headers):
+    """Response to Range request, like requests returns it."""
+    first, last = headers["Range"].removeprefix("bytes=").split("-")
+    part = payload[int(first) : int(last) + 1 if last else None]
+    response = Mock(status_code=206 if part else 416)
+    response.iter_content.return_value = [
+        part[pos : pos + 1024] for pos in range(0, len(part), 1024)
+    ]
+    return response
+
+
+def test_get_gene_details_by_id_range_requests(mock_session):
+    genes = Genes(fields=[GeneFields.summary], range_requests=True, max_bytes_to_fetch=30 * 1024)
+    payload = ("<Entrezgene>" + " " * 10_000 + gene_record("1", "L1", summary="Found")).encode()
+    payload += b" " * 100_000
+    mock_session.return_value.get.side_effect = lambda url, headers, **kwargs: range_response(
+        payload, headers
+    )
+
+    assert genes.get_gene_details_by_id("1") == {
+        GeneFields.summary: "Found",
+        GeneFields.locus: "L1",
+    }
+    ranges = [call[1]["headers"]["Range"] for call in mock_session.return_value.get.call_args_list]
+    assert ranges == ["bytes=0-4095", "bytes=4096-16383"]
+
+
+def test_get_gene_details_by_id_range_ignored(mock_session):
+    genes = Genes(fields=[GeneFields.summary], range_requests=True)
+    payload = ("<Entrezgene>" + " " * 5_000 + gene_record("1", "L1", summary="Found")).encode()
+    chunks = [payload[pos : pos + 1024] for pos in range(0, len(payload), 1024)]
+    responses = [Mock(status_code=206), Mock(status_code=200)]
+    responses[0].iter_content.return_value = chunks[:4]
+    responses[1].iter_content.return_value = chunks  # full response
+    mock_session.return_value.get.side_effect = responses
+
+    assert genes.get_gene_details_by_id("1")[GeneFields.summary] == "Found"
+    assert mock_session.return_value.get.call_count == 2
+
+
+def test_get_gene_details_by_id_fetched_bytes(mock_session, mock_genes):
+    payload = b"<Entrezgene_summary>Test Gene</Entrezgene_summary>"
+    mock_response = Mock()
+    mock_response.iter_content.return_value = [payload[:20], payload[20:]]
+    mock_response.raw.tell.return_value = 30  # compressed
+    mock_session.return_value.get.return_value = mock_response
+
+    assert mock_genes.get_gene_details_by_id("123456") == {GeneFields.summary: "Test Gene"}
+    assert mock_genes.stats() == {"wire_bytes": 30, "decoded_bytes": len(payload)}
+    assert mock_session.return_value.get.call_args[1]["headers"] == {
+        "Accept-Encoding": "gzip, deflate"
+    }
+    mock_response.close.assert_called_once()
+
+
+def test_extractor_reused_per_thread(mock_genes):
+    extractor = mock_genes.get_extractor()
+    extractor.feed("<root><Gene-ref_locus>A</Gene-ref_locus>")
+    assert mock_genes.get_extractor() is extractor
+    assert extractor.tags == {}  # reset for the new document
+    other_thread = []
+    thread = threading.Thread(target=lambda: other_thread.append(mock_genes.get_extractor()))
+    thread.start()
+    thread.join()
+    assert other_thread[0] is not extractor
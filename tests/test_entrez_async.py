@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from http_stream_xml.entrez import GeneFields
+from http_stream_xml.entrez_async import AsyncGenes
+from http_stream_xml.stub_server import StubServer, gene_record
+
+
+def test_async_getitem(stub, make_genes):
+    stub.latency = 0.001
+
+    async def scenario():
+        genes = make_genes(client=AsyncGenes)
+        gene = await genes["PPARA"]
+        cached = await genes["ppara"]
+        return gene, cached
+
+    gene, cached = asyncio.run(scenario())
+    assert stub.wait_idle(timeout=5)
+    assert len(stub.requests) == 2  # second lookup is served from the cache
+    assert stub.bytes_sent < len(stub.genes["5465"]) / 4  # stopped reading when all fields found
+    assert gene[GeneFields.locus] == "PPARA"
+    assert gene[GeneFields.summary] == "Summary – ünïcode"
+    assert cached is gene
+
+
+def test_async_ambiguous_gene_id(make_genes):
+    records = {"1": gene_record("1", "TP53-AS1"), "7157": gene_record("7157", "TP53")}
+    with StubServer(records, {"tp53": ["1", "7157"]}) as stub:
+        assert (
+            asyncio.run(make_genes(client=AsyncGenes, server=stub).get_gene_id("tp53")) == "7157"
+        )
+
+
+def test_async_get_genes_concurrency_limit(make_genes):
+    names = [f"gene{i}" for i in range(8)]
+    records = {str(i): gene_record(str(i), name.upper()) for i, name in enumerate(names)}
+    with StubServer(records, latency=0.01) as stub:
+        result = asyncio.run(
+            make_genes(client=AsyncGenes, server=stub, concurrency=3).get_genes(names)
+        )
+        assert stub.wait_idle(timeout=5)
+        assert 1 < stub.max_active <= 3
+    assert {name: gene[GeneFields.locus] for name, gene in result.items()} == {
+        name: name.upper() for name in names
+    }
+
+
+def test_async_not_found(make_genes):
+    with StubServer({}, {"ppara": ["5465"]}) as stub:
+
+        async def scenario():
+            genes = make_genes(client=AsyncGenes, server=stub)
+            return await genes["unknown"], await genes["ppara"]
+
+        assert asyncio.run(scenario()) == ({}, {})
+
+
+def test_async_invalid_concurrency():
+    with pytest.raises(ValueError, match="concurrency should be positive"):
+        AsyncGenes(concurrency=0)
+
+
+def test_async_ssl_context_reused():
+    genes = AsyncGenes()
+    assert genes.ssl_context is genes.ssl_context
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from http_stream_xml.entrez import GeneFields
+from http_stream_xml.entrez_async import AsyncGenes
+from http_stream_xml.metrics import (
+    REASON_BYTE_CAP,
+    REASON_COMPLETED,
+    REASON_END,
+    FetchRecord,
+    Histogram,
+    Sinks,
+)
+from http_stream_xml.socket_stream import ConnectionPool, SocketStream
+from http_stream_xml.stub_server import EFETCH_PATH
+
+
+def test_record_add():
+    record = FetchRecord("/efetch")
+    assert record.ttfb is None
+    record.add("ttfb", 0.5)
+    record.add("ttfb", 0.25)
+    assert record.ttfb == 0.75
+    assert record.as_dict()["ttfb"] == 0.75
+    assert record.as_dict()["reason"] == REASON_END
+
+
+def test_histogram():
+    histogram = Histogram(buckets=[0.1, 1.0])
+    for seconds in [0.05, 0.5, 0.7, 2.0]:
+        record = FetchRecord("/efetch")
+        record.total = seconds
+        record.body_bytes = 10
+        histogram(record)
+    assert histogram.counts["total"] == [1, 2, 1]
+    assert histogram.quantile("total", 0.5) == 1.0
+    assert histogram.quantile("total", 0.25) == 0.1
+    assert histogram.quantile("total", 1) == float("inf")
+    assert histogram.quantile("dns", 0.5) is None
+    stats = histogram.stats()
+    assert stats["reasons"][REASON_END] == 4
+    assert stats["body_bytes"] == 40
+    assert stats["phases"]["total"]["count"] == 4
+    assert stats["phases"]["dns"]["count"] == 0
+
+
+def test_prometheus():
+    histogram = Histogram(buckets=[0.1, 1.0])
+    record = FetchRecord("/efetch")
+    record.total = 0.5
+    record.wire_bytes = 7
+    histogram(record)
+    text = histogram.prometheus(prefix="entrez")
+    assert 'entrez_fetch_seconds_bucket{phase="total",le="0.1"} 0' in text
+    assert 'entrez_fetch_seconds_bucket{phase="total",le="1.0"} 1' in text
+    assert 'entrez_fetch_seconds_bucket{phase="total",le="+Inf"} 1' in text
+    assert 'entrez_fetch_seconds_count{phase="dns"} 0' in text
+    assert 'entrez_fetches_total{reason="end"} 1' in text
+    assert "entrez_fetch_wire_bytes_total 7" in text
+    assert text.endswith("\n")
+
+
+@pytest.mark.parametrize("buckets", [[], [1.0, 0.1]])
+def test_invalid_buckets(buckets):
+    with pytest.raises(ValueError, match="buckets should be non-empty and ascending"):
+        Histogram(buckets)
+
+
+def test_sinks():
+    records = []
+    histogram = Histogram()
+    sinks = Sinks(records.append, histogram)
+    sinks(FetchRecord("/efetch"))
+    assert len(records) == 1
+    assert histogram.stats()["reasons"][REASON_END] == 1
+
+
+def test_genes_metrics(stub, make_genes):
+    stub.latency = 0.001
+    records = []
+    genes = make_genes(fields=[GeneFields.summary], metrics=records.append)
+    assert genes.get_gene_details_by_id("5465")[GeneFields.summary] == "Summary – ünïcode"
+    (record,) = records
+    assert record.reason == REASON_COMPLETED
+    assert record.status == 200
+    assert record.ttfb is not None
+    assert record.dns is None
+    assert 0 < record.parse < record.total
+    assert 0 < record.body_bytes < len(stub.genes["5465"]) / 4
+    assert record.wire_bytes > 0
+
+
+def test_genes_metrics_not_completed(make_genes):
+    records = []
+    genes = make_genes(
+        fields=[GeneFields.summary, "Entrezgene_unknown"],
+        metrics=records.append,
+        max_bytes_to_fetch=1024,
+    )
+    genes.get_gene_details_by_id("5465")
+    genes.get_gene_details_by_id("1")
+    assert [record.reason for record in records] == [REASON_BYTE_CAP, REASON_END]
+
+
+def test_async_genes_metrics(make_genes):
+    histogram = Histogram()
+
+    async def scenario():
+        genes = make_genes(fields=[GeneFields.summary], client=AsyncGenes, metrics=histogram)
+        return await genes.get_gene_details_by_id("5465")
+
+    assert asyncio.run(scenario())[GeneFields.summary] == "Summary – ünïcode"
+    stats = histogram.stats()
+    assert stats["reasons"][REASON_COMPLETED] == 1
+    assert stats["phases"]["connect"]["count"] == 1
+    assert stats["phases"]["ttfb"]["count"] == 1
+    assert stats["phases"]["dns"]["count"] == 0
+
+
+@pytest.mark.parametrize("pooled", [False, True])
+def test_socket_stream_record(stub, pooled):
+    pool = ConnectionPool() if pooled else None
+    records = []
+    for _ in range(2):
+        stream = SocketStream(
+            stub.host, f"{EFETCH_PATH}?id=1", ssl=False, port=stub.port, pool=pool
+        )
+        stream.record = FetchRecord(stream.url)
+        stream.connect()
+        body = b"".join(stream.fetch())
+        stream.close()
+        records.append(stream.record)
+    new, second = records
+    assert new.body_bytes == second.body_bytes == len(body)
+    assert new.wire_bytes == second.wire_bytes == stream.fetched_bytes - stream.fetched_before
+    assert new.dns is not None
+    assert new.connect is not None
+    assert new.tls is None  # plain HTTP
+    assert new.ttfb is not None
+    assert new.status == 200
+    assert (second.connect is None) == pooled  # reused connection
+    if pool is not None:
+        pool.close()
+
+
+def test_socket_stream_record_stopped_early(stub):
+    stream = SocketStream(
+        stub.host, f"{EFETCH_PATH}?id=5465", ssl=False, port=stub.port, bufsize=256
+    )
+    stream.record = FetchRecord(stream.url)
+    stream.connect()
+    first = bytes(next(stream.fetch()))
+    stream.close()
+    assert stream.record.body_bytes == len(first)
+    assert stream.record.wire_bytes == stream.fetched_bytes
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from http_stream_xml.rate_limit import (
+    REQUESTS_PER_SECOND,
+    REQUESTS_PER_SECOND_WITH_KEY,
+    RateLimiter,
+    shared_rate_limiter,
+)
+
+
+def test_burst_then_rate():
+    limiter = RateLimiter(rate=50, burst=2)
+    waits = [limiter.reserve() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(1 / 50, abs=0.005)
+    assert waits[3] == pytest.approx(2 / 50, abs=0.005)
+    assert limiter.stats()["calls"] == 4
+    assert limiter.stats()["delayed_calls"] == 2
+    assert limiter.max_wait == waits[3]
+
+
+def test_threads_share_the_rate():
+    limiter = RateLimiter(rate=100)
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=lambda: [limiter.acquire() for _ in range(5)]) for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    assert limiter.calls == 20
+    assert elapsed >= 19 / 100 * 0.9
+
+
+def test_async_acquire():
+    limiter = RateLimiter(rate=100)
+
+    async def main():
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire_async() for _ in range(10)))
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 9 / 100 * 0.9
+    assert limiter.delayed_calls == 9
+
+
+def test_shared_rate_limiter_by_api_key():
+    assert shared_rate_limiter(None) is shared_rate_limiter(None)
+    assert shared_rate_limiter(None).rate == REQUESTS_PER_SECOND
+    assert shared_rate_limiter("key").rate == REQUESTS_PER_SECOND_WITH_KEY
+    assert shared_rate_limiter("key") is not shared_rate_limiter("other key")
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 1), (1, 0)])
+def test_invalid_rate_limiter(rate, burst):
+    with pytest.raises(ValueError, match="should be positive"):
+        RateLimiter(rate=rate, burst=burst)
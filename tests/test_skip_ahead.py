@@ -0,0 +1,142 @@
+import pytest
+
+from http_stream_xml.skip_ahead import ROOT, SkipAhead, target_names
+from http_stream_xml.xml_stream import CAPTURE_TREE, ENGINES, XmlStreamExtractor
+
+DOCUMENT = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE Entrezgene-Set PUBLIC "-//NCBI//NCBI Entrezgene/EN" "Entrezgene.dtd">
+<!-- <locus>in prolog comment</locus> -->
+<Entrezgene-Set>
+  <Entrezgene>
+    <Entrezgene_track-info><Gene-track><Gene-track_geneid>5465</Gene-track_geneid>
+      <Gene-track_status value="live">0</Gene-track_status></Gene-track></Entrezgene_track-info>
+    <!-- <locus>in comment</locus> -->
+    <text><![CDATA[ <locus>in CDATA</locus> ]]></text>
+    <?pi <locus>in processing instruction</locus> ?>
+    <locusx>other element</locusx>
+    <Gene-ref attr="a > b"><locus>PPARA</locus><Gene-ref_syn/></Gene-ref>
+    <summary>outer <summary>nested</summary> <!-- </summary> --> tail &amp; ünïcode</summary>
+    <summary />
+    <Object-id_id type="Other">1</Object-id_id>
+    <Object-id_id type="GeneID">5465</Object-id_id>
+  </Entrezgene>
+</Entrezgene-Set>
+"""
+
+SELECTORS = [
+    "locus",
+    "//summary",
+    'Object-id_id[@type="GeneID"]',
+    "Gene-track_status/@value",
+    "Gene-ref",
+]
+
+
+def extract(data, chunk_size, **kwargs):
+    extractor = XmlStreamExtractor(SELECTORS, repeated=True, **kwargs)
+    for pos in range(0, len(data), chunk_size):
+        extractor.feed_bytes(data[pos : pos + chunk_size])
+    return extractor.tags
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("capture", ["text", CAPTURE_TREE])
+def test_same_as_full_parse(engine, capture):
+    data = DOCUMENT.encode()
+    expected = extract(data, len(data), engine=engine, capture=capture)
+    assert expected["locus"] == ["PPARA"]
+    for chunk_size in (1, 2, 5, 13, len(data)):
+        result = extract(data, chunk_size, engine=engine, capture=capture, skip_ahead=True)
+        assert result == expected, chunk_size
+
+
+def test_passes_only_targets():
+    scanner = SkipAhead(["locus", "summary"])
+    passed = b"".join(scanner.feed(DOCUMENT.encode()))
+    assert passed.startswith(b'<?xml version="1.0" encoding="UTF-8"?><' + ROOT.encode() + b">")
+    assert b"Gene-track" not in passed
+    assert b"in comment" not in passed
+    assert b"in CDATA" not in passed
+    assert b"<locusx>" not in passed
+    assert b"<summary />" in passed
+    assert b"<!-- </summary> -->" in passed  # inside passed element
+
+
+def test_stops_early():
+    data = ("<root>" + "<skip>x</skip>" * 1000 + "<a>1</a><b>2</b>" + "<rest/>" * 5000).encode()
+    extractor = XmlStreamExtractor(["a", "b"], skip_ahead=True)
+    for pos in range(0, len(data), 1024):
+        extractor.feed_bytes(data[pos : pos + 1024])
+        if extractor.extraction_completed:
+            break
+    assert extractor.tags == {"a": "1", "b": "2"}
+    assert pos < len(data) / 2
+
+
+def test_internal_subset_fallback():
+    data = (
+        b'<?xml version="1.0"?><!DOCTYPE root [<!ENTITY name "expanded">]>'
+        b"<root><skip>x</skip><a>&name;</a></root>"
+    )
+    scanner = SkipAhead(["a"])
+    assert b"".join(scanner.feed(data[:20]) + scanner.feed(data[20:])) == data
+    assert scanner.full
+    extractor = XmlStreamExtractor(["a"], skip_ahead=True)
+    extractor.feed_bytes(data)
+    assert extractor.tags == {"a": "expanded"}
+
+
+def test_utf16_fallback():
+    data = "<root><a>ünïcode</a></root>".encode("utf-16")
+    extractor = XmlStreamExtractor(["a"], skip_ahead=True)
+    extractor.feed_bytes(data)
+    assert extractor.tags == {"a": "ünïcode"}
+    assert extractor.skip_ahead.full
+
+
+def test_feed_str_and_reset():
+    extractor = XmlStreamExtractor(["a"], skip_ahead=True)
+    extractor.feed("<root><b>x</b><a>ünï</a>")
+    assert extractor.tags == {"a": "ünï"}
+    extractor.reset()
+    extractor.feed("<other><a>2</a>")
+    assert extractor.tags == {"a": "2"}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_str_with_declared_encoding(engine):
+    document = '<?xml version="1.0" encoding="ISO-8859-1"?><r><b/><a>é</a></r>'
+    full = XmlStreamExtractor(["a"], engine=engine)
+    full.feed(document)
+    extractor = XmlStreamExtractor(["a"], engine=engine, skip_ahead=True)
+    extractor.feed(document)
+    assert extractor.tags == full.tags == {"a": "é"}
+    extractor.reset()
+    extractor.feed_bytes(document.encode("ISO-8859-1"))  # bytes in the declared encoding
+    assert extractor.tags == {"a": "é"}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_str_with_declared_encoding_and_internal_subset(engine):
+    document = '<?xml version="1.0" encoding="ISO-8859-1"?><!DOCTYPE r [<!ENTITY e "é">]><r><a>&e;é</a></r>'
+    extractor = XmlStreamExtractor(["a"], engine=engine, skip_ahead=True)
+    extractor.feed(document)
+    assert extractor.tags == {"a": "éé"}
+
+
+@pytest.mark.parametrize(
+    ("selectors", "names"),
+    [
+        (["a", "//b", "c[@x]", "d/@y", "a"], ["a", "b", "c", "d"]),
+        (["a", "b/c"], None),
+        (["/a"], None),
+        (["*"], None),
+    ],
+)
+def test_target_names(selectors, names):
+    assert target_names(selectors) == names
+
+
+def test_path_selectors_parse_whole_document():
+    extractor = XmlStreamExtractor(["a", "b/c"], skip_ahead=True)
+    assert extractor.skip_ahead is None
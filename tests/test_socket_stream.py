@@ -1,6 +1,15 @@
+import gzip
+import re
+import zlib
+
 import pytest
 from unittest.mock import Mock, patch
-from http_stream_xml.socket_stream import SocketStream
+from http_stream_xml.socket_stream import (
+    ChunkedDecoder,
+    ConnectionPool,
+    SocketStream,
+    range_windows,
+)
 import socket
 import ssl
 
@@ -53,3 +62,408 @@ def test_socket_stream_empty_buffer():
     stream.socket.recv.return_value = b""
     with pytest.raises(BufferError, match="Buffer is empty"):
         stream.read()
+
+
+def test_socket_stream_read_returns_bytes():
+    stream = SocketStream("example.com", "/test")
+    stream.socket = Mock()
+    stream.socket.recv.return_value = b"\xc3"  # first half of a two-byte character
+    assert stream.read() == b"\xc3"
+    assert stream.fetched_bytes == 1
+
+
+def decode_chunked(data, feed_size):
+    decoder = ChunkedDecoder()
+    body = b""
+    for pos in range(0, len(data), feed_size):
+        body += b"".join(decoder.feed(data[pos : pos + feed_size]))
+    return body, decoder.done
+
+
+@pytest.mark.parametrize("feed_size", [1, 2, 5, 1000])
+def test_chunked_decoder(feed_size):
+    data = (
+        b"5\r\n<a>42\r\n"  # chunk data with a line that looks like a chunk size
+        b"b;name=value\r\n\r\nabc\r\n</a>\r\n"  # chunk extension
+        b"0\r\nX-Trailer: yes\r\n\r\n"
+        b"next response"
+    )
+    assert decode_chunked(data, feed_size) == (b"<a>42\r\nabc\r\n</a>", True)
+
+
+def test_chunked_decoder_incomplete():
+    assert decode_chunked(b"a\r\n01234", 3) == (b"01234", False)
+
+
+def test_chunked_decoder_invalid_size():
+    with pytest.raises(ValueError, match="Invalid chunk size"):
+        ChunkedDecoder().feed(b"xyz\r\n")
+
+
+def socket_with_response(response, recv_size=7):
+    """Socket mock, that returns the response by parts of recv_size bytes at most."""
+    sock = Mock()
+    unread = bytearray(response)
+
+    def recv_into(buffer):
+        size = min(recv_size, len(buffer), len(unread))
+        buffer[:size] = unread[:size]
+        del unread[:size]
+        return size
+
+    sock.recv_into.side_effect = recv_into
+    return sock
+
+
+def test_fetch_chunked():
+    stream = SocketStream("example.com", "/test")
+    stream.socket = socket_with_response(
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        + b"4\r\nabc\n\r\n2\r\n42\r\n0\r\n\r\n"
+    )
+    assert b"".join(bytes(part) for part in stream.fetch()) == b"abc\n42"
+    assert stream.status == 200
+    assert stream.headers["transfer-encoding"] == "chunked"
+
+
+def test_fetch_content_length():
+    stream = SocketStream("example.com", "/test")
+    stream.socket = socket_with_response(
+        b"HTTP/1.1 200 OK\r\nContent-Length: 6\r\n\r\nabc\n42 and garbage after body"
+    )
+    assert b"".join(bytes(part) for part in stream.fetch()) == b"abc\n42"
+
+
+def test_fetch_till_connection_closed():
+    stream = SocketStream("example.com", "/test")
+    stream.socket = socket_with_response(b"HTTP/1.0 200 OK\r\n\r\n" + "<a>é</a>".encode())
+    assert b"".join(bytes(part) for part in stream.fetch()) == "<a>é</a>".encode()
+
+
+def test_fetch_reuses_buffer():
+    stream = SocketStream("example.com", "/test", bufsize=16)
+    body = b"<root>" + b"<a>x</a>" * 100 + b"</root>"
+    head = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body)
+    stream.socket = socket_with_response(head + body, recv_size=16)
+    parts = []
+    for part in stream.fetch():
+        assert isinstance(part, memoryview)
+        if parts:  # the first part is the rest of the headers read
+            assert part.obj is stream.buffer
+        parts.append(bytes(part))
+    assert b"".join(parts) == body
+    assert stream.fetched_bytes == len(head) + len(body)
+
+
+def test_fetch_bufsize():
+    stream = SocketStream("example.com", "/test")
+    assert len(stream.buffer) == 64 * 1024
+    stream.socket = socket_with_response(b"HTTP/1.0 200 OK\r\n\r\nabc")
+    assert b"".join(bytes(part) for part in stream.fetch(bufsize=2)) == b"abc"
+    assert len(stream.buffer) == 2
+
+
+def keep_alive_socket(*responses, recv_size=7):
+    """Socket mock, that returns the next response after each request."""
+    sock = socket_with_response(b"", recv_size)
+    unread = bytearray()
+    pending = list(responses)
+
+    def sendall(request):
+        unread.extend(pending.pop(0))
+
+    def recv_into(buffer):
+        size = min(recv_size, len(buffer), len(unread))
+        buffer[:size] = unread[:size]
+        del unread[:size]
+        return size
+
+    sock.sendall.side_effect = sendall
+    sock.recv_into.side_effect = recv_into
+    return sock
+
+
+def fetch_with_pool(pool, stop_after=None):
+    stream = SocketStream("example.com", "/test", ssl=False, port=80, pool=pool)
+    stream.connect()
+    body = b""
+    for part in stream.fetch():
+        body += bytes(part)
+        if stop_after is not None and len(body) >= stop_after:
+            break
+    stream.close()
+    return body
+
+
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 12\r\n\r\n<a>body</a>\n"
+CHUNKED_RESPONSE = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\n<a>bo\r\n7\r\ndy</a>\n\r\n0\r\n\r\n"
+
+
+def test_pool_reuses_connection():
+    pool = ConnectionPool()
+    sock = keep_alive_socket(RESPONSE, CHUNKED_RESPONSE)
+    with patch("socket.create_connection", return_value=sock) as create_connection:
+        assert fetch_with_pool(pool) == b"<a>body</a>\n"
+        assert fetch_with_pool(pool) == b"<a>body</a>\n"
+    create_connection.assert_called_once_with(("example.com", 80))
+    request = sock.sendall.call_args[0][0]
+    assert b"Connection: keep-alive\r\n" in request
+    assert request.endswith(b"\r\n\r\n") and b"Content-Length" not in request
+    assert pool.stats() == {
+        "connections": 1,
+        "handshakes": 0,
+        "reused": 1,
+        "released": 2,
+        "drained": 0,
+        "discarded": 0,
+        "idle": 1,
+    }
+
+
+@pytest.mark.parametrize("response", [RESPONSE, CHUNKED_RESPONSE])
+def test_pool_drains_aborted_response(response):
+    pool = ConnectionPool()
+    sock = keep_alive_socket(response, RESPONSE)
+    with patch("socket.create_connection", return_value=sock):
+        assert fetch_with_pool(pool, stop_after=1).startswith(b"<a>")
+        assert fetch_with_pool(pool) == b"<a>body</a>\n"
+    assert pool.stats()["connections"] == 1
+    assert pool.stats()["drained"] == 1
+    assert pool.stats()["reused"] == 1
+
+
+@pytest.mark.parametrize("response", [RESPONSE, CHUNKED_RESPONSE])
+def test_pool_discards_aborted_large_response(response):
+    pool = ConnectionPool(drain_limit=3)
+    first, second = keep_alive_socket(response), keep_alive_socket(RESPONSE)
+    with patch("socket.create_connection", side_effect=[first, second]):
+        fetch_with_pool(pool, stop_after=1)
+        assert fetch_with_pool(pool) == b"<a>body</a>\n"
+    first.close.assert_called_once()
+    assert pool.stats()["connections"] == 2
+    assert pool.stats()["discarded"] == 1
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        b"HTTP/1.1 200 OK\r\nConnection: close\r\nContent-Length: 2\r\n\r\nok",
+        b"HTTP/1.0 200 OK\r\nContent-Length: 2\r\n\r\nok",
+        b"HTTP/1.1 200 OK\r\n\r\nok",  # body till connection close
+    ],
+)
+def test_pool_does_not_reuse_closed_connection(response):
+    pool = ConnectionPool()
+    sock = keep_alive_socket(response)
+    with patch("socket.create_connection", return_value=sock):
+        assert fetch_with_pool(pool) == b"ok"
+    sock.close.assert_called_once()
+    assert pool.stats()["idle"] == 0
+
+
+def test_pool_replaces_stale_connection():
+    pool = ConnectionPool()
+    stale = keep_alive_socket(RESPONSE, b"")  # server closed idle connection
+    fresh = keep_alive_socket(RESPONSE)
+    with patch("socket.create_connection", side_effect=[stale, fresh]):
+        assert fetch_with_pool(pool) == b"<a>body</a>\n"
+        assert fetch_with_pool(pool) == b"<a>body</a>\n"
+    stale.close.assert_called_once()
+    assert pool.stats()["connections"] == 2
+    assert pool.stats()["idle"] == 1
+
+
+def test_pool_max_idle():
+    pool = ConnectionPool(max_idle=1)
+    streams = []
+    sockets = [keep_alive_socket(RESPONSE), keep_alive_socket(RESPONSE)]
+    with patch("socket.create_connection", side_effect=sockets):
+        for _ in sockets:  # two requests at the same time
+            stream = SocketStream("example.com", "/test", ssl=False, port=80, pool=pool)
+            stream.connect()
+            streams.append(stream)
+    for stream in streams:
+        assert b"".join(bytes(part) for part in stream.fetch()) == b"<a>body</a>\n"
+    assert pool.stats()["idle"] == 1
+    assert pool.stats()["discarded"] == 1
+    pool.close()
+    assert pool.stats()["idle"] == 0
+    sockets[0].close.assert_called_once()
+
+
+def test_pool_invalid_max_idle():
+    with pytest.raises(ValueError, match="max_idle should be positive"):
+        ConnectionPool(max_idle=0)
+
+
+def test_range_windows():
+    assert list(range_windows(None, (10, 40))) == [(0, 9), (10, 39), (40, None)]
+    assert list(range_windows(25, (10, 40))) == [(0, 9), (10, 24)]
+    assert list(range_windows(40, (10, 40))) == [(0, 9), (10, 39)]
+    assert list(range_windows(100, (10, 40))) == [(0, 9), (10, 39), (40, 99)]
+
+
+def range_server_socket(body, honor_range=True):
+    """Keep-alive socket mock, that responds to Range requests for the body."""
+    sock = keep_alive_socket()
+    unread = bytearray()
+    sock.requests = []
+    sock.honor_range = honor_range
+
+    def sendall(request):
+        sock.requests.append(request)
+        byte_range = re.search(rb"\r\nRange: bytes=(\d+)-(\d*)", request)
+        if not sock.honor_range or byte_range is None:
+            unread.extend(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+            return
+        first = int(byte_range[1])
+        last = int(byte_range[2]) if byte_range[2] else len(body) - 1
+        if first >= len(body):
+            unread.extend(b"HTTP/1.1 416 Range Not Satisfiable\r\nContent-Length: 0\r\n\r\n")
+            return
+        part = body[first : last + 1]
+        unread.extend(
+            b"HTTP/1.1 206 Partial Content\r\nContent-Length: %d\r\n"
+            b"Content-Range: bytes %d-%d/%d\r\n\r\n"
+            % (len(part), first, first + len(part) - 1, len(body))
+            + part
+        )
+
+    def recv_into(buffer):
+        size = min(7, len(buffer), len(unread))
+        buffer[:size] = unread[:size]
+        del unread[:size]
+        return size
+
+    sock.sendall.side_effect = sendall
+    sock.recv_into.side_effect = recv_into
+    return sock
+
+
+def fetch_ranges(sock, stop_after=None, **kwargs):
+    pool = ConnectionPool()
+    stream = SocketStream("example.com", "/test", ssl=False, port=80, pool=pool)
+    body = b""
+    with patch("socket.create_connection", return_value=sock):
+        for part in stream.fetch_ranges(sizes=(10, 40), **kwargs):
+            body += bytes(part)
+            if stop_after is not None and len(body) >= stop_after:
+                break
+        stream.close()
+    return body, pool
+
+
+BODY = bytes(range(100))
+
+
+@pytest.mark.parametrize("honor_range", [True, False])
+def test_fetch_ranges(honor_range):
+    sock = range_server_socket(BODY, honor_range)
+    body, pool = fetch_ranges(sock)
+    assert body == BODY
+    assert len(sock.requests) == (3 if honor_range else 1)
+    assert pool.stats()["connections"] == 1
+
+
+def test_fetch_ranges_stops_early():
+    sock = range_server_socket(BODY)
+    body, pool = fetch_ranges(sock, stop_after=15)
+    assert BODY.startswith(body)
+    assert [request.split(b"Range: ")[1].split(b"\r\n")[0] for request in sock.requests] == [
+        b"bytes=0-9",
+        b"bytes=10-39",
+    ]
+    assert pool.stats()["idle"] == 1
+
+
+def test_fetch_ranges_server_ignores_range():
+    sock = range_server_socket(BODY, honor_range=False)
+    body, pool = fetch_ranges(sock, stop_after=15)
+    assert BODY.startswith(body)
+    assert len(sock.requests) == 1
+
+
+def test_fetch_ranges_max_bytes():
+    sock = range_server_socket(BODY)
+    body, _ = fetch_ranges(sock, max_bytes=30)
+    assert body == BODY[:30]
+
+
+def test_fetch_ranges_end_at_range_boundary():
+    sock = range_server_socket(BODY[:40])
+    body, _ = fetch_ranges(sock)
+    assert body == BODY[:40]
+    assert len(sock.requests) == 3  # the last one is 416
+
+
+def test_fetch_ranges_skips_fetched_part():
+    """The server stopped to honor Range after the first range."""
+    sock = range_server_socket(BODY)
+    stream = SocketStream("example.com", "/test", ssl=False, port=80, pool=ConnectionPool())
+    body = b""
+    with patch("socket.create_connection", return_value=sock):
+        for part in stream.fetch_ranges(sizes=(10, 40)):
+            body += bytes(part)
+            sock.honor_range = False
+    assert body == BODY
+    assert len(sock.requests) == 2
+
+
+XML = b"<root>" + b"".join(b"<item>%d</item>" % i for i in range(2000)) + b"</root>"
+
+
+def chunked(data, size=1000):
+    return (
+        b"".join(
+            b"%x\r\n%s\r\n" % (len(data[pos : pos + size]), data[pos : pos + size])
+            for pos in range(0, len(data), size)
+        )
+        + b"0\r\n\r\n"
+    )
+
+
+@pytest.mark.parametrize(
+    ("encoding", "compressed"),
+    [("gzip", gzip.compress(XML)), ("deflate", zlib.compress(XML))],
+)
+@pytest.mark.parametrize("transfer", ["length", "chunked"])
+def test_fetch_decompresses(encoding, compressed, transfer):
+    stream = SocketStream("example.com", "/test", bufsize=1024)
+    if transfer == "chunked":
+        head = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n"
+        body = chunked(compressed)
+    else:
+        head = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n" % len(compressed)
+        body = compressed
+    response = head + b"Content-Encoding: %s\r\n\r\n" % encoding.encode() + body
+    stream.socket = socket_with_response(response, recv_size=1024)
+    parts = [bytes(part) for part in stream.fetch()]
+    assert b"".join(parts) == XML
+    assert max(len(part) for part in parts) <= 1024
+    assert stream.decoded_bytes == len(XML)
+    assert stream.fetched_bytes == len(response)
+
+
+def test_fetch_stops_decompression():
+    compressed = gzip.compress(XML)
+    stream = SocketStream("example.com", "/test", bufsize=256)
+    stream.socket = socket_with_response(
+        b"HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\nContent-Length: %d\r\n\r\n"
+        % len(compressed)
+        + compressed,
+        recv_size=256,
+    )
+    for _ in stream.fetch():
+        if stream.decoded_bytes >= 1000:
+            break
+    assert stream.decoded_bytes < len(XML) // 2
+    assert stream.fetched_bytes < len(compressed)
+
+
+def test_accept_encoding_header():
+    stream = SocketStream("example.com", "/test")
+    assert b"\r\nAccept-Encoding: gzip, deflate" in stream.header
+    stream.range = (0, 99)  # ranges are for uncompressed response
+    assert b"Accept-Encoding" not in stream.header
+    stream = SocketStream("example.com", "/test", compression=False)
+    assert b"Accept-Encoding" not in stream.header
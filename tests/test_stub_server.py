@@ -0,0 +1,156 @@
+import asyncio
+import gzip
+
+import pytest
+import requests
+
+from http_stream_xml.entrez import GeneFields
+from http_stream_xml.entrez_async import AsyncGenes
+from http_stream_xml.rate_limit import RateLimiter
+from http_stream_xml.socket_stream import ConnectionPool, SocketStream
+from http_stream_xml.stub_server import (
+    EFETCH_PATH,
+    ESEARCH_PATH,
+    ESUMMARY_PATH,
+    StubServer,
+)
+from http_stream_xml.xml_stream import XmlStreamExtractor
+
+
+def test_genes_stops_early(stub, make_genes):
+    stub.latency = 0.001  # the server writes slower than the client reads
+    gene = make_genes()["ppara"]
+    assert gene[GeneFields.locus] == "PPARA"
+    assert gene[GeneFields.summary] == "Summary – ünïcode"
+    assert stub.wait_idle(timeout=5)
+    assert stub.stats()["requests"] == 2
+    assert stub.bytes_sent < len(stub.genes["5465"]) / 4
+
+
+def test_genes_get_gene_ids(stub, make_genes):
+    genes = make_genes()
+    assert genes.get_gene_ids(["PPARA", "tp53", "unknown"]) == {"ppara": "5465", "tp53": "7157"}
+    assert [path.split("?")[0] for path in stub.requests] == [ESEARCH_PATH, ESUMMARY_PATH]
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+@pytest.mark.parametrize("gzip_body", [False, True])
+def test_genes_get_many(stub, make_genes, chunked, gzip_body):
+    stub.chunked = chunked
+    stub.gzip = gzip_body
+    genes = make_genes()
+    assert [gene_id for gene_id, _ in genes.get_many(["5465", "7157"])] == ["5465", "7157"]
+    # urllib3 does not count wire bytes of chunked responses, they are counted as decoded
+    assert (genes.wire_bytes < genes.decoded_bytes) == (gzip_body and not chunked)
+    assert genes.wire_bytes > 0
+
+
+def test_genes_range_requests(stub, make_genes):
+    genes = make_genes(range_requests=True, max_bytes_to_fetch=1_000_000)
+    gene = genes.get_gene_details_by_id("5465")
+    assert gene[GeneFields.summary] == "Summary – ünïcode"
+    assert genes.decoded_bytes < len(stub.genes["5465"]) / 4
+    assert stub.wait_idle(timeout=5)
+    assert [path.startswith(EFETCH_PATH) for path in stub.requests] == [True]  # one range
+    assert stub.bytes_sent == 4096
+
+
+def test_range_not_satisfiable(stub):
+    response = requests.get(
+        f"{stub.url}{EFETCH_PATH}?id=1",
+        headers={"Range": "bytes=1000000-"},
+        timeout=5,
+    )
+    assert response.status_code == 416
+    assert response.headers["Content-Range"].startswith("bytes */")
+
+
+def test_retry_after_server_error(stub, make_genes):
+    stub.fail(502)
+    assert make_genes().get_gene_id("tp53") == "7157"
+    assert stub.stats()["failures"] == 1
+
+
+def test_too_many_requests(stub, make_genes):
+    stub.retry_after = 0
+    stub.fail(429)
+    assert make_genes().get_gene_id("ppara") == "5465"  # retried after Retry-After
+    assert stub.stats()["failures"] == 1
+
+
+def test_not_retried_failure(stub, make_genes):
+    stub.fail(503)
+    genes = make_genes()
+    assert genes.get_gene_id("ppara") is None
+    assert genes.get_gene_id("ppara") == "5465"
+    response = requests.get(f"{stub.url}/unknown", timeout=5)
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_socket_stream_keep_alive(stub, chunked):
+    stub.chunked = chunked
+    stub.gzip = True
+    pool = ConnectionPool()
+    for gene_id in ["5465", "7157"]:
+        stream = SocketStream(
+            stub.host, f"{EFETCH_PATH}?id={gene_id}", ssl=False, port=stub.port, pool=pool
+        )
+        stream.connect()
+        assert b"".join(stream.fetch()).endswith(stub.genes[gene_id] + b"</Entrezgene-Set>\n")
+        assert stream.headers["content-encoding"] == "gzip"
+    assert pool.stats()["reused"] == 1
+    pool.close()
+
+
+def test_socket_stream_stops_early(stub):
+    stub.latency = 0.001
+    stream = SocketStream(stub.host, f"{EFETCH_PATH}?id=5465", ssl=False, port=stub.port)
+    extractor = XmlStreamExtractor([GeneFields.summary])
+    stream.connect()
+    for part in stream.fetch():
+        extractor.feed_bytes(part)
+        if extractor.extraction_completed:
+            break
+    stream.socket.close()
+    assert extractor.tags == {GeneFields.summary: "Summary – ünïcode"}
+    assert stream.fetched_bytes < len(stub.genes["5465"]) / 4
+
+
+def test_async_genes_concurrency(stub):
+    stub.latency = 0.005
+    names = ["ppara", "tp53", "tp53-as1"]
+
+    async def scenario():
+        genes = AsyncGenes(
+            [GeneFields.summary],
+            rate_limiter=RateLimiter(rate=1_000_000, burst=1000),
+            concurrency=2,
+            host=stub.host,
+            port=stub.port,
+            ssl=False,
+        )
+        return await genes.get_genes(names)
+
+    result = asyncio.run(scenario())
+    assert {name: gene[GeneFields.locus] for name, gene in result.items()} == {
+        "ppara": "PPARA",
+        "tp53": "TP53",
+        "tp53-as1": "TP53-AS1",
+    }
+    assert stub.wait_idle(timeout=5)
+    assert stub.max_active > 1
+
+
+def test_gzip_only_if_accepted(stub):
+    stub.gzip = True
+    url = f"{stub.url}{EFETCH_PATH}?id=1"
+    plain = requests.get(url, headers={"Accept-Encoding": "identity"}, timeout=5)
+    assert "Content-Encoding" not in plain.headers
+    compressed = requests.get(url, headers={"Accept-Encoding": "gzip"}, stream=True, timeout=5)
+    assert gzip.decompress(compressed.raw.read()) == plain.content
+
+
+def test_invalid_chunk_size():
+    with pytest.raises(ValueError, match="chunk_size should be positive"):
+        StubServer(chunk_size=0)
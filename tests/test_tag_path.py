@@ -0,0 +1,146 @@
+from unittest.mock import Mock
+
+import pytest
+
+from http_stream_xml.tag_path import CHILD, DESCENDANT, PathMatcher, Selector, parse_selector
+
+
+def walk(matcher, path):
+    state = matcher.root
+    for name in path:
+        state = matcher.step(state, name)
+    return state.matches
+
+
+@pytest.mark.parametrize(
+    "selector, steps",
+    [
+        ("name", ((DESCENDANT, "name"),)),
+        ("//name", ((DESCENDANT, "name"),)),
+        ("/root/name", ((CHILD, "root"), (CHILD, "name"))),
+        ("a/b", ((DESCENDANT, "a"), (CHILD, "b"))),
+        ("a//b/c", ((DESCENDANT, "a"), (DESCENDANT, "b"), (CHILD, "c"))),
+    ],
+)
+def test_parse_selector(selector, steps):
+    assert parse_selector(selector) == steps
+
+
+@pytest.mark.parametrize("selector", ["", "/", "//", "a/", "a///b", "/a//"])
+def test_parse_invalid_selector(selector):
+    with pytest.raises(ValueError, match="Invalid tag selector"):
+        parse_selector(selector)
+
+
+def test_path_disambiguates_same_name():
+    matcher = PathMatcher(["Gene-ref/Gene-ref_locus", "Gene-ref_locus"])
+    assert walk(matcher, ["Entrezgene", "Gene-ref", "Gene-ref_locus"]) == (
+        "Gene-ref/Gene-ref_locus",
+        "Gene-ref_locus",
+    )
+    assert walk(matcher, ["Entrezgene", "Gene-commentary", "Gene-ref_locus"]) == (
+        "Gene-ref_locus",
+    )
+
+
+def test_absolute_path():
+    matcher = PathMatcher(["/root/a"])
+    assert walk(matcher, ["root", "a"]) == ("/root/a",)
+    assert walk(matcher, ["root", "x", "a"]) == ()
+    assert walk(matcher, ["other", "a"]) == ()
+
+
+def test_descendant_and_wildcard():
+    matcher = PathMatcher(["a//c", "b/*"])
+    assert walk(matcher, ["a", "x", "y", "c"]) == ("a//c",)
+    assert walk(matcher, ["c"]) == ()
+    assert walk(matcher, ["b", "anything"]) == ("b/*",)
+    assert walk(matcher, ["b", "anything", "deeper"]) == ()
+
+
+def test_states_are_cached():
+    matcher = PathMatcher(["a/b"])
+    state = matcher.step(matcher.root, "a")
+    assert matcher.step(matcher.root, "a") is state
+    assert matcher.step(matcher.root, "x") is matcher.root
+
+
+@pytest.mark.parametrize(
+    "selector, steps, predicates, attribute",
+    [
+        ('a[@type="x/y"]/b', ((DESCENDANT, "a"), (CHILD, "b")), ((("type", "x/y"),), ()), None),
+        ("a[@id][@db='GeneID']", ((DESCENDANT, "a"),), ((("id", None), ("db", "GeneID")),), None),
+        ("a/@value", ((DESCENDANT, "a"),), ((),), "value"),
+        ("/a//b/@id", ((CHILD, "a"), (DESCENDANT, "b")), ((), ()), "id"),
+    ],
+)
+def test_parse_selector_with_attributes(selector, steps, predicates, attribute):
+    parsed = Selector(selector)
+    assert (parsed.steps, parsed.predicates, parsed.attribute) == (steps, predicates, attribute)
+
+
+@pytest.mark.parametrize("selector", ["@id", "a/@", "a//@id", "a[@id", "a[id]", "a[@id=x]", "a@b"])
+def test_parse_invalid_attribute_selector(selector):
+    with pytest.raises(ValueError, match="Invalid"):
+        Selector(selector)
+
+
+def test_predicates_checked_only_for_candidates():
+    matcher = PathMatcher(['Object-id_id[@type="GeneID"]', "Dbtag/Dbtag_db"])
+    attrs = Mock(wraps={"type": "GeneID"})
+    state = matcher.step(matcher.root, "Dbtag", attrs)
+    assert matcher.step(state, "Dbtag_db", attrs).matches == ("Dbtag/Dbtag_db",)
+    attrs.get.assert_not_called()
+    assert matcher.step(matcher.root, "Object-id_id", attrs).matches == (
+        'Object-id_id[@type="GeneID"]',
+    )
+    assert matcher.step(matcher.root, "Object-id_id", {"type": "other"}).matches == ()
+    assert matcher.step(matcher.root, "Object-id_id", {}).matches == ()
+
+
+def test_predicate_on_inner_step():
+    matcher = PathMatcher(["Dbtag[@db]/Dbtag_tag"])
+    assert walk_with_attrs(matcher, [("Dbtag", {"db": "HGNC"}), ("Dbtag_tag", {})]) == (
+        "Dbtag[@db]/Dbtag_tag",
+    )
+    assert walk_with_attrs(matcher, [("Dbtag", {}), ("Dbtag_tag", {})]) == ()
+
+
+def walk_with_attrs(matcher, path):
+    state = matcher.root
+    for name, attrs in path:
+        state = matcher.step(state, name, attrs)
+    return state.matches
+
+
+def test_names_not_in_selectors_share_transition():
+    matcher = PathMatcher(["a//c", "b"])
+    state = matcher.step(matcher.root, "a")
+    other = matcher.step(state, "x")
+    assert matcher.step(state, "y") is other
+    assert matcher.step(other, "c").matches == ("a//c",)
+
+
+@pytest.mark.parametrize("selectors", [["a//c", "b"], ["a/*[@id]"]])
+def test_names_not_in_selectors_are_not_stored(selectors):
+    matcher = PathMatcher(selectors)
+    state = matcher.step(matcher.root, "a")
+    for i in range(100):
+        matcher.step(state, f"x{i}", {"id": "1"})
+    assert not state.transitions
+    assert not state.conditions
+    assert len(matcher.states) < 5
+
+
+def test_wildcard_with_names_not_in_selectors():
+    matcher = PathMatcher(["a/*[@id]", "a/b"])
+    state = matcher.step(matcher.root, "a")
+    assert matcher.step(state, "x", {"id": "1"}).matches == ("a/*[@id]",)
+    assert matcher.step(state, "y").matches == ()
+    assert matcher.step(state, "b", {"id": "1"}).matches == ("a/*[@id]", "a/b")
+
+
+def test_duplicate_selectors():
+    matcher = PathMatcher(["a", "b", "a"])
+    assert matcher.selectors == ("a", "b")
+    assert matcher.step(matcher.root, "a").matches == ("a",)
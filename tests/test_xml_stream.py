@@ -3,7 +3,15 @@ from xml.sax import SAXParseException
 
 import pytest
 
-from http_stream_xml.xml_stream import XmlStreamExtractor
+from http_stream_xml.xml_stream import (
+    CAPTURE_TREE,
+    ENGINE_EXPAT,
+    ENGINE_SAX,
+    ENGINES,
+    RecordSplitter,
+    XmlRecordExtractor,
+    XmlStreamExtractor,
+)
 
 
 def test_simple_extraction():
@@ -166,3 +174,542 @@ def test_xml_stream_with_special_chars():
     extractor = XmlStreamExtractor(["name", "age"])
     extractor.feed(xml_data)
     assert extractor.tags == {"name": "John & <Doe>", "age": "30"}
+
+
+def test_feed_bytes_multibyte_split():
+    xml_data = "<root><name>Jürgen 中文</name><age>30</age></root>".encode()
+    extractor = XmlStreamExtractor(["name", "age"])
+    view = memoryview(xml_data)
+    for pos in range(len(xml_data)):  # byte by byte, so every multibyte char is split
+        if extractor.extraction_completed:
+            break
+        extractor.feed_bytes(view[pos : pos + 1])
+    assert extractor.tags == {"name": "Jürgen 中文", "age": "30"}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_same_result(engine):
+    xml_data = """<?xml version="1.0" encoding="UTF-8"?>
+    <root>
+        <skip a="1">ignored</skip>
+        <name id="1">John &amp; <![CDATA[Doe]]></name>
+        <age>30</age>
+        <city>New York</city>
+    </root>
+    """
+    extractor = XmlStreamExtractor(["name", "age"], engine=engine)
+    for pos in range(0, len(xml_data), 7):
+        if extractor.extraction_completed:
+            break
+        extractor.feed(xml_data[pos : pos + 7])
+    assert extractor.extraction_completed
+    assert extractor.tags == {"name": "John & Doe", "age": "30"}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_same_parse_error(engine):
+    extractor = XmlStreamExtractor(["name"], engine=engine)
+    with pytest.raises(SAXParseException) as exc_info:
+        extractor.feed("<root>\n<name>John</age></root>")
+    assert exc_info.value.getLineNumber() == 2
+
+
+def test_expat_engine_character_data_only_inside_collected_tags():
+    extractor = XmlStreamExtractor(["name", "age"], engine=ENGINE_EXPAT)
+    expat_parser = extractor.parser.parser
+    extractor.feed("<root><city>New York</city><name>John")
+    assert expat_parser.CharacterDataHandler is not None
+    extractor.feed("</name><city>Paris</city>")
+    assert expat_parser.CharacterDataHandler is None
+    assert extractor.tags == {"name": "John"}
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError, match="Unknown XML engine"):
+        XmlStreamExtractor(["name"], engine="lxml")
+
+
+def test_sax_engine_feed_bytes():
+    extractor = XmlStreamExtractor(["name"], engine=ENGINE_SAX)
+    extractor.feed_bytes(memoryview("<root><name>Jürgen</name></root>".encode()))
+    assert extractor.tags == {"name": "Jürgen"}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_path_selectors(engine):
+    xml_data = """
+    <Entrezgene-Set><Entrezgene>
+        <Entrezgene_gene><Gene-ref>
+            <Gene-ref_locus>PPARA</Gene-ref_locus>
+        </Gene-ref></Entrezgene_gene>
+        <Entrezgene_comments><Gene-commentary>
+            <Gene-ref_locus>OTHER</Gene-ref_locus>
+        </Gene-commentary></Entrezgene_comments>
+    </Entrezgene></Entrezgene-Set>
+    """
+    extractor = XmlStreamExtractor(
+        ["Entrezgene/Entrezgene_gene/Gene-ref/Gene-ref_locus", "//Gene-commentary/Gene-ref_locus"],
+        engine=engine,
+    )
+    extractor.feed(xml_data)
+    assert extractor.extraction_completed
+    assert extractor.tags == {
+        "Entrezgene/Entrezgene_gene/Gene-ref/Gene-ref_locus": "PPARA",
+        "//Gene-commentary/Gene-ref_locus": "OTHER",
+    }
+
+
+def test_nested_selectors_collect_own_text():
+    extractor = XmlStreamExtractor(["outer", "inner"])
+    extractor.feed("<root><outer>a<inner>b</inner>c</outer></root>")
+    assert extractor.tags == {"outer": "abc", "inner": "b"}
+
+
+def test_invalid_selector():
+    with pytest.raises(ValueError, match="Invalid tag selector"):
+        XmlStreamExtractor(["root/"])
+
+
+def test_first_occurrence_is_kept():
+    extractor = XmlStreamExtractor(["name", "age"])
+    extractor.feed("<root><name>John</name><name>Jane</name><age>30</age></root>")
+    assert extractor.tags == {"name": "John", "age": "30"}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_repeated_mode_collects_all(engine):
+    xml_data = """
+    <Gene-ref_syn>
+        <Gene-ref_syn_E>NR1C1</Gene-ref_syn_E>
+        <Gene-ref_syn_E>PPAR</Gene-ref_syn_E>
+        <Gene-ref_syn_E>hPPAR</Gene-ref_syn_E>
+    </Gene-ref_syn>
+    """
+    extractor = XmlStreamExtractor(["Gene-ref_syn_E"], engine=engine, repeated=True)
+    extractor.feed(xml_data)
+    assert not extractor.extraction_completed  # no limit - we have to read all
+    assert extractor.tags == {"Gene-ref_syn_E": ["NR1C1", "PPAR", "hPPAR"]}
+
+
+def test_repeated_mode_max_occurrences_stops_early():
+    xml_data = (
+        "<root><syn>a</syn><loc>L1</loc><syn>b</syn><loc>L2</loc><syn>c</syn>"
+        "<rest>not parsed</rest></root>"
+    )
+    extractor = XmlStreamExtractor(
+        ["syn", "loc"], repeated=True, max_occurrences={"syn": 2, "loc": 1}
+    )
+    for pos in range(len(xml_data)):
+        if extractor.extraction_completed:
+            break
+        extractor.feed(xml_data[pos])
+    assert extractor.extraction_completed
+    assert xml_data[pos:].startswith("<loc>L2")
+    assert extractor.tags == {"syn": ["a", "b"], "loc": ["L1"]}
+
+
+def test_repeated_mode_common_limit():
+    extractor = XmlStreamExtractor(["syn"], repeated=True, max_occurrences=1)
+    extractor.feed("<root><syn>a</syn><syn>b</syn></root>")
+    assert extractor.extraction_completed
+    assert extractor.tags == {"syn": ["a"]}
+
+
+@pytest.mark.parametrize(
+    "repeated, max_occurrences, error",
+    [
+        (False, 2, "only in repeated mode"),
+        (True, 0, "should be positive"),
+        (True, {"unknown": 1}, "not in tags_to_collect"),
+    ],
+)
+def test_invalid_max_occurrences(repeated, max_occurrences, error):
+    with pytest.raises(ValueError, match=error):
+        XmlStreamExtractor(["syn"], repeated=repeated, max_occurrences=max_occurrences)
+
+
+def test_record_splitter():
+    data = (
+        b'<?xml version="1.0"?>\n<Entrezgene-Set>\n'
+        b"<Entrezgene><Entrezgene_summary>one</Entrezgene_summary></Entrezgene>\n"
+        b'<Entrezgene attr="x"><Entrezgene_summary>two</Entrezgene_summary></Entrezgene>\n'
+        b"</Entrezgene-Set>\n"
+    )
+    for chunk_size in (1, 3, 7, len(data)):
+        splitter = RecordSplitter("Entrezgene")
+        records = [b""]
+        for pos in range(0, len(data), chunk_size):
+            for part, finished in splitter.feed(data[pos : pos + chunk_size]):
+                records[-1] += part
+                if finished:
+                    records.append(b"")
+        assert records == [
+            b"<Entrezgene><Entrezgene_summary>one</Entrezgene_summary></Entrezgene>",
+            b'<Entrezgene attr="x"><Entrezgene_summary>two</Entrezgene_summary></Entrezgene>',
+            b"",
+        ]
+
+
+def test_record_splitter_end_tag_with_whitespace():
+    data = (
+        b"<Set><Entrezgene><a>one</a></Entrezgene        >"
+        b"<Entrezgene><a>two</a></Entrezgene\n  >"
+        b"</Set>"
+    )
+    for chunk_size in range(1, len(data) + 1):
+        splitter = RecordSplitter("Entrezgene")
+        records = [b""]
+        for pos in range(0, len(data), chunk_size):
+            for part, finished in splitter.feed(data[pos : pos + chunk_size]):
+                records[-1] += part
+                if finished:
+                    records.append(b"")
+        assert records == [
+            b"<Entrezgene><a>one</a></Entrezgene        >",
+            b"<Entrezgene><a>two</a></Entrezgene\n  >",
+            b"",
+        ], chunk_size
+
+
+GENE_TRACK = """
+<Entrezgene>
+  <Entrezgene_track-info><Gene-track>
+    <Gene-track_status value="live">0</Gene-track_status>
+  </Gene-track></Entrezgene_track-info>
+  <Entrezgene_gene><Gene-ref><Gene-ref_db>
+    <Dbtag><Dbtag_db>HGNC</Dbtag_db><Dbtag_tag><Object-id><Object-id_str>HGNC:9232</Object-id_str>
+    </Object-id></Dbtag_tag></Dbtag>
+    <Object-id_id type="Other">1</Object-id_id>
+    <Object-id_id type="GeneID">5465</Object-id_id>
+  </Gene-ref_db></Gene-ref></Entrezgene_gene>
+  <rest>not parsed</rest>
+</Entrezgene>
+"""
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_attribute_selectors(engine):
+    extractor = XmlStreamExtractor(
+        ["Gene-track_status/@value", 'Object-id_id[@type="GeneID"]', "Dbtag_db"],
+        engine=engine,
+    )
+    for pos in range(0, len(GENE_TRACK), 10):
+        extractor.feed(GENE_TRACK[pos : pos + 10])
+        if extractor.extraction_completed:
+            break
+    assert extractor.extraction_completed
+    assert "<rest>" not in GENE_TRACK[: pos + 10]
+    assert extractor.tags == {
+        "Gene-track_status/@value": "live",
+        'Object-id_id[@type="GeneID"]': "5465",
+        "Dbtag_db": "HGNC",
+    }
+
+
+def test_attribute_selector_completes_extraction():
+    extractor = XmlStreamExtractor(["Gene-track_status/@value"])
+    extractor.feed('<root><Gene-track_status value="live">')
+    assert extractor.extraction_completed
+    assert extractor.tags == {"Gene-track_status/@value": "live"}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_attribute_selector_missing_attribute(engine):
+    extractor = XmlStreamExtractor(["s/@value", "a"], engine=engine)
+    extractor.feed(b"<r><s>0</s><a>A</a>")
+    assert extractor.tags == {"a": "A"}
+    assert not extractor.extraction_completed
+    extractor.feed(b'<s value="1"/>')
+    assert extractor.tags == {"a": "A", "s/@value": "1"}
+    assert extractor.extraction_completed
+
+
+def test_record_extractor_missing_attribute():
+    extractor = XmlRecordExtractor("r", ["r/@id", "a"], fragments=True)
+    assert extractor.feed(b'<r><a>A</a></r><r id="2"><a>B</a></r>') == [
+        {"a": "A"},
+        {"r/@id": "2", "a": "B"},
+    ]
+
+
+def test_attribute_selector_repeated():
+    extractor = XmlStreamExtractor(["Object-id_id/@type", "x/@missing"], repeated=True)
+    extractor.feed(GENE_TRACK)
+    assert extractor.tags == {"Object-id_id/@type": ["Other", "GeneID"]}
+
+
+GENE_REF = """
+<Entrezgene>
+  <Gene-ref>
+    <Gene-ref_locus>PPARA</Gene-ref_locus>
+    <Gene-ref_syn>
+      <Gene-ref_syn_E>NR1C1</Gene-ref_syn_E>
+      <Gene-ref_syn_E>PPAR</Gene-ref_syn_E>
+    </Gene-ref_syn>
+    <Gene-ref_db>
+      <Dbtag><Dbtag_db>HGNC</Dbtag_db><Dbtag_tag><Object-id>
+        <Object-id_str>HGNC:9232</Object-id_str>
+      </Object-id></Dbtag_tag></Dbtag>
+    </Gene-ref_db>
+  </Gene-ref>
+  <Entrezgene_summary>Summary</Entrezgene_summary>
+</Entrezgene>
+"""
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_capture_tree(engine):
+    extractor = XmlStreamExtractor(
+        ["Gene-ref_syn", "Gene-ref_db", "Gene-ref_locus", "Gene-track_status/@value"],
+        engine=engine,
+        capture=CAPTURE_TREE,
+    )
+    extractor.feed(f'<root>{GENE_REF}<Gene-track_status value="live">0</Gene-track_status></root>')
+    assert extractor.tags == {
+        "Gene-ref_syn": {"Gene-ref_syn_E": ["NR1C1", "PPAR"]},
+        "Gene-ref_db": {
+            "Dbtag": {
+                "Dbtag_db": "HGNC",
+                "Dbtag_tag": {"Object-id": {"Object-id_str": "HGNC:9232"}},
+            }
+        },
+        "Gene-ref_locus": "PPARA",
+        "Gene-track_status/@value": "live",
+    }
+
+
+def test_capture_tree_nested_selectors():
+    extractor = XmlStreamExtractor(
+        ["Gene-ref", "Gene-ref_syn_E"], repeated=True, capture=CAPTURE_TREE
+    )
+    extractor.feed(GENE_REF)
+    tags = extractor.tags
+    assert tags["Gene-ref_syn_E"] == ["NR1C1", "PPAR"]
+    assert tags["Gene-ref"][0]["Gene-ref_syn"] == {"Gene-ref_syn_E": ["NR1C1", "PPAR"]}
+
+
+def test_capture_tree_attributes_and_text():
+    extractor = XmlStreamExtractor(["a"], capture=CAPTURE_TREE)
+    extractor.feed('<root><a id="1">x<b type="t">y</b>z</a></root>')
+    assert extractor.tags == {"a": {"@id": "1", "b": {"@type": "t", "#text": "y"}, "#text": "xz"}}
+
+
+def test_capture_tree_limits():
+    extractor = XmlStreamExtractor(["Gene-ref"], capture=CAPTURE_TREE, max_depth=1)
+    extractor.feed(GENE_REF)
+    gene_ref = extractor.tags["Gene-ref"]
+    assert gene_ref["Gene-ref_locus"] == "PPARA"
+    assert gene_ref["Gene-ref_syn"] == {"#truncated": True}
+    assert "#truncated" not in gene_ref
+
+    extractor = XmlStreamExtractor(["Gene-ref"], capture=CAPTURE_TREE, max_nodes=3)
+    extractor.feed(GENE_REF)
+    assert extractor.tags["Gene-ref"] == {
+        "Gene-ref_locus": "PPARA",
+        "Gene-ref_syn": {"#truncated": True},
+        "#truncated": True,
+    }
+
+
+@pytest.mark.parametrize(
+    "kwargs, error",
+    [
+        ({"capture": "dom"}, "Unknown capture mode"),
+        (
+            {"capture": CAPTURE_TREE, "max_nodes": 0},
+            "max_depth should be non-negative and max_nodes positive",
+        ),
+        (
+            {"capture": CAPTURE_TREE, "max_depth": -1},
+            "max_depth should be non-negative and max_nodes positive",
+        ),
+    ],
+)
+def test_capture_tree_invalid_params(kwargs, error):
+    with pytest.raises(ValueError, match=error):
+        XmlStreamExtractor(["a"], **kwargs)
+
+
+def test_capture_tree_zero_depth():
+    extractor = XmlStreamExtractor(["a"], capture=CAPTURE_TREE, max_depth=0)
+    extractor.feed("<r><a x='1'>text<b>skipped</b></a>")
+    assert extractor.tags == {"a": {"@x": "1", "#text": "text", "#truncated": True}}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_feed_returns_completed_matches(engine):
+    extractor = XmlStreamExtractor(
+        ["outer", "inner", "x/@id"], engine=engine, repeated=True, max_occurrences=2
+    )
+    chunks = ["<root><outer>a<inner>b</inner>", 'c</outer><x id="1"/><inner>d</in', "ner></root>"]
+    assert [extractor.feed(chunk) for chunk in chunks] == [
+        [("inner", "b")],
+        [("outer", "abc"), ("x/@id", "1")],
+        [("inner", "d")],
+    ]
+    assert extractor.feed("") == []
+
+
+def test_on_match_callback():
+    matches = []
+    extractor = XmlStreamExtractor(
+        ["Gene-ref_locus", "Gene-ref_syn"],
+        capture=CAPTURE_TREE,
+        on_match=lambda tag, value: matches.append((tag, value, extractor.extraction_completed)),
+    )
+    for pos in range(0, len(GENE_REF), 100):
+        extractor.feed_bytes(GENE_REF[pos : pos + 100].encode())
+        if extractor.extraction_completed:
+            break
+    assert matches == [
+        ("Gene-ref_locus", "PPARA", False),
+        ("Gene-ref_syn", {"Gene-ref_syn_E": ["NR1C1", "PPAR"]}, True),
+    ]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_reset_after_extraction_completed(engine):
+    extractor = XmlStreamExtractor(["name", "age"], engine=engine)
+    extractor.feed("<root><name>John</name><age>30</age><rest>")
+    assert extractor.extraction_completed
+    matcher = extractor.stream_handler.matcher
+    extractor.reset()
+    assert not extractor.extraction_completed
+    assert extractor.tags == {}
+    assert extractor.feed("<root><age>40</age><name>Jane</name></root>") == [
+        ("age", "40"),
+        ("name", "Jane"),
+    ]
+    assert extractor.extraction_completed
+    assert extractor.stream_handler.matcher is matcher  # compiled selectors are reused
+
+
+def test_reset_inside_collected_tag():
+    extractor = XmlStreamExtractor(["name"])
+    extractor.feed("<root><name>Jo")
+    extractor.reset()
+    extractor.feed("<root><other>x</other><name>Jane</name></root>")
+    assert extractor.tags == {"name": "Jane"}
+
+
+def test_reset_drops_interned_names(monkeypatch):
+    monkeypatch.setattr("http_stream_xml.xml_stream.MAX_INTERNED_NAMES", 10)
+    extractor = XmlStreamExtractor(["name"])
+    interned = extractor.stream_handler.matcher.interned
+    for document in range(3):
+        extractor.feed("<root>" + "".join(f"<x{i}/>" for i in range(20)) + "<name>Jo</name>")
+        assert extractor.tags == {"name": "Jo"}
+        assert len(interned) > 10
+        extractor.reset()
+        assert not interned, document
+
+
+def test_sax_parsers_pool():
+    extractor = XmlStreamExtractor(["a"], engine=ENGINE_SAX)
+    parser = extractor.parser
+    extractor.feed("<root><a>1</a>")
+    extractor.close()
+    other = XmlStreamExtractor(["a"], engine=ENGINE_SAX)
+    assert other.parser is parser
+    other.feed("<root><a>2</a></root>")
+    assert other.tags == {"a": "2"}
+
+
+@pytest.mark.parametrize("repeated", [False, True])
+def test_duplicate_tags_to_collect(repeated):
+    extractor = XmlStreamExtractor(
+        ["name", "age", "name"], repeated=repeated, max_occurrences=1 if repeated else None
+    )
+    extractor.feed("<root><name>John</name><age>30</age><rest>")
+    assert extractor.extraction_completed
+    assert extractor.tags == (
+        {"name": ["John"], "age": ["30"]} if repeated else {"name": "John", "age": "30"}
+    )
+
+
+def test_many_tags_completion():
+    names = [f"field{i}" for i in range(40)]
+    xml_data = "<root>" + "".join(f"<{name}>{name}</{name}>" for name in names) + "<rest>"
+    extractor = XmlStreamExtractor(names)
+    extractor.feed(xml_data)
+    assert extractor.extraction_completed
+    assert extractor.tags == {name: name for name in names}
+
+
+RECORDS = (
+    b'<?xml version="1.0"?>\n<Entrezgene-Set>\n'
+    b"<Entrezgene><Entrezgene_summary>one</Entrezgene_summary>"
+    b"<Entrezgene_locus>A</Entrezgene_locus><rest><Entrezgene_locus>X</Entrezgene_locus></rest>"
+    b"</Entrezgene>\n"
+    b"<Other><Entrezgene_summary>outside</Entrezgene_summary></Other>\n"
+    b'<Entrezgene attr="x"><!-- <Entrezgene> --><Entrezgene_summary>tw\xc3\xb6</Entrezgene_summary>'
+    b"<Entrezgene><Entrezgene_locus>nested</Entrezgene_locus></Entrezgene></Entrezgene>\n"
+    b"</Entrezgene-Set>\n"
+)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_record_extractor(engine):
+    for chunk_size in (1, 7, len(RECORDS)):
+        extractor = XmlRecordExtractor(
+            "Entrezgene", ["Entrezgene_summary", "Entrezgene_locus"], engine=engine
+        )
+        records = []
+        for pos in range(0, len(RECORDS), chunk_size):
+            records += extractor.feed_bytes(RECORDS[pos : pos + chunk_size])
+        assert records == [
+            {"Entrezgene_summary": "one", "Entrezgene_locus": "A"},
+            {"Entrezgene_summary": "twö", "Entrezgene_locus": "nested"},
+        ]
+        assert extractor.records_count == 2
+        extractor.close()
+
+
+def test_record_extractor_relative_selectors():
+    extractor = XmlRecordExtractor(
+        "Entrezgene", ["/Entrezgene/Entrezgene_locus", "/Entrezgene/@attr"], repeated=True
+    )
+    assert extractor.feed_bytes(RECORDS) == [
+        {"/Entrezgene/Entrezgene_locus": ["A"]},
+        {"/Entrezgene/@attr": ["x"]},
+    ]
+
+
+def test_record_extractor_fragments():
+    records = []
+    extractor = XmlRecordExtractor(
+        "record", ["name"], capture=CAPTURE_TREE, fragments=True, on_record=records.append
+    )
+    extractor.feed('<record><name a="1">one</name></record>\n<record>')
+    assert records == [{"name": {"@a": "1", "#text": "one"}}]
+    extractor.feed("</record><record><name>three</name></record>")
+    assert records == [{"name": {"@a": "1", "#text": "one"}}, {}, {"name": "three"}]
+    extractor.reset()
+    assert extractor.feed("<record><name>again</name></record>") == [{"name": "again"}]
+    assert extractor.records_count == 1
+
+
+def test_record_extractor_state_does_not_grow():
+    extractor = XmlRecordExtractor("r", ["a"], fragments=True)
+    for _ in range(1000):
+        assert extractor.feed("<r><a>1</a><b><c/></b></r>") == [{"a": "1"}]
+    handler = extractor.record_handler
+    assert handler.depth == 0
+    assert len(handler.handler.path) <= 2  # the rest of completed record is skipped
+    assert extractor.records == []
+
+
+def test_record_splitter_raw_records():
+    records = RECORDS.replace(b"<!-- <Entrezgene> -->", b"")  # no record tags in comments
+    splitter = RecordSplitter("Entrezgene")
+    raw = [b""]
+    for pos in range(0, len(records), 16):
+        for part, finished in splitter.feed(records[pos : pos + 16]):
+            raw[-1] += part
+            if finished:
+                raw.append(b"")
+    assert raw[0] == records[records.index(b"<Entrezgene>") : records.index(b"\n<Other>")]
+    assert raw[1].startswith(b'<Entrezgene attr="x"><Entrezgene_summary>tw\xc3\xb6<')
+    extractor = XmlStreamExtractor(["Entrezgene_summary"])
+    extractor.feed_bytes(raw[0])  # each raw record is a well-formed document
+    assert extractor.tags == {"Entrezgene_summary": "one"}